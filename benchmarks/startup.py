@@ -0,0 +1,72 @@
+"""Time csv-diff start up: importing the CLI, --version and a tiny txt diff,
+then list the slowest imports.
+
+Run it from the repository root:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_and_median(args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def import_breakdown():
+    # The slowest top-level imports, from python -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import csv_diff.cli"],
+        cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines()[1:]:
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace(":", "|", 1).split("|")]
+        if not name.startswith(" "):
+            rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:8]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        one = os.path.join(tmp, "one.csv")
+        two = os.path.join(tmp, "two.csv")
+        with open(one, "w") as fp:
+            fp.write("id,name,age\n1,Cleo,4\n2,Pancakes,2\n")
+        with open(two, "w") as fp:
+            fp.write("id,name,age\n1,Cleo,5\n3,Bailey,1\n")
+        cli = "from csv_diff.cli import cli; cli()"
+        cases = [
+            ("python -c pass", [sys.executable, "-c", "pass"]),
+            ("import csv_diff.cli", [sys.executable, "-c", "import csv_diff.cli"]),
+            ("csv-diff --version", [sys.executable, "-c", cli, "--version"]),
+            ("csv-diff small txt diff", [sys.executable, "-c", cli, one, two, "--key", "id"]),
+        ]
+        for name, command in cases:
+            best, median = best_and_median(command, args.runs)
+            print("{:<26} best {:6.1f}ms  median {:6.1f}ms".format(name, best * 1000, median * 1000))
+
+    print("\nSlowest imports of csv_diff.cli (cumulative):")
+    for cumulative_us, name in import_breakdown():
+        print("  {:<30} {:6.1f}ms".format(name, cumulative_us / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,133 @@
 import csv
-import xlsxwriter
-from dictdiffer import diff
-import json
-import hashlib
-from operator import itemgetter
+import sys
+import zlib
+from collections import namedtuple
+from collections.abc import Mapping
+from itertools import groupby
+from operator import itemgetter, attrgetter
 
 RADD = "Added"
 RMOD = "Modified"
 RREM = "Removed"
 CADD = "Columns Added"
 CREM = "Columns Removed"
+STAT = "Column Statistics"
+# With --append-only, STAT also has an entry under this name with the rows
+# and bytes that both files started with, which weren't compared
+SKIPPED = "(skipped)"
+
+# One change yielded by iter_compare. action is one of the constants above;
+# for column changes key is the column name and fields is None. With
+# stats=True the last change is STAT, with key None and fields mapping each
+# changed column to its ColumnStats.as_dict() counters.
+Change = namedtuple("Change", ["action", "key", "fields", "unchanged"], defaults=(None,))
 
 SUMM = "Summary"
 KEY  = "Key"
 FLDS = "Fields"
+ACTN = "Action"
+COLN = "Column"
+
+DIALECTS = {
+    "csv": "excel",
+    "tsv": "excel-tab",
+}
+
+def load_file(filename, key=None, ignore=None, iformat=None, jobs=1):
+    # iformat is one of the --iformat choices, or None to sniff a CSV dialect.
+    # With jobs > 1, large CSV files are parsed by that many processes.
+    # filename can also be a sqlite:///file.db#table URL.
+    if filename.startswith("sqlite:///"):
+        from .sqlite import load_sqlite
+        return load_sqlite(filename, key=key, ignore=ignore)
+    if iformat == "json":
+        with open(filename) as fp:
+            return load_json(fp, key=key, ignore=ignore)
+    if jobs > 1:
+        from .parallel import load_csv_parallel
+        return load_csv_parallel(
+            filename, key=key, dialect=DIALECTS.get(iformat), ignore=ignore, workers=jobs
+        )
+    with open(filename, newline="") as fp:
+        return load_csv(fp, key=key, dialect=DIALECTS.get(iformat), ignore=ignore)
 
 def load_csv(fp, key=None, dialect=None, ignore=None):
-    if dialect is None and fp.seekable():
-        # Peek at first 1MB to sniff the delimiter and other dialect details
-        peek = fp.read(1024**2)
-        fp.seek(0)
-        try:
-            dialect = csv.Sniffer().sniff(peek, delimiters=",\t;")
-        except csv.Error:
-            # Oh well, we tried. Fallback to the default.
-            pass
+    if dialect is None:
+        dialect = _sniff_dialect(fp)
     fp = csv.reader(fp, dialect=(dialect or "excel"))
     headings = next(fp)
     ignore = set(ignore.split(',')) if ignore else set()
     rows = [dict( (k, v) for k,v in zip(headings, line) if k not in ignore) for line in fp]    
-    if key:
-        keyfn = itemgetter(*key.split(','))
-    else:
-        keyfn = lambda r: hashlib.sha1(
-            json.dumps(r, sort_keys=True).encode("utf8")
-        ).hexdigest()
+    keyfn = _keyfn(key)
     return {keyfn(r): r for r in rows}
 
 def load_json(fp, key=None, ignore=None):
+    import json
     raw_list = json.load(fp)
     assert isinstance(raw_list, list)
     if ignore:
       for item in raw_list:
         for field in ignore.split(','):
-            item.pop(k, None)    
+            item.pop(field, None)    
     common_keys = set()
     for item in raw_list:
         common_keys.update(item.keys())
+    keyfn = _keyfn(key)
+    return {keyfn(r): _simplify_json_row(r, common_keys) for r in raw_list}
+
+def _iter_keyed_rows(fp, key=None, dialect=None, ignore=None, select=None):
+    # Yields the (key, row) pairs load_csv would build, only for keys that
+    # pass select. With a key the id is read straight out of the line, so
+    # skipped rows never become dicts.
+    if dialect is None:
+        dialect = _sniff_dialect(fp)
+    reader = csv.reader(fp, dialect=(dialect or "excel"))
+    headings = next(reader)
+    ignore = set(ignore.split(',')) if ignore else set()
     if key:
-        keyfn = itemgetter(*key.split(','))  
+        linekey = itemgetter(*[headings.index(k) for k in key.split(',')])
+        for line in reader:
+            id = linekey(line)
+            if select is None or select(id):
+                yield id, dict((k, v) for k, v in zip(headings, line) if k not in ignore)
     else:
-        keyfn = lambda r: hashlib.sha1(
-            json.dumps(r, sort_keys=True).encode("utf8")
-        ).hexdigest()
-    return {keyfn(r): _simplify_json_row(r, common_keys) for r in raw_list}
+        keyfn = _keyfn(None)
+        for line in reader:
+            row = dict((k, v) for k, v in zip(headings, line) if k not in ignore)
+            id = keyfn(row)
+            if select is None or select(id):
+                yield id, row
+
+def _sniff_dialect(fp):
+    if not fp.seekable():
+        return None
+    # Peek at first 1MB to sniff the delimiter and other dialect details
+    peek = fp.read(1024**2)
+    fp.seek(0)
+    try:
+        return csv.Sniffer().sniff(peek, delimiters=",\t;")
+    except csv.Error:
+        # Oh well, we tried. Fallback to the default.
+        return None
+
+def _doubled_quotes(dialect):
+    # The sniffer says quotes aren't doubled whenever it didn't see any "",
+    # but without an escape character that is how they would be
+    if dialect is not None and not dialect.doublequote and not dialect.escapechar:
+        return type("dialect", (dialect,), {"doublequote": True})
+    return dialect
+
+def _keyfn(key):
+    if key:
+        return itemgetter(*key.split(','))
+    import hashlib
+    import json
+    return lambda r: hashlib.sha1(
+        json.dumps(r, sort_keys=True).encode("utf8")
+    ).hexdigest()
 
 def _simplify_json_row(r, common_keys):
+    import json
     # Convert list/dict values into JSON serialized strings
     for key, value in r.items():
         if isinstance(value, (dict, tuple, list)):
@@ -65,7 +137,188 @@ def _simplify_json_row(r, common_keys):
             r[key] = None
     return r
 
-def compare(previous, current, show_unchanged=False):
+def _key_hash(id):
+    # Stable across processes and runs, unlike hash()
+    if isinstance(id, tuple):
+        id = "\x1f".join(str(part) for part in id)
+    return zlib.crc32(str(id).encode("utf8"))
+
+def _columns(table):
+    for row in table.values():
+        return set(row.keys())
+    return set()
+
+def iter_compare(previous, current, show_unchanged=False, stats=False, pair_similar=None, tolerance=None):
+    # pair_similar is a similarity threshold between 0 and 1: removed and
+    # added rows at least that similar are paired up and reported as
+    # modified, which makes sense for diffs without a key. Numbers (from
+    # JSON or typed columns) that differ by no more than tolerance are
+    # treated as equal.
+    from dictdiffer import diff
+    column_stats = {}
+    # Have the columns changed? (Can't tell if either side has no rows)
+    previous_columns = _columns(previous)
+    current_columns = _columns(current)
+    ignore_columns = None
+    if previous and current and previous_columns != current_columns:
+        for c in current_columns:
+            if c not in previous_columns:
+                yield Change(CADD, c, None)
+        for c in previous_columns:
+            if c not in current_columns:
+                yield Change(CREM, c, None)
+        ignore_columns = current_columns.symmetric_difference(previous_columns)
+
+    options = {"ignore": ignore_columns}
+    if tolerance is not None:
+        options["absolute_tolerance"] = tolerance
+
+    def modified(id, previous_row, current_row):
+        diffs = list(diff(previous_row, current_row, **options))
+        if not diffs:
+            return None
+        fields = {
+            # field can be a list if id contained '.' - #7
+            field[0] if isinstance(field, list) else field: [
+                prev_value,
+                current_value,
+            ]
+            for _, field, (prev_value, current_value) in diffs
+        }
+        if stats:
+            for field, (prev_value, current_value) in fields.items():
+                if field not in column_stats:
+                    column_stats[field] = ColumnStats()
+                column_stats[field].add(prev_value, current_value)
+        unchanged = None
+        if show_unchanged:
+            unchanged = UnchangedFields(current_row, fields, ignore_columns)
+        return Change(RMOD, id, fields, unchanged)
+
+    # How about changed? Tables that keep each row's bytes (csv_diff.mapped)
+    # can tell a row is unchanged without decoding it
+    same_row = current.same_row_test(previous) if hasattr(current, "same_row_test") else None
+    for id in current:
+        if id in previous and not (same_row and same_row(id)) and current[id] != previous[id]:
+            change = modified(id, previous[id], current[id])
+            if change:
+                yield change
+
+    added = [id for id in current if id not in previous]
+    removed = [id for id in previous if id not in current]
+    if pair_similar is not None and added and removed:
+        from .similar import pair_rows
+        pairs = pair_rows(
+            [(id, previous[id]) for id in removed],
+            [(id, current[id]) for id in added],
+            pair_similar,
+            ignore=ignore_columns,
+        )
+        for previous_id, current_id in pairs:
+            change = modified(current_id, previous[previous_id], current[current_id])
+            if change:
+                yield change
+        paired_removed = {previous_id for previous_id, _ in pairs}
+        paired_added = {current_id for _, current_id in pairs}
+        added = [id for id in added if id not in paired_added]
+        removed = [id for id in removed if id not in paired_removed]
+
+    # Have any rows been removed or added?
+    for id in added:
+        yield Change(RADD, id, current[id])
+    for id in removed:
+        yield Change(RREM, id, previous[id])
+    if stats:
+        yield Change(STAT, None, {field: c.as_dict() for field, c in column_stats.items()})
+
+class UnchangedFields(Mapping):
+    """The fields of a modified row that did not change.
+
+    A read-only view over the loaded current row rather than a copy of it,
+    so show_unchanged costs next to nothing per row.
+    """
+    __slots__ = ("_row", "_changed", "_ignore")
+
+    def __init__(self, row, changed, ignore=None):
+        self._row = row
+        self._changed = changed
+        self._ignore = ignore or ()
+
+    def __getitem__(self, field):
+        if field in self._changed or field in self._ignore:
+            raise KeyError(field)
+        return self._row[field]
+
+    def __iter__(self):
+        for field in self._row:
+            if field not in self._changed and field not in self._ignore:
+                yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "UnchangedFields({!r})".format(dict(self))
+
+class ColumnStats:
+    "Counters for the changed cells of one column, kept without the rows"
+    __slots__ = ("changed", "to_empty", "from_empty", "numeric", "delta_min", "delta_max", "delta_sum")
+
+    def __init__(self):
+        self.changed = self.to_empty = self.from_empty = self.numeric = 0
+        self.delta_min = self.delta_max = None
+        self.delta_sum = 0
+
+    def add(self, previous, current):
+        self.changed += 1
+        if current in ("", None):
+            self.to_empty += 1
+        elif previous in ("", None):
+            self.from_empty += 1
+        else:
+            prev_number, number = _number(previous), _number(current)
+            if prev_number is not None and number is not None:
+                delta = number - prev_number
+                self.numeric += 1
+                self.delta_sum += delta
+                if self.delta_min is None or delta < self.delta_min:
+                    self.delta_min = delta
+                if self.delta_max is None or delta > self.delta_max:
+                    self.delta_max = delta
+
+    def as_dict(self):
+        return {
+            "changed": self.changed,
+            "to_empty": self.to_empty,
+            "from_empty": self.from_empty,
+            "numeric": self.numeric,
+            "delta_min": self.delta_min,
+            "delta_max": self.delta_max,
+            "delta_mean": self.delta_sum / self.numeric if self.numeric else None,
+        }
+
+def _number(value):
+    # Numbers from JSON, or strings from CSV that read as finite numbers
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number - number != 0:
+        # inf or nan
+        return None
+    return number
+
+def compare(previous, current, show_unchanged=False, stats=False, pair_similar=None, tolerance=None):
+    return _collect(iter_compare(previous, current, show_unchanged, stats, pair_similar, tolerance))
+
+def _collect(changes):
+    # Renderers accept either a compare() result or iter_compare() changes
+    if isinstance(changes, dict):
+        return changes
     result = {
         RMOD: [],
         RADD: [],
@@ -73,70 +326,46 @@ def compare(previous, current, show_unchanged=False):
         CADD: [],
         CREM: [],
     }
-    
-    # Have the columns changed?
-    previous_columns = set(next(iter(previous.values())).keys())
-    current_columns = set(next(iter(current.values())).keys())
-    ignore_columns = None
-    if previous_columns != current_columns:
-        result[CADD] = [
-            c for c in current_columns if c not in previous_columns
-        ]
-        result[CREM] = [
-            c for c in previous_columns if c not in current_columns
-        ]
-        ignore_columns = current_columns.symmetric_difference(previous_columns)
-
-    # Have any rows been removed or added?
-    added = [id for id in current if id not in previous]
-    removed = [id for id in previous if id not in current]
-    
-    # How about changed?
-    added_or_removed = set(added) | set(removed)
-    potential_changes = [id for id in current if id not in added_or_removed]
-    modified = [id for id in potential_changes if current[id] != previous[id]]
-
-    if modified:
-        for id in modified:
-            diffs = list(diff(previous[id], current[id], ignore=ignore_columns))
-            if diffs:
-                item = {
-                    KEY: id,
-                    FLDS: {
-                        # field can be a list if id contained '.' - #7
-                        field[0] if isinstance(field, list) else field: [
-                            prev_value,
-                            current_value,
-                        ]
-                        for _, field, (prev_value, current_value) in diffs
-                    },
-                }
-                result[RMOD].append(item)
-
-    if added:
-        for id in added:
-          item = {
-              KEY: id,
-              FLDS: current[id]
-          }
-          result[RADD].append(item)
-
-    if removed:
-        for id in removed:
-          item = {
-              KEY: id,
-              FLDS: previous[id]
-          }
-          result[RREM].append(item)
-
+    for change in changes:
+        if change.action in (CADD, CREM):
+            result[change.action].append(change.key)
+        elif change.action == STAT:
+            result[STAT] = change.fields
+        else:
+            result[change.action].append(_item(change))
     return result
 
+def _item(change):
+    item = {
+        KEY: change.key,
+        FLDS: change.fields,
+    }
+    if change.unchanged is not None:
+        item["unchanged"] = change.unchanged
+    return item
+
+def _changes(adiff):
+    if not isinstance(adiff, dict):
+        return iter(adiff)
+    return _changes_from_dict(adiff)
+
+def _changes_from_dict(adiff):
+    for action in (CADD, CREM):
+        for column in adiff[action]:
+            yield Change(action, column, None)
+    for action in (RMOD, RADD, RREM):
+        for item in adiff[action]:
+            yield Change(action, item[KEY], item[FLDS], item.get("unchanged"))
+    if STAT in adiff:
+        yield Change(STAT, None, adiff[STAT])
+
 def txt_diff(adiff, key=None, singular=None, plural=None, current=None, extras=None):
+    adiff = _collect(adiff)
     singular = singular or "row"
     plural = plural or "rows"
     title = []
     summary = []
-    show_headers = sum(1 for key in adiff if adiff[key]) > 1
+    show_headers = sum(1 for key in adiff if key != STAT and adiff[key]) > 1
     if adiff[CADD]:
         fragment = "{} {} added".format(
             len(adiff[CADD]),
@@ -170,7 +399,10 @@ def txt_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
         change_blocks = []
         for details in adiff[RMOD]:
             block = []
-            block.append("  {}: {}".format(key, details[KEY]))
+            if key:
+                block.append("  {}: {}".format(key, details[KEY]))
+            else:
+                block.append("  Row: {}".format(_row_label(details[KEY], current)))
             for field, (prev_value, current_value) in details[FLDS].items():
                 block.append(
                     '    {}: "{}" => "{}"'.format(field, prev_value, current_value)
@@ -180,10 +412,11 @@ def txt_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
                 block.append(txt_extras(current_item, extras))
             block.append("")
             change_blocks.append("\n".join(block))
-            if details.get("unchanged"):
+            unchanged = _without_key(details.get("unchanged"), key)
+            if unchanged:
                 block = []
                 block.append("    Unchanged:")
-                for field, value in details["unchanged"].items():
+                for field, value in unchanged:
                     block.append('      {}: "{}"'.format(field, value))
                 block.append("")
                 change_blocks.append("\n".join(block))
@@ -200,7 +433,7 @@ def txt_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
         for row in adiff[RADD]:
             to_append = txt_row(row[FLDS], prefix="  ")
             if extras:
-                to_append += "\n" + txt_extras(row, extras)
+                to_append += "\n" + txt_extras(row[FLDS], extras)
             rows.append(to_append)
         summary.append("\n\n".join(rows))
         summary.append("")
@@ -216,18 +449,60 @@ def txt_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
         for row in adiff[RREM]:
             to_append = txt_row(row[FLDS], prefix="  ")
             if extras:
-                to_append += "\n" + txt_extras(row, extras)
+                to_append += "\n" + txt_extras(row[FLDS], extras)
             rows.append(to_append)
         summary.append("\n\n".join(rows))
         summary.append("")
+
+    if adiff.get(STAT):
+        summary.append("Column statistics\n")
+        summary.extend(
+            txt_skipped(counters) if field == SKIPPED else txt_stats(field, counters)
+            for field, counters in adiff[STAT].items()
+        )
+        summary.append("")
     return (", ".join(title) + "\n\n" + ("\n".join(summary))).strip()
 
+def _without_key(unchanged, key):
+    # The key columns are already shown at the top of each changed row
+    if not unchanged:
+        return []
+    keys = key.split(",") if key else ()
+    return [(field, value) for field, value in unchanged.items() if field not in keys]
+
+def _key_text(id):
+    # Keys are str, tuples of str for several key columns, or row numbers
+    # in positional diffs
+    if isinstance(id, (tuple, list)):
+        return ":".join(map(str, id))
+    return str(id)
+
+def _row_label(id, current):
+    # Rows without a key are only modified when pair_similar paired them up,
+    # and are named by their current values rather than their hash
+    if current is None or id not in current:
+        return id
+    return ", ".join("{}={}".format(field, value) for field, value in current[id].items())
+
 def txt_row(row, prefix=""):
     bits = []
     for key, value in row.items():
         bits.append("{}{}: {}".format(prefix, key, value))
     return "\n".join(bits)
 
+def txt_skipped(counters):
+    return "  Skipped {rows} rows ({bytes} bytes) that both files start with".format(**counters)
+
+def txt_stats(field, counters):
+    text = "  {}: {} changed, {} to empty, {} from empty".format(
+        field, counters["changed"], counters["to_empty"], counters["from_empty"]
+    )
+    if counters["numeric"]:
+        text += ", {} numeric (delta min {:g}, max {:g}, mean {:g})".format(
+            counters["numeric"], counters["delta_min"], counters["delta_max"], counters["delta_mean"]
+        )
+    return text
+
 def txt_extras(row, extras):
     bits = []
     bits.append("  extras:")
@@ -236,12 +511,13 @@ def txt_extras(row, extras):
     return "\n".join(bits)
 
 def tsv_diff(adiff, key=None, singular=None, plural=None, current=None, extras=None):
+    adiff = _collect(adiff)
   
     singular = singular or "row"
     plural = plural or "rows"
     title = []
     header = []
-    show_headers = sum(1 for key in adiff if adiff[key]) > 1
+    show_headers = sum(1 for key in adiff if key != STAT and adiff[key]) > 1
     
     if adiff[CADD]:
         summary = "ColAdd\t"+SUMM+"\tadded\t{}\t{}".format(
@@ -271,7 +547,7 @@ def tsv_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
         change_blocks = []
         for row in adiff[RMOD]:
             block = []
-            rkey = row[KEY] if isinstance(row[KEY], str) else ':'.join(row[KEY])
+            rkey = _key_text(row[KEY])
             block.append(RMOD+"\tRow\t{}\t{}".format(rkey, key))
             for field, (prev_value, current_value) in row[FLDS].items():
                 block.append(RMOD+"\tField\t{}\t{}\t{}\t{}".format(rkey, field, prev_value, current_value))
@@ -279,10 +555,11 @@ def tsv_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
                 current_item = current[row[KEY]]
                 block.append(tsv_extras(current_item, extras))
             change_blocks.append("\n".join(block))
-            if row.get("unchanged"):
+            unchanged = _without_key(row.get("unchanged"), key)
+            if unchanged:
                 block = []
                 block.append("Unchanged:")
-                for field, value in row["unchanged"].items():
+                for field, value in unchanged:
                     block.append('{}\t"{}"'.format(field, value))
                 change_blocks.append("\n".join(block))
         header.append("\n".join(change_blocks))
@@ -297,14 +574,18 @@ def tsv_diff(adiff, key=None, singular=None, plural=None, current=None, extras=N
           rows = []
           
           for row in adiff[action]:
-              rkey = row[KEY] if isinstance(row[KEY], str) else ':'.join(row[KEY])
+              rkey = _key_text(row[KEY])
               rows.append(action+"\tRow\t{}\t{}".format(rkey, key))
               to_append = tsv_row(row[FLDS], prefix=action+"\tField\t{}".format(rkey))
               if extras:
-                  to_append += "\n" + tsv_extras(row, extras)
+                  to_append += "\n" + tsv_extras(row[FLDS], extras)
               rows.append(to_append)
           header.append("\n".join(rows))
 
+    for field, counters in (adiff.get(STAT) or {}).items():
+        for name, value in counters.items():
+            header.append("{}\t{}\t\t{}\t\t{}".format(STAT, name, field, "" if value is None else value))
+
     return "Action\tType\tKey\tField\tPrevious\tCurrent\n"+(("\n".join(header))).strip()
 
 def tsv_row(row, prefix=""):
@@ -320,80 +601,139 @@ def tsv_extras(row, extras):
         bits.append("{}\t{}".format(key, fmt.format(**row)))
     return "\n".join(bits)
 
-def xlsx_diff(adiff, output=None, key=None, singular=None, plural=None, current=None, extras=None):
-  
-    # Start from the first cell. Rows and columns are zero indexed.
-    r = 0
-    c = 0
-    wb = xlsxwriter.Workbook(output)
-    
-    singular = singular or "row"
-    plural = plural or "rows"
-    title = []
-    header = []
-    show_headers = sum(1 for key in adiff if adiff[key]) > 1
-
-    if adiff[RMOD]:
-        ws = wb.add_worksheet(RMOD)
-        xlsx_header(wb, ws, RMOD)
-        r = xlsx_row (ws, 1, [SUMM,"","rows",format(len(adiff[RMOD]))])
-        
-        change_blocks = []
-        for row in adiff[RMOD]:
-            block = []
-            rkey = row[KEY] if isinstance(row[KEY], str) else ':'.join(row[KEY])
-            r = xlsx_row (ws, r, ["Row",rkey,key])
-            for field, (prev_value, current_value) in row[FLDS].items():
-                r = xlsx_row (ws, r, ["Field",rkey,field, prev_value, current_value])
-
-        ws.freeze_panes(1,0)
-        ws.autofilter(0, 0, r-1, 4)
-          
-    actions = {RADD,RREM}
-    for action in actions:
-        if adiff[action]:
-            ws = wb.add_worksheet(action)
-            xlsx_header(wb, ws, action)
-            r = xlsx_row (ws, 1, [SUMM,"","rows",format(len(adiff[action]))])
-          
-            for row in adiff[action]:
-                rkey = row[KEY] if isinstance(row[KEY], str) else ':'.join(row[KEY])
-                r = xlsx_row (ws, r, ["Row",rkey,key])
-                for k,v in row[FLDS].items():
-                    r = xlsx_row (ws, r, ["Field",rkey,k,v])
-
-            ws.freeze_panes(1,0)
-            ws.autofilter(0, 0, r-1, 3)
-
-    wb.close()
-
-    return
-
-def xlsx_header(wb, ws, action):
-
-    f = wb.add_format()
-    f.set_bold()
-    f.set_bg_color("#DDEBF7")
-
-    ws.set_column(0, 8)
-    ws.set_column(1, 1, 25)
-    ws.set_column(2, 2, 20)
-
-    if action == RMOD:
-      ws.write_row("A1:F1", ["Type",KEY,"Field","Previous","Current"], f)
-      ws.set_column(3, 4, 15)
-    elif action == RADD:
-      ws.write_row("A1:F1", ["Type",KEY,"Field","Current"], f)
-      ws.set_column(3, 3, 15)
+def iter_json(adiff):
+    # Same document as json.dumps(compare(...), indent=2), produced one change
+    # at a time so neither the result nor its text is held in memory. Rows
+    # arrive grouped in RMOD, RADD, RREM order; the few column changes come
+    # first but belong at the end, so those are kept until then, as is the
+    # compact STAT summary that follows the rows.
+    import json
+    columns = {CADD: [], CREM: [], STAT: []}
+    rows = groupby(
+        (c for c in _changes(adiff) if not _held_column(c, columns)),
+        key=attrgetter("action"),
+    )
+    group = next(rows, None)
+    yield "{"
+    for i, action in enumerate((RMOD, RADD, RREM)):
+        items = ()
+        if group and group[0] == action:
+            items = (_item(change) for change in group[1])
+        yield from _json_section(action, items, first=(i == 0))
+        if items:
+            group = next(rows, None)
+    if group:
+        raise ValueError("Changes must be grouped in Modified, Added, Removed order")
+    yield from _json_section(CADD, columns[CADD])
+    yield from _json_section(CREM, columns[CREM])
+    for stats in columns[STAT]:
+        yield ",\n  {}: {}".format(json.dumps(STAT), json.dumps(stats, indent=2).replace("\n", "\n  "))
+    yield "\n}\n"
+
+def _held_column(change, columns):
+    if change.action == STAT:
+        columns[STAT].append(change.fields)
+        return True
+    if change.action in columns:
+        columns[change.action].append(change.key)
+        return True
+    return False
+
+def _json_section(name, items, first=False):
+    import json
+    yield "{}\n  {}: [".format("" if first else ",", json.dumps(name))
+    empty = True
+    for item in items:
+        # default=dict writes out UnchangedFields views
+        text = json.dumps(item, indent=2, default=dict).replace("\n", "\n    ")
+        yield "{}\n    {}".format("" if empty else ",", text)
+        empty = False
+    yield "]" if empty else "\n  ]"
+
+def iter_ndjson(adiff):
+    # One self-contained JSON object per line: column changes first, then rows
+    import json
+    for change in _changes(adiff):
+        if change.action in (CADD, CREM):
+            record = {ACTN: change.action, COLN: change.key}
+        elif change.action == STAT:
+            for field, counters in change.fields.items():
+                record = {ACTN: STAT, COLN: field}
+                record.update(counters)
+                yield json.dumps(record) + "\n"
+            continue
+        else:
+            record = {ACTN: change.action}
+            record.update(_item(change))
+        yield json.dumps(record, default=dict) + "\n"
+
+def json_diff(adiff, output=None):
+    write_chunks(iter_json(adiff), output)
+
+def ndjson_diff(adiff, output=None):
+    write_chunks(iter_ndjson(adiff), output)
+
+# Output formats by name, as "module:function" so that a format's module (and
+# whatever it imports, like xlsxwriter) is only loaded when it is used. The
+# functions are called as f(adiff, o, stdout, key=, singular=, plural=,
+# current=, extras=).
+OUTPUT_FORMATS = {
+    "txt": "csv_diff:_write_txt",
+    "tsv": "csv_diff:_write_tsv",
+    "json": "csv_diff:_write_json",
+    "ndjson": "csv_diff:_write_ndjson",
+    "xlsx": "csv_diff.xlsx:write_xlsx",
+    "patch": "csv_diff.patch:write_patch",
+}
+_output_writers = {}
+
+def register_output_format(name, target):
+    OUTPUT_FORMATS[name] = target
+    _output_writers.pop(name, None)
+
+def get_output_format(name):
+    if name not in _output_writers:
+        import importlib
+        module, _, function = OUTPUT_FORMATS[name].partition(":")
+        _output_writers[name] = getattr(importlib.import_module(module), function)
+    return _output_writers[name]
+
+def write_diff(adiff, oformat="txt", o=None, stdout=None, key=None, singular=None, plural=None, current=None, extras=None):
+    # Writes adiff the way the command line tool does: json, ndjson and patch
+    # output go to the file o if given, xlsx always does, and the rest go to
+    # stdout
+    get_output_format(oformat)(
+        adiff, o, stdout or sys.stdout,
+        key=key, singular=singular, plural=plural, current=current, extras=extras,
+    )
+
+def _write_txt(adiff, o, stdout, **options):
+    stdout.write(txt_diff(adiff, **options) + "\n")
+
+def _write_tsv(adiff, o, stdout, **options):
+    stdout.write(tsv_diff(adiff, **options) + "\n")
+
+def _write_json(adiff, o, stdout, **options):
+    _write_chunks_to(iter_json(adiff), o, stdout)
+
+def _write_ndjson(adiff, o, stdout, **options):
+    _write_chunks_to(iter_ndjson(adiff), o, stdout)
+
+def _write_chunks_to(chunks, o, stdout):
+    if o:
+        with open(o, "w") as output:
+            write_chunks(chunks, output)
     else:
-      ws.write_row("A1:F1", ["Type",KEY,"Field","Previous"], f)
-      ws.set_column(3, 3, 15)  
-
-    return
-
-def xlsx_row(ws, row, r):
-    col=0
-    for c in r:
-      ws.write(row, col, c)
-      col += 1
-    return row+1
\ No newline at end of file
+        write_chunks(chunks, stdout)
+
+def write_chunks(chunks, output=None):
+    output = output or sys.stdout
+    for chunk in chunks:
+        output.write(chunk)
+
+def __getattr__(name):
+    # xlsx_diff and friends moved to csv_diff.xlsx, which imports xlsxwriter
+    if name in ("xlsx_diff", "xlsx_header", "xlsx_row"):
+        from . import xlsx
+        return getattr(xlsx, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
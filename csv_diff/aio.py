@@ -0,0 +1,208 @@
+"""Asyncio counterparts of the loaders, compare and the streaming renderers.
+
+Reads go through an executor a chunk at a time, parsing and comparing run in
+the executor in batches, and control goes back to the event loop between
+batches, so a diff never blocks the loop for long. All of these can be
+cancelled, or given a timeout with asyncio.wait_for(), between batches.
+"""
+import asyncio
+import csv
+import io
+import json
+import locale
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from . import (
+    RMOD, RADD, RREM, CADD, CREM, STAT, ACTN, COLN,
+    iter_compare, load_json, _collect, _item, _json_section, _keyfn, _sniff_dialect,
+)
+from .parallel import _format_params
+from .prefix import _last_record_end
+
+CHUNK_SIZE = 1024 ** 2
+BATCH_SIZE = 10000
+
+
+async def aload_csv(filename, key=None, dialect=None, ignore=None, executor=None,
+                    chunk_size=CHUNK_SIZE, encoding=None):
+    """Like load_csv(open(filename)), without blocking the event loop.
+
+    The file is read chunk_size bytes at a time in the loop's default
+    executor, and each run of complete records is parsed in executor (the
+    default one if None; a ProcessPoolExecutor works too).
+    """
+    loop = asyncio.get_running_loop()
+    encoding = encoding or locale.getpreferredencoding(False)
+    table = {}
+    headings = None
+    pending = b""
+    fp = await loop.run_in_executor(None, open, filename, "rb")
+    try:
+        if dialect is None:
+            # Sniffed from as much of the file as load_csv looks at
+            sample = await loop.run_in_executor(None, fp.read, 1024 ** 2)
+            fp.seek(0)
+            dialect = await loop.run_in_executor(None, _sniff_bytes, sample, encoding)
+        params = _format_params(dialect)
+        quote = None
+        if params["quoting"] != csv.QUOTE_NONE:
+            quote = params["quotechar"].encode(encoding)
+        while True:
+            data = await loop.run_in_executor(None, fp.read, chunk_size)
+            block = pending + data
+            if data:
+                end, _ = _last_record_end(block, False, quote)
+                if end == -1:
+                    pending = block
+                    continue
+                block, pending = block[:end], block[end:]
+            if block:
+                headings, rows = await loop.run_in_executor(
+                    executor, _parse_records, block, encoding, params, headings, key, ignore
+                )
+                table.update(rows)
+            if not data:
+                return table
+    finally:
+        fp.close()
+
+
+async def aload_json(filename, key=None, ignore=None, executor=None, chunk_size=CHUNK_SIZE):
+    "Like load_json(open(filename)), parsing the whole document in executor"
+    loop = asyncio.get_running_loop()
+    chunks = []
+    fp = await loop.run_in_executor(None, open, filename, "rb")
+    try:
+        while True:
+            data = await loop.run_in_executor(None, fp.read, chunk_size)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        fp.close()
+    return await loop.run_in_executor(executor, _load_json_bytes, b"".join(chunks), key, ignore)
+
+
+async def aiter_compare(previous, current, show_unchanged=False, stats=False, executor=None,
+                        batch_size=BATCH_SIZE, **options):
+    """Async generator of the changes iter_compare yields.
+
+    The comparison runs in a thread of executor (a new single thread if
+    None), batch_size changes at a time.
+    """
+    changes = iter_compare(previous, current, show_unchanged, stats, **options)
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=1)
+    future = None
+    try:
+        while True:
+            future = executor.submit(_batch, changes, batch_size)
+            batch = await asyncio.wrap_future(future)
+            future = None
+            if not batch:
+                return
+            for change in batch:
+                yield change
+    finally:
+        if future is not None and not future.cancel():
+            # Cancelled mid-batch: the generator can only be closed once the
+            # thread running it lets go
+            future.add_done_callback(lambda _: changes.close())
+        else:
+            changes.close()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+async def acompare(previous, current, show_unchanged=False, stats=False, executor=None, **options):
+    "Like compare(), without blocking the event loop"
+    return _collect([
+        change async for change in aiter_compare(previous, current, show_unchanged, stats, executor, **options)
+    ])
+
+
+async def aiter_json(changes):
+    """Async version of iter_json, for changes from aiter_compare.
+
+    Yields the same text, a piece at a time, as the changes arrive.
+    """
+    held = {CADD: [], CREM: [], STAT: []}
+    sections = iter((RMOD, RADD, RREM))
+    section = None
+    empty = True
+    yield "{"
+    async for change in _aiter(changes):
+        if change.action in (CADD, CREM):
+            held[change.action].append(change.key)
+            continue
+        if change.action == STAT:
+            held[STAT].append(change.fields)
+            continue
+        while section != change.action:
+            if section is not None:
+                yield "]" if empty else "\n  ]"
+            section = next(sections, None)
+            if section is None:
+                raise ValueError("Changes must be grouped in Modified, Added, Removed order")
+            yield "{}\n  {}: [".format("" if section == RMOD else ",", json.dumps(section))
+            empty = True
+        text = json.dumps(_item(change), indent=2, default=dict).replace("\n", "\n    ")
+        yield "{}\n    {}".format("" if empty else ",", text)
+        empty = False
+    if section is not None:
+        yield "]" if empty else "\n  ]"
+    for section, items in [(s, ()) for s in sections] + [(CADD, held[CADD]), (CREM, held[CREM])]:
+        for text in _json_section(section, items, first=(section == RMOD)):
+            yield text
+    for fields in held[STAT]:
+        yield ",\n  {}: {}".format(json.dumps(STAT), json.dumps(fields, indent=2).replace("\n", "\n  "))
+    yield "\n}\n"
+
+
+async def aiter_ndjson(changes):
+    "Async version of iter_ndjson, for changes from aiter_compare"
+    async for change in _aiter(changes):
+        if change.action in (CADD, CREM):
+            yield json.dumps({ACTN: change.action, COLN: change.key}) + "\n"
+        elif change.action == STAT:
+            for field, counters in change.fields.items():
+                record = {ACTN: STAT, COLN: field}
+                record.update(counters)
+                yield json.dumps(record) + "\n"
+        else:
+            record = {ACTN: change.action}
+            record.update(_item(change))
+            yield json.dumps(record, default=dict) + "\n"
+
+
+async def _aiter(changes):
+    # Renderers take async iterators of changes, or plain iterables
+    if hasattr(changes, "__aiter__"):
+        async for change in changes:
+            yield change
+    else:
+        for change in changes:
+            yield change
+
+
+def _batch(changes, size):
+    return list(islice(changes, size))
+
+
+def _parse_records(data, encoding, params, headings, key, ignore):
+    reader = csv.reader(io.StringIO(data.decode(encoding), newline=""), **params)
+    if headings is None:
+        headings = next(reader, [])
+    ignore = set(ignore.split(",")) if ignore else set()
+    keyfn = _keyfn(key)
+    rows = (dict((k, v) for k, v in zip(headings, line) if k not in ignore) for line in reader)
+    return headings, {keyfn(r): r for r in rows}
+
+
+def _sniff_bytes(sample, encoding):
+    return _sniff_dialect(io.StringIO(sample.decode(encoding, "ignore"))) or "excel"
+
+
+def _load_json_bytes(data, key, ignore):
+    return load_json(io.BytesIO(data), key=key, ignore=ignore)
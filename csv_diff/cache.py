@@ -0,0 +1,289 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from . import Change, load_file
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+# Rows measured to estimate the in-memory size of a table
+SIZE_SAMPLE = 1000
+DEFAULT_RESULT_BYTES = 1024 ** 3
+# Part of every result key, so results stored in an older format or by an
+# older diff are never read back
+RESULT_VERSION = 1
+RESULT_SUFFIX = ".jsonl"
+STATS_FILE = "stats.json"
+READ_SIZE = 1024 ** 2
+
+
+class TableCache:
+    """Loaded tables kept across calls, for long-running processes.
+
+    Tables are keyed by the file's path, size and modification time plus the
+    options they were loaded with, so a file that changes on disk is loaded
+    again. The least recently used tables are dropped once the estimated size
+    of everything cached goes over max_bytes.
+
+    Cached tables are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, filename, key=None, ignore=None, iformat=None):
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        cache_key = (path, st.st_size, st.st_mtime_ns, key, ignore, iformat)
+        with self._lock:
+            if cache_key in self._tables:
+                self._tables.move_to_end(cache_key)
+                self.hits += 1
+                return self._tables[cache_key][0]
+            self.misses += 1
+
+        table = load_file(path, key=key, ignore=ignore, iformat=iformat)
+        size = table_size(table)
+        with self._lock:
+            # Older versions of the same file will never be asked for again
+            for stale in [k for k in self._tables if k[0] == path and k[1:3] != cache_key[1:3]]:
+                self._drop(stale)
+            if size <= self.max_bytes and cache_key not in self._tables:
+                self._tables[cache_key] = (table, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self._drop(next(iter(self._tables)))
+                    self.evictions += 1
+        return table
+
+    def invalidate(self, filename=None):
+        "Forget the tables loaded from filename, or every table"
+        with self._lock:
+            if filename is None:
+                stale = list(self._tables)
+            else:
+                path = os.path.abspath(filename)
+                stale = [k for k in self._tables if k[0] == path]
+            for cache_key in stale:
+                self._drop(cache_key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tables": len(self._tables),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, cache_key):
+        _, size = self._tables.pop(cache_key)
+        self.bytes -= size
+
+
+def table_size(table):
+    "Estimate the memory used by a loaded table from a sample of its rows"
+    if not table:
+        return sys.getsizeof(table)
+    sample = 0
+    for i, (id, row) in enumerate(table.items()):
+        if i == SIZE_SAMPLE:
+            break
+        sample += row_size(id, row)
+    return sys.getsizeof(table) + sample * len(table) // min(len(table), SIZE_SAMPLE)
+
+
+def row_size(id, row):
+    # Column names are shared by every row, so only the values are counted
+    size = sys.getsizeof(id) + sys.getsizeof(row)
+    for value in row.values():
+        size += sys.getsizeof(value)
+    return size
+
+
+class ResultCacheError(Exception):
+    pass
+
+
+class ResultCache:
+    """Diff results kept on disk between runs, so the same comparison run
+    again only has to be rendered.
+
+    Results are keyed by the SHA-256 of both inputs' contents and the
+    options that change the result, so renaming or touching a file doesn't
+    miss and editing one never hits. Each is stored as one JSON line per
+    Change. The least recently used results are deleted once the directory
+    holds more than max_bytes of them.
+
+    directory and max_bytes default to $CSV_DIFF_CACHE_DIR and
+    $CSV_DIFF_CACHE_SIZE (like 800M or 2G, 1G if unset).
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        directory = directory or os.environ.get("CSV_DIFF_CACHE_DIR")
+        if not directory:
+            raise ResultCacheError("No cache directory, set CSV_DIFF_CACHE_DIR")
+        if max_bytes is None:
+            from .planner import parse_size
+            size = os.environ.get("CSV_DIFF_CACHE_SIZE")
+            try:
+                max_bytes = parse_size(size) if size else DEFAULT_RESULT_BYTES
+            except ValueError as e:
+                raise ResultCacheError("CSV_DIFF_CACHE_SIZE: {}".format(e))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, previous, current, key=None, ignore=None, iformat=None, show_unchanged=False,
+            stats=False, pair_similar=None, tolerance=None):
+        "The cache key for diffing the files previous and current with these options"
+        import hashlib
+        import json
+        options = {
+            "version": RESULT_VERSION,
+            "key": key,
+            # Which columns are ignored matters, not the order they're given in
+            "ignore": sorted(set(ignore.split(","))) if ignore else None,
+            "iformat": iformat,
+            "show_unchanged": bool(show_unchanged),
+            "stats": bool(stats),
+            "pair_similar": pair_similar,
+            "tolerance": tolerance,
+        }
+        digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+        for filename in (previous, current):
+            digest.update(_file_digest(filename))
+        return digest.hexdigest()
+
+    def get(self, key):
+        "The stored changes for key as an iterator, or None if there are none"
+        path = self._path(key)
+        try:
+            fp = open(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        # Reading an entry makes it the most recently used
+        os.utime(path)
+        self._count("hits")
+        return _read_changes(fp)
+
+    def store(self, key, changes):
+        """Pass changes through, saving them under key once they have all
+        gone by. Nothing is saved if they are only partly consumed."""
+        import json
+        path = self._path(key)
+        partial = "{}.{}.partial".format(path, os.getpid())
+        complete = False
+        try:
+            with open(partial, "w") as fp:
+                for change in changes:
+                    unchanged = None if change.unchanged is None else dict(change.unchanged)
+                    fp.write(json.dumps([change.action, change.key, change.fields, unchanged]) + "\n")
+                    yield change
+            if os.path.getsize(partial) <= self.max_bytes:
+                os.replace(partial, path)
+                complete = True
+        finally:
+            if not complete and os.path.exists(partial):
+                os.remove(partial)
+        self._evict()
+
+    def stats(self):
+        entries = self._entries()
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        stats.update(self._load_stats())
+        stats.update({
+            "directory": self.directory,
+            "results": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        })
+        return stats
+
+    def clear(self):
+        "Delete every stored result and reset the counts"
+        for path, _, _ in self._entries():
+            os.remove(path)
+        stats = os.path.join(self.directory, STATS_FILE)
+        if os.path.exists(stats):
+            os.remove(stats)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + RESULT_SUFFIX)
+
+    def _entries(self):
+        # (path, size, last used) of every stored result
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(RESULT_SUFFIX):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, st.st_size, st.st_mtime_ns))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _load_stats(self):
+        import json
+        try:
+            with open(os.path.join(self.directory, STATS_FILE)) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _count(self, name, n=1):
+        # Runs that finish at the same time can lose a count, which is fine
+        # for statistics
+        import json
+        stats = self._load_stats()
+        stats[name] = stats.get(name, 0) + n
+        path = os.path.join(self.directory, STATS_FILE)
+        partial = "{}.{}.partial".format(path, os.getpid())
+        with open(partial, "w") as fp:
+            json.dump(stats, fp)
+        os.replace(partial, path)
+
+
+def _file_digest(filename):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fp:
+        while True:
+            data = fp.read(READ_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.digest()
+
+
+def _read_changes(fp):
+    import json
+    with fp:
+        for line in fp:
+            action, key, fields, unchanged = json.loads(line)
+            # Multi-column keys are tuples, which JSON stores as lists
+            yield Change(action, tuple(key) if isinstance(key, list) else key, fields, unchanged)
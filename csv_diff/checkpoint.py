@@ -0,0 +1,228 @@
+import csv
+import io
+import json
+import locale
+import os
+from . import RMOD, STAT, DIALECTS, Change, ColumnStats, _sniff_dialect
+from .parallel import _format_params, _next_record
+from .prefix import _last_record_end
+from .sqlite import SIDES, SqliteDiff, is_sqlite_url, _decode_key
+
+MANIFEST = "manifest.json"
+DATABASE = "diff.db"
+# Rows compared between checkpoints
+CHECKPOINT_ROWS = 100000
+# Bytes of CSV loaded between checkpoints
+READ_SIZE = 16 * 1024 ** 2
+STAGES = ("modified", "added", "removed")
+
+
+class CheckpointError(Exception):
+    pass
+
+
+class CheckpointedDiff:
+    """A SQLite diff that saves its progress as it goes, so that one that
+    was killed can carry on from where it got to.
+
+    The database lives in state_dir, next to a manifest of the inputs and
+    options. CSV files are loaded READ_SIZE bytes of whole records at a
+    time, and modified, added and removed rows are then found
+    CHECKPOINT_ROWS row ids at a time, with the changes stored in the
+    database. Each batch is committed together with how far it got, so the
+    database always holds a consistent checkpoint.
+
+    With resume=True, a matching saved state is picked up where it stopped;
+    otherwise any saved state is discarded.
+    """
+
+    def __init__(self, state_dir, previous, current, key=None, ignore=None, iformat=None,
+                 show_unchanged=False, resume=False):
+        self.sources = dict(zip(SIDES, (previous, current)))
+        self.key = key
+        self.ignore = ignore
+        self.iformat = iformat
+        self.show_unchanged = show_unchanged
+        # What open() reads text with, as load_csv does
+        self.encoding = locale.getpreferredencoding(False)
+        manifest = {
+            "previous": _identity(previous),
+            "current": _identity(current),
+            "key": key,
+            "ignore": ignore,
+            "iformat": iformat,
+            "show_unchanged": show_unchanged,
+        }
+        os.makedirs(state_dir, exist_ok=True)
+        manifest_path = os.path.join(state_dir, MANIFEST)
+        database = os.path.join(state_dir, DATABASE)
+        self.resumed = resume and os.path.exists(manifest_path)
+        if self.resumed:
+            with open(manifest_path) as fp:
+                if json.load(fp) != manifest:
+                    raise CheckpointError(
+                        "The state in {} is for other files or options, run without --resume to start "
+                        "again".format(state_dir)
+                    )
+        else:
+            for path in (manifest_path, database, database + "-wal", database + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.engine = SqliteDiff(database)
+        # Commits have to survive the process being killed
+        self.conn = self.engine.conn
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS checkpoint (name TEXT PRIMARY KEY, state TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes (action TEXT, key TEXT, fields TEXT, unchanged TEXT)"
+        )
+        self.conn.commit()
+        if not self.resumed:
+            # Written last, so a manifest means the database is set up
+            _write_atomic(manifest_path, json.dumps(manifest, indent=2))
+
+    def close(self):
+        self.engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, stats=False):
+        "Load and compare whatever isn't done yet, then yield all the changes"
+        for side in SIDES:
+            self._load(side)
+        self._compare()
+        return self._changes(stats)
+
+    def _load(self, side):
+        name = "load:" + side
+        state = self._state(name)
+        if state and state.get("done"):
+            self.engine.columns[side] = state["columns"]
+            return
+        source = self.sources[side]
+        if is_sqlite_url(source) or self.iformat == "json":
+            # Loaded in one go
+            self.engine.load(side, source, key=self.key, ignore=self.ignore, iformat=self.iformat)
+            self._checkpoint(name, {"done": True, "columns": self.engine.columns[side]})
+            return
+        if state is None:
+            state = self._start_csv(side, source)
+            self._checkpoint(name, state)
+        self.engine.columns[side] = state["columns"]
+        params = state["params"]
+        quote = None if params["quoting"] == csv.QUOTE_NONE else params["quotechar"].encode(self.encoding)
+        ignore = set(self.ignore.split(",")) if self.ignore else set()
+        with open(source, "rb") as fp:
+            fp.seek(state["offset"])
+            pending = b""
+            while True:
+                data = fp.read(READ_SIZE)
+                block = pending + data
+                if data:
+                    end, _ = _last_record_end(block, False, quote)
+                    if end == -1:
+                        pending = block
+                        continue
+                    block, pending = block[:end], block[end:]
+                if block:
+                    reader = csv.reader(io.StringIO(block.decode(self.encoding), newline=""), **params)
+                    rows = (
+                        dict((k, v) for k, v in zip(state["headings"], line) if k not in ignore)
+                        for line in reader
+                    )
+                    self.engine.insert(side, rows, self.key)
+                    state["offset"] += len(block)
+                    self._checkpoint(name, state)
+                if not data:
+                    break
+        state["done"] = True
+        self._checkpoint(name, state)
+
+    def _start_csv(self, side, source):
+        with open(source, newline="", encoding=self.encoding) as fp:
+            dialect = DIALECTS.get(self.iformat) or _sniff_dialect(fp) or "excel"
+        params = _format_params(dialect)
+        quote = None if params["quoting"] == csv.QUOTE_NONE else params["quotechar"].encode(self.encoding)
+        with open(source, "rb") as fp:
+            offset = _next_record(fp, 0, False, quote) or os.path.getsize(source)
+            fp.seek(0)
+            header = fp.read(offset).decode(self.encoding)
+        headings = next(csv.reader(io.StringIO(header, newline=""), **params), [])
+        ignore = set(self.ignore.split(",")) if self.ignore else set()
+        columns = [h for h in headings if h not in ignore]
+        self.engine._create(side, columns)
+        return {"offset": offset, "headings": headings, "params": params, "columns": columns}
+
+    def _compare(self):
+        state = self._state("compare") or {"stage": STAGES[0], "after": 0}
+        if state["stage"] == "done":
+            return
+        for stage in STAGES[STAGES.index(state["stage"]):]:
+            side = "previous" if stage == "removed" else "current"
+            last = self.conn.execute("SELECT MAX(rowid) FROM {}".format(side)).fetchone()[0] or 0
+            after = state["after"] if stage == state["stage"] else 0
+            while after < last:
+                upto = min(after + CHECKPOINT_ROWS, last)
+                if stage == "modified":
+                    changes = self.engine.modified(self.show_unchanged, rowids=(after, upto))
+                else:
+                    changes = getattr(self.engine, stage)(rowids=(after, upto))
+                self.conn.executemany("INSERT INTO changes VALUES (?, ?, ?, ?)", (
+                    (
+                        change.action,
+                        json.dumps(change.key),
+                        json.dumps(change.fields),
+                        None if change.unchanged is None else json.dumps(dict(change.unchanged)),
+                    )
+                    for change in changes
+                ))
+                after = upto
+                self._checkpoint("compare", {"stage": stage, "after": after})
+        self._checkpoint("compare", {"stage": "done"})
+
+    def _changes(self, stats):
+        yield from self.engine.column_changes()
+        column_stats = {}
+        for action, key, fields, unchanged in self.conn.execute(
+            "SELECT action, key, fields, unchanged FROM changes ORDER BY rowid"
+        ):
+            change = Change(action, _decode_key(key), json.loads(fields), unchanged and json.loads(unchanged))
+            if stats and action == RMOD:
+                for field, (prev_value, current_value) in change.fields.items():
+                    if field not in column_stats:
+                        column_stats[field] = ColumnStats()
+                    column_stats[field].add(prev_value, current_value)
+            yield change
+        if stats:
+            yield Change(STAT, None, {field: c.as_dict() for field, c in column_stats.items()})
+
+    def _state(self, name):
+        row = self.conn.execute("SELECT state FROM checkpoint WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _checkpoint(self, name, state):
+        # Commits whatever was done since the last checkpoint along with it
+        self.conn.execute("INSERT OR REPLACE INTO checkpoint VALUES (?, ?)", (name, json.dumps(state)))
+        self.conn.commit()
+
+
+def _identity(source):
+    # Enough to tell that a file changed since the state was saved
+    if is_sqlite_url(source):
+        return source
+    st = os.stat(source)
+    return [os.path.abspath(source), st.st_size, st.st_mtime_ns]
+
+
+def _write_atomic(path, text):
+    partial = path + ".partial"
+    with open(partial, "w") as fp:
+        fp.write(text)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(partial, path)
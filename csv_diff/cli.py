@@ -1,16 +1,171 @@
+import os
+import sys
 import click
-import json as std_json
-from . import load_csv, load_json, compare, txt_diff, tsv_diff, xlsx_diff
+from . import DIALECTS, OUTPUT_FORMATS, load_file, iter_compare, write_diff
 
-@click.command()
+class DefaultGroup(click.Group):
+  # Anything that isn't a subcommand goes to "diff", so that
+  # "csv-diff one.csv two.csv" keeps working alongside "csv-diff apply ..."
+  def parse_args(self, ctx, args):
+    if args and args[0] not in self.commands and args[0] not in ("--help", "--version"):
+      args.insert(0, "diff")
+    return super().parse_args(ctx, args)
+
+  def format_usage(self, ctx, formatter):
+    formatter.write_usage(ctx.command_path, "[OPTIONS] PREVIOUS CURRENT\n  or: {} COMMAND [ARGS]...".format(ctx.command_path))
+
+  def format_options(self, ctx, formatter):
+    # "csv-diff --help" lists the options of the default diff command too
+    params = self.commands["diff"].params + self.get_params(ctx)
+    records = [record for record in (p.get_help_record(ctx) for p in params) if record]
+    with formatter.section("Options"):
+      formatter.write_dl(records)
+    self.format_commands(ctx, formatter)
+
+class InputPath(click.Path):
+  # An existing file, or a sqlite:///file.db#table URL
+  def convert(self, value, param, ctx):
+    if isinstance(value, str) and value.startswith("sqlite:///"):
+      return value
+    return super().convert(value, param, ctx)
+
+def parse_addresses(ctx, param, value):
+  if not value:
+    return []
+  from .distributed import parse_address
+  try:
+    return [parse_address(text) for text in value]
+  except ValueError as e:
+    raise click.BadParameter(str(e))
+
+def parse_memory(ctx, param, value):
+  if value is None:
+    return None
+  from .planner import parse_size
+  try:
+    return parse_size(value)
+  except ValueError as e:
+    raise click.BadParameter(str(e))
+
+# How to tell that each option, or kind of input or output, is in use,
+# from the diff command's parameters
+FEATURES = {
+  "--key": lambda p: p["key"],
+  "--ignore": lambda p: p["ignore"],
+  "--extra": lambda p: p["extras"],
+  "--estimate": lambda p: p["estimate"],
+  "--fingerprints": lambda p: p["fingerprints"],
+  "--client": lambda p: p["client"],
+  "--jobs": lambda p: p["jobs"] > 1,
+  "--append-only": lambda p: p["append_only"],
+  "--stats": lambda p: p["stats"],
+  "--engine sqlite": lambda p: p["engine"] == "sqlite",
+  "--pair-similar": lambda p: p["pair_similar"],
+  "--similarity": lambda p: _given(p, "similarity"),
+  "--max-memory": lambda p: p["max_memory"] is not None,
+  "--watch": lambda p: p["watch"],
+  "--worker": lambda p: p["workers"],
+  "--partitions": lambda p: p["partitions"] is not None,
+  "--infer-types": lambda p: p["infer_types"],
+  "--schema": lambda p: p["schema"] is not None,
+  "--tolerance": lambda p: p["tolerance"] is not None,
+  "--positional": lambda p: p["positional"],
+  "--state-dir": lambda p: p["state_dir"] is not None,
+  "--resume": lambda p: p["resume"],
+  "--mmap": lambda p: p["mmap"],
+  "--iformat json": lambda p: p["iformat"] == "json",
+  "--oformat tsv": lambda p: p["oformat"] == "tsv",
+  "--oformat json": lambda p: p["oformat"] == "json",
+  "--oformat ndjson": lambda p: p["oformat"] == "ndjson",
+  "--oformat xlsx": lambda p: p["oformat"] == "xlsx",
+  "--oformat patch": lambda p: p["oformat"] == "patch",
+  "--o without --oformat ndjson": lambda p: p["o"] and p["oformat"] != "ndjson",
+  "sqlite:/// inputs": lambda p: any(f.startswith("sqlite:///") for f in (p["previous"], p["current"])),
+  "a sqlite:/// CURRENT": lambda p: p["current"].startswith("sqlite:///"),
+}
+
+# Options that only mean something alongside another one
+REQUIREMENTS = [
+  ("--partitions", "--worker"),
+  ("--state-dir", "--engine sqlite"),
+  ("--resume", "--state-dir"),
+  ("--similarity", "--pair-similar"),
+]
+
+# Each option in the first column can't be used with any of those after it
+CONFLICTS = [
+  ("--client", ["--estimate", "--fingerprints"]),
+  ("--estimate", ["--oformat tsv", "--oformat ndjson", "--oformat xlsx", "--oformat patch"]),
+  ("--extra", ["--oformat json", "--oformat ndjson", "--oformat patch"]),
+  ("--stats", ["--oformat patch"]),
+  ("--oformat patch", ["--iformat json", "--ignore", "sqlite:/// inputs"]),
+  ("--append-only", ["--client", "--estimate", "--fingerprints"]),
+  ("--engine sqlite", ["--client", "--estimate", "--fingerprints", "--append-only", "--jobs"]),
+  ("sqlite:/// inputs", ["--client", "--estimate", "--fingerprints", "--append-only", "--jobs"]),
+  ("--pair-similar", ["--key", "--engine sqlite", "--estimate", "--max-memory", "--oformat patch"]),
+  ("--max-memory", ["--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite"]),
+  ("--watch", [
+    "--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite",
+    "--pair-similar", "--max-memory", "--iformat json", "--oformat xlsx", "--oformat patch",
+    "--o without --oformat ndjson", "a sqlite:/// CURRENT",
+  ]),
+  ("--worker", [
+    "--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite",
+    "--pair-similar", "--max-memory", "--watch", "--extra", "--oformat patch", "sqlite:/// inputs",
+  ]),
+  ("--tolerance", ["--client", "--estimate", "--engine sqlite", "--max-memory", "--watch", "--worker"]),
+  ("--infer-types", [
+    "--schema", "--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite",
+    "--max-memory", "--watch", "--worker", "--iformat json", "--oformat patch", "sqlite:/// inputs",
+  ]),
+  ("--schema", [
+    "--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite",
+    "--max-memory", "--watch", "--worker", "--iformat json", "--oformat patch", "sqlite:/// inputs",
+  ]),
+  ("--positional", [
+    "--key", "--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite",
+    "--pair-similar", "--max-memory", "--watch", "--worker", "--infer-types", "--schema", "--tolerance",
+    "--iformat json", "--oformat patch", "sqlite:/// inputs",
+  ]),
+  ("--mmap", [
+    "--client", "--estimate", "--fingerprints", "--append-only", "--jobs", "--engine sqlite",
+    "--max-memory", "--watch", "--worker", "--positional", "--infer-types", "--schema",
+    "--iformat json", "sqlite:/// inputs",
+  ]),
+]
+
+def _given(params, name):
+  # Whether an option with a default was given on the command line
+  source = click.get_current_context().get_parameter_source(name)
+  return source is not None and source != click.core.ParameterSource.DEFAULT
+
+def check_options(params):
+  # Every combination of options is checked before any kind of diff starts
+  used = {name for name, test in FEATURES.items() if test(params)}
+  for option, needed in REQUIREMENTS:
+    if option in used and needed not in used:
+      raise click.UsageError("{} needs {}".format(option, needed), ctx=click.get_current_context())
+  for option, others in CONFLICTS:
+    clashes = [other for other in others if other in used] if option in used else []
+    if clashes:
+      raise click.UsageError(
+        "{} can't be combined with {}".format(option, " or ".join(clashes)),
+        ctx=click.get_current_context(),
+      )
+
+@click.group(cls=DefaultGroup)
 @click.version_option()
+def cli():
+  "Diff two CSV or JSON files"
+
+@cli.command(name="diff")
 @click.argument(
   "previous",
-  type=click.Path(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+  type=InputPath(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
 )
 @click.argument(
   "current",
-  type=click.Path(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+  type=InputPath(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
 )
 @click.option(
   "--key", 
@@ -32,9 +187,9 @@ from . import load_csv, load_json, compare, txt_diff, tsv_diff, xlsx_diff
 )
 @click.option(
   "--oformat",
-  type=click.Choice(["txt", "tsv", "json", "xlsx"]),
+  type=click.Choice(list(OUTPUT_FORMATS)),
   default="txt",
-  help="Output format (txt, tsv, json, xlsx)",
+  help="Output format ({})".format(", ".join(OUTPUT_FORMATS)),
 )
 @click.option(
   "--o",
@@ -65,36 +220,760 @@ from . import load_csv, load_json, compare, txt_diff, tsv_diff, xlsx_diff
   multiple=True,
   help="key: format string - define extra fields to display",
 )
-def cli(previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras):
-  "Diff two CSV or JSON files"
-  dialect = {
-    "csv": "excel",
-    "tsv": "excel-tab",
-  }
+@click.option(
+  "--estimate",
+  is_flag=True,
+  help="Only estimate how much changed, from a sample of the keys",
+)
+@click.option(
+  "--sample-modulus",
+  type=click.IntRange(min=1),
+  default=100,
+  help="With --estimate, sample the keys whose hash is divisible by this (default 100)",
+)
+@click.option(
+  "--fingerprints",
+  type=(click.Path(exists=True, dir_okay=False), click.Path(exists=True, dir_okay=False)),
+  default=None,
+  help="Fingerprints of PREVIOUS and CURRENT: only compare rows in the key ranges where they differ",
+)
+@click.option(
+  "--client",
+  type=click.Path(exists=True, dir_okay=False),
+  default=None,
+  help="Ask the csv-diff server listening on this Unix socket to run the diff",
+)
+@click.option(
+  "--jobs",
+  type=click.IntRange(min=1),
+  default=1,
+  help="Number of processes used to parse large CSV files (default 1)",
+)
+@click.option(
+  "--append-only",
+  is_flag=True,
+  help="Skip the rows both files start with byte for byte, only comparing the rest",
+)
+@click.option(
+  "--stats",
+  is_flag=True,
+  help="Add per-column counts of changed cells and numeric deltas to the output",
+)
+@click.option(
+  "--engine",
+  type=click.Choice(["memory", "sqlite"]),
+  default="memory",
+  help="Compare in memory, or through a temporary SQLite database for files larger than memory",
+)
+@click.option(
+  "--pair-similar",
+  is_flag=True,
+  help="Without --key, report removed and added rows that are similar enough as modified",
+)
+@click.option(
+  "--similarity",
+  type=click.FloatRange(min=0, max=1),
+  default=0.5,
+  help="With --pair-similar, the share of cells two rows must have in common (default 0.5)",
+)
+@click.option(
+  "--max-memory",
+  callback=parse_memory,
+  default=None,
+  help="Diff in memory if the loaded files fit in this much (e.g. 800M, 4G), on disk otherwise",
+)
+@click.option(
+  "--watch",
+  is_flag=True,
+  help="Keep running, and print the changes made by rows appended to CURRENT as they arrive",
+)
+@click.option(
+  "--interval",
+  type=click.FloatRange(min=0),
+  default=2.0,
+  help="With --watch, seconds between checks of CURRENT (default 2)",
+)
+@click.option(
+  "--worker",
+  "workers",
+  multiple=True,
+  callback=parse_addresses,
+  help="HOST:PORT of a 'csv-diff worker' to compare part of the rows, can be repeated",
+)
+@click.option(
+  "--partitions",
+  type=click.IntRange(min=1),
+  default=None,
+  help="With --worker, number of key ranges to split the files into (default one per worker)",
+)
+@click.option(
+  "--infer-types",
+  is_flag=True,
+  help="Guess int, float and date columns from the first rows, and compare them as such",
+)
+@click.option(
+  "--schema",
+  type=click.Path(exists=True, dir_okay=False),
+  default=None,
+  help="JSON file mapping column names to int, float, date or str, to compare columns as those types",
+)
+@click.option(
+  "--tolerance",
+  type=click.FloatRange(min=0),
+  default=None,
+  help="Treat numbers that differ by no more than this as equal (typed columns and JSON numbers)",
+)
+@click.option(
+  "--positional",
+  is_flag=True,
+  help="Without --key, diff the rows in order, reporting inserted, deleted and modified rows by row number",
+)
+@click.option(
+  "--state-dir",
+  type=click.Path(file_okay=False),
+  default=None,
+  help="With --engine sqlite, keep the database and progress here so an interrupted diff can be resumed",
+)
+@click.option(
+  "--resume",
+  is_flag=True,
+  help="Carry on from the progress saved in --state-dir by a diff of the same files that was interrupted",
+)
+@click.option(
+  "--no-cache",
+  is_flag=True,
+  help="Don't look up or store this diff in the result cache in $CSV_DIFF_CACHE_DIR",
+)
+@click.option(
+  "--mmap",
+  is_flag=True,
+  help="Memory-map CSV files and only decode the rows that differ, which is faster for large similar files",
+)
+def diff(previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, estimate, sample_modulus, fingerprints, client, jobs, append_only, stats, engine, pair_similar, similarity, max_memory, watch, interval, workers, partitions, infer_types, schema, tolerance, positional, state_dir, resume, no_cache, mmap):
+  "Diff two CSV or JSON files, or tables given as sqlite:///file.db#table"
+  check_options(click.get_current_context().params)
+  if positional:
+    return positional_diff(previous, current, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats)
+  typed = infer_types or schema is not None
+  if workers:
+    return distributed_diff(previous, current, workers, partitions, key, ignore, iformat, oformat, o,
+                            singular, plural, show_unchanged, stats)
+  if watch:
+    return watch_diff(previous, current, key, ignore, iformat, oformat, o, singular, plural,
+                      show_unchanged, extras, stats, interval)
+  pair_similar = similarity if pair_similar else None
+  sqlite_input = any(f.startswith("sqlite:///") for f in (previous, current))
+  if client:
+    return client_diff(client, previous, current, key=key, ignore=ignore, iformat=iformat,
+                       oformat=oformat, o=o, singular=singular, plural=plural,
+                       show_unchanged=show_unchanged, extras=extras, stats=stats,
+                       pair_similar=pair_similar)
+  if estimate:
+    return estimate_diff(previous, current, key, ignore, iformat, oformat, plural, sample_modulus)
+
+  if engine == "sqlite":
+    if state_dir is not None:
+      return checkpointed_diff(state_dir, resume, previous, current, key, ignore, iformat, oformat, o,
+                               singular, plural, show_unchanged, extras, stats)
+    return sqlite_diff(previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats)
+
+  # The same diff run again is rendered from the result cache. Extras,
+  # patches and the rows --pair-similar paired up need the loaded CURRENT
+  # file, which the cache doesn't keep
+  cache = cache_key = None
+  if (os.environ.get("CSV_DIFF_CACHE_DIR") and not no_cache and not (
+      sqlite_input or fingerprints or max_memory is not None or append_only or typed
+      or extras or oformat == "patch" or pair_similar)):
+    from .cache import ResultCache, ResultCacheError
+    try:
+      cache = ResultCache()
+    except ResultCacheError as e:
+      raise click.ClickException(str(e))
+    cache_key = cache.key(previous, current, key=key, ignore=ignore, iformat=iformat, show_unchanged=show_unchanged,
+                          stats=stats, pair_similar=pair_similar, tolerance=tolerance)
+    changes = cache.get(cache_key)
+    if changes is not None:
+      write_diff(changes, oformat, o, key=key, singular=singular, plural=plural)
+      return
+
+  def load(filename):
+    if mmap:
+      from .mapped import load_mapped
+      return load_mapped(filename, key=key, dialect=DIALECTS.get(iformat), ignore=ignore)
+    if filename.startswith("sqlite:///"):
+      from .sqlite import load_sqlite, SqliteError
+      try:
+        return load_sqlite(filename, key=key, ignore=ignore)
+      except SqliteError as e:
+        raise click.ClickException(str(e))
+    return load_file(filename, key=key, ignore=ignore, iformat=iformat, jobs=jobs)
+
+  if fingerprints:
+    load = fingerprint_loader(fingerprints, key, ignore, iformat)
+
+  if max_memory is not None:
+    import logging
+    from .planner import load_within_budget
+    logging.basicConfig(format="csv-diff: %(message)s", level=logging.INFO)
+    tables = load_within_budget(previous, current, max_memory, key=key, ignore=ignore, iformat=iformat)
+    if tables is None:
+      return sqlite_diff(previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats)
+    write_diff(
+      iter_compare(tables[0], tables[1], show_unchanged, stats), oformat, o,
+      key=key, singular=singular, plural=plural, current=tables[1], extras=extras,
+    )
+    return
+
+  tails = None
+  if append_only:
+    from .prefix import load_tails, PrefixError
+    try:
+      tails = load_tails(previous, current, key=key, ignore=ignore, iformat=iformat)
+      if tails is None:
+        click.echo("The files share no rows, comparing them in full", err=True)
+    except PrefixError as e:
+      click.echo("{}, comparing them in full".format(e), err=True)
+  if tails:
+    previous_data, current_data, tail_stats = tails
+    click.echo(
+      "Skipped {prefix_rows} rows ({prefix_bytes} bytes) shared by both files, compared the remaining "
+      "{previous_tail_bytes} and {current_tail_bytes} bytes".format(**tail_stats),
+      err=True,
+    )
+  else:
+    if typed:
+      previous_data, current_data = load_typed(previous, current, key, ignore, iformat, schema)
+    else:
+      previous_data = load(previous)
+      current_data = load(current)
+
+  # Renderers take the changes as they are produced; the streaming JSON
+  # writers never hold the whole result
+  diff = iter_compare(previous_data, current_data, show_unchanged, stats, pair_similar, tolerance)
+  if tails:
+    from .prefix import add_prefix_stats
+    diff = add_prefix_stats(diff, tail_stats)
+  if cache is not None:
+    diff = cache.store(cache_key, diff)
+  write_diff(diff, oformat, o, key=key, singular=singular, plural=plural, current=current_data, extras=extras)
+
+def positional_diff(previous, current, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats):
+  from .positional import load_rows, iter_positional, KEY_NAME
+  tables = []
+  for filename in (previous, current):
+    with open(filename, newline="") as fp:
+      tables.append(load_rows(fp, dialect=DIALECTS.get(iformat), ignore=ignore))
+  # Extras look rows up by key, which is the row number
+  rows = {i: row for i, row in enumerate(tables[1], 1)} if extras else None
+  write_diff(
+    iter_positional(tables[0], tables[1], show_unchanged, stats), oformat, o,
+    key=KEY_NAME, singular=singular, plural=plural, current=rows, extras=extras,
+  )
+
+def load_typed(previous, current, key, ignore, iformat, schema_file):
+  from .typed import infer_schema, merge_schemas, load_schema, load_typed_csv, align, SchemaError
+  dialect = DIALECTS.get(iformat)
+  try:
+    if schema_file:
+      with open(schema_file) as fp:
+        schema = load_schema(fp)
+    else:
+      schemas = []
+      for filename in (previous, current):
+        with open(filename, newline="") as fp:
+          schemas.append(infer_schema(fp, dialect=dialect, ignore=ignore))
+      schema = merge_schemas(*schemas)
+    tables = []
+    for filename in (previous, current):
+      with open(filename, newline="") as fp:
+        tables.append(load_typed_csv(fp, schema, key=key, dialect=dialect, ignore=ignore, strict=bool(schema_file)))
+  except SchemaError as e:
+    raise click.ClickException(str(e))
+  # A column that only one file's values turned into text is compared as text
+  align(*tables)
+  return tables
+
+def sqlite_diff(previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats):
+  from .sqlite import SqliteDiff, SqliteError
+  with SqliteDiff() as engine:
+    try:
+      engine.load("previous", previous, key=key, ignore=ignore, iformat=iformat)
+      engine.load("current", current, key=key, ignore=ignore, iformat=iformat)
+    except SqliteError as e:
+      raise click.ClickException(str(e))
+    write_diff(
+      engine.iter_compare(show_unchanged, stats), oformat, o, key=key, singular=singular,
+      plural=plural, current=engine.table("current"), extras=extras,
+    )
+
+def checkpointed_diff(state_dir, resume, previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats):
+  from .checkpoint import CheckpointedDiff, CheckpointError
+  from .sqlite import SqliteError
+  try:
+    diff = CheckpointedDiff(state_dir, previous, current, key=key, ignore=ignore, iformat=iformat,
+                            show_unchanged=show_unchanged, resume=resume)
+  except CheckpointError as e:
+    raise click.ClickException(str(e))
+  with diff:
+    try:
+      changes = diff.run(stats)
+    except SqliteError as e:
+      raise click.ClickException(str(e))
+    # The output file only appears once it's complete, so one that exists
+    # is never from a run that was cut short. txt and tsv output go to
+    # stdout whatever --o says
+    partial = o + ".partial" if o else None
+    write_diff(
+      changes, oformat, partial, key=key, singular=singular, plural=plural,
+      current=diff.engine.table("current"), extras=extras,
+    )
+    if partial and os.path.exists(partial):
+      os.replace(partial, o)
+
+def watch_diff(previous, current, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, extras, stats, interval):
+  import time
+  from .watch import Watcher
+  watcher = Watcher(previous, current, key=key, ignore=ignore, iformat=iformat,
+                    show_unchanged=show_unchanged, stats=stats)
+  # Each check's records are added to the end of --o, which only ndjson
+  # output can be read back from
+  output = open(o, "w") if o else sys.stdout
+  first = True
+  try:
+    while True:
+      reloads = watcher.reloads
+      try:
+        changes = watcher.poll()
+      except FileNotFoundError:
+        changes = []
+      if watcher.reloads != reloads:
+        click.echo("{} was truncated or rewritten, comparing it again in full".format(current), err=True)
+      if first or changes:
+        write_diff(changes, oformat, None, output, key=key, singular=singular, plural=plural,
+                   current=watcher.current, extras=extras)
+        output.flush()
+      first = False
+      time.sleep(interval)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if o:
+      output.close()
+
+def distributed_diff(previous, current, workers, partitions, key, ignore, iformat, oformat, o, singular, plural, show_unchanged, stats):
+  from .distributed import distributed_compare, DistributedError
+  changes = distributed_compare(
+    previous, current, workers, partitions=partitions, stats=stats,
+    key=key, ignore=ignore, iformat=iformat, show_unchanged=show_unchanged,
+  )
+  try:
+    write_diff(changes, oformat, o, key=key, singular=singular, plural=plural)
+  except DistributedError as e:
+    raise click.ClickException(str(e))
+
+def client_diff(socket, previous, current, **options):
+  from .server import request, ServerError
+  if options["oformat"] in ("patch", "xlsx") and not options["o"]:
+    raise click.UsageError(
+      "--client needs --o for {} output".format(options["oformat"]),
+      ctx=click.get_current_context(),
+    )
+  try:
+    output = request(socket, previous, current, **options)
+  except (OSError, ServerError) as e:
+    raise click.ClickException(str(e))
+  click.echo(output, nl=False)
 
-  if extras and json:
+def fingerprint_loader(fingerprints, key, ignore, iformat):
+  import json
+  from .fingerprint import mismatched_buckets, load_csv_buckets, load_json_buckets, FingerprintError
+  trees = []
+  for filename in fingerprints:
+    with open(filename) as fp:
+      trees.append(json.load(fp))
+  try:
+    buckets = mismatched_buckets(*trees)
+  except FingerprintError as e:
+    raise click.UsageError(str(e), ctx=click.get_current_context())
+  if (trees[0]["key"], trees[0]["ignore"]) != (key, ignore):
     raise click.UsageError(
-      "Extra fields are not supported in JSON output mode",
+      "Fingerprints were made with a different --key or --ignore",
       ctx=click.get_current_context(),
     )
+  depth = trees[0]["depth"]
 
   def load(filename):
     if iformat == "json":
-      return load_json(open(filename), key=key, ignore=ignore)
-    else:
-      return load_csv(
-        open(filename, newline=""), key=key, dialect=dialect.get(iformat), ignore=ignore
+      with open(filename) as fp:
+        return load_json_buckets(fp, buckets, depth, key=key, ignore=ignore)
+    with open(filename, newline="") as fp:
+      return load_csv_buckets(
+        fp, buckets, depth, key=key, dialect=DIALECTS.get(iformat), ignore=ignore
       )
 
-  previous_data = load(previous)
-  current_data = load(current)
+  return load
+
+def estimate_diff(previous, current, key, ignore, iformat, oformat, plural, modulus):
+  import json
+  from .estimate import sample_csv, sample_json, estimate, estimate_text
+
+  def sample(filename):
+    if iformat == "json":
+      with open(filename) as fp:
+        return sample_json(fp, key=key, ignore=ignore, modulus=modulus)
+    with open(filename, newline="") as fp:
+      return sample_csv(fp, key=key, dialect=DIALECTS.get(iformat), ignore=ignore, modulus=modulus)
 
-  diff = compare(previous_data, current_data, show_unchanged)
+  previous_sample, previous_rows = sample(previous)
+  current_sample, current_rows = sample(current)
+  est = estimate(previous_sample, current_sample, modulus, previous_rows, current_rows)
   if oformat == "json":
-    print(std_json.dumps(diff, indent=2))
-  elif oformat == "xlsx":
-    xlsx_diff(diff, o, key, singular, plural, current=current_data, extras=extras)
-  elif oformat == "tsv":
-    print(tsv_diff(diff, key, singular, plural, current=current_data, extras=extras))
+    print(json.dumps(est, indent=2))
   else:
-    print(txt_diff(diff, key, singular, plural, current=current_data, extras=extras))
\ No newline at end of file
+    print(estimate_text(est, plural))
+
+@cli.command()
+@click.argument(
+  "previous",
+  type=click.Path(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+)
+@click.argument(
+  "patch",
+  type=click.Path(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+)
+@click.option(
+  "--iformat",
+  type=click.Choice(["csv", "tsv"]),
+  default=None,
+  help="Explicitly specify input format (csv, tsv) instead of auto-detecting",
+)
+@click.option(
+  "--o",
+  default=None,
+  help="Output file",
+)
+def apply(previous, patch, iformat, o):
+  "Apply a patch made with --oformat patch to PREVIOUS, writing the current CSV"
+  from .patch import apply_patch, PatchError
+  with open(previous, newline="") as prev_fp, open(patch, "rb") as patch_fp:
+    output = open(o, "w", newline="") if o else click.get_text_stream("stdout")
+    try:
+      apply_patch(prev_fp, patch_fp, output, dialect=DIALECTS.get(iformat))
+    except PatchError as e:
+      raise click.ClickException(str(e))
+    finally:
+      if o:
+        output.close()
+
+@cli.command()
+@click.argument(
+  "filename",
+  type=click.Path(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+)
+@click.option(
+  "--key",
+  type=str,
+  default=None,
+  help="Column(s) to use as a unique ID for each row. To use multiple keys, separate them with a comma, e.g., key1,key2"
+)
+@click.option(
+  "--ignore",
+  type=str,
+  default=None,
+  help="Column(s) to be ignored. To ignore multiple keys, separate them with a comma, e.g., key1,key2"
+)
+@click.option(
+  "--iformat",
+  type=click.Choice(["csv", "tsv", "json"]),
+  default=None,
+  help="Explicitly specify input format (csv, tsv, json) instead of auto-detecting",
+)
+@click.option(
+  "--depth",
+  type=click.IntRange(min=0, max=20),
+  default=10,
+  help="Depth of the hash tree: rows are split into 2**depth key ranges (default 10)",
+)
+@click.option(
+  "--o",
+  default=None,
+  help="Output file",
+)
+def fingerprint(filename, key, ignore, iformat, depth, o):
+  "Write a hash tree over the key ranges of FILENAME, for use with --fingerprints"
+  import json
+  from .fingerprint import fingerprint_csv, fingerprint_json
+  if iformat == "json":
+    with open(filename) as fp:
+      tree = fingerprint_json(fp, key=key, ignore=ignore, depth=depth)
+  else:
+    with open(filename, newline="") as fp:
+      tree = fingerprint_csv(fp, key=key, dialect=DIALECTS.get(iformat), ignore=ignore, depth=depth)
+  if o:
+    with open(o, "w") as output:
+      json.dump(tree, output)
+  else:
+    click.echo(json.dumps(tree))
+
+@cli.command()
+@click.argument(
+  "previous",
+  type=InputPath(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+)
+@click.argument(
+  "currents",
+  nargs=-1,
+  required=True,
+  type=InputPath(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+)
+@click.option(
+  "--key",
+  type=str,
+  default=None,
+  help="Column(s) to use as a unique ID for each row. To use multiple keys, separate them with a comma, e.g., key1,key2"
+)
+@click.option(
+  "--ignore",
+  type=str,
+  default=None,
+  help="Column(s) to be ignored. To ignore multiple keys, separate them with a comma, e.g., key1,key2"
+)
+@click.option(
+  "--iformat",
+  type=click.Choice(["csv", "tsv", "json"]),
+  default=None,
+  help="Explicitly specify input format (csv, tsv, json) instead of auto-detecting",
+)
+@click.option(
+  "--oformat",
+  type=click.Choice(list(OUTPUT_FORMATS)),
+  default="txt",
+  help="Output format ({})".format(", ".join(OUTPUT_FORMATS)),
+)
+@click.option(
+  "--output-dir",
+  type=click.Path(file_okay=False),
+  required=True,
+  help="Directory to write one diff per CURRENT file, and summary.json, to",
+)
+@click.option(
+  "--jobs",
+  type=click.IntRange(min=1),
+  default=None,
+  help="Number of diffs to run at the same time (default: one per CPU)",
+)
+@click.option(
+  "--singular",
+  type=str,
+  default=None,
+  help="Singular word to use, e.g. 'tree' for '1 tree'",
+)
+@click.option(
+  "--plural",
+  type=str,
+  default=None,
+  help="Plural word to use, e.g. 'trees' for '2 trees'",
+)
+@click.option(
+  "--show-unchanged",
+  is_flag=True,
+  help="Show unchanged fields for rows with at least one change",
+)
+@click.option(
+  "--stats",
+  is_flag=True,
+  help="Add per-column counts of changed cells and numeric deltas to the output",
+)
+def fanout(previous, currents, key, ignore, iformat, oformat, output_dir, jobs, singular, plural, show_unchanged, stats):
+  "Diff PREVIOUS against each of CURRENTS, loading PREVIOUS only once"
+  from .fanout import fan_out, summary_text
+  if oformat == "patch" and (iformat == "json" or ignore or stats):
+    raise click.UsageError(
+      "Patches can only be made from CSV or TSV files without --ignore or --stats",
+      ctx=click.get_current_context(),
+    )
+  try:
+    summaries = fan_out(
+      previous, currents, output_dir, key=key, ignore=ignore, iformat=iformat, oformat=oformat,
+      workers=jobs, singular=singular, plural=plural, show_unchanged=show_unchanged, stats=stats,
+    )
+  except ValueError as e:
+    raise click.UsageError(str(e), ctx=click.get_current_context())
+  click.echo(summary_text(summaries, singular, plural))
+  if any("error" in summary for summary in summaries):
+    sys.exit(1)
+
+@cli.command()
+@click.argument(
+  "snapshots",
+  nargs=-1,
+  required=True,
+  type=InputPath(exists=True, file_okay=True, dir_okay=False, allow_dash=False),
+)
+@click.option(
+  "--key",
+  type=str,
+  default=None,
+  help="Column(s) to use as a unique ID for each row. To use multiple keys, separate them with a comma, e.g., key1,key2"
+)
+@click.option(
+  "--ignore",
+  type=str,
+  default=None,
+  help="Column(s) to be ignored. To ignore multiple keys, separate them with a comma, e.g., key1,key2"
+)
+@click.option(
+  "--iformat",
+  type=click.Choice(["csv", "tsv", "json"]),
+  default=None,
+  help="Explicitly specify input format (csv, tsv, json) instead of auto-detecting",
+)
+@click.option(
+  "--oformat",
+  type=click.Choice(["txt", "json"]),
+  default="txt",
+  help="Output format (txt, json)",
+)
+@click.option(
+  "--timeline",
+  is_flag=True,
+  help="Instead of a diff per pair of snapshots, list the changes made to each row",
+)
+@click.option(
+  "--jobs",
+  type=click.IntRange(min=1),
+  default=1,
+  help="Number of processes used to parse large CSV files (default 1)",
+)
+@click.option(
+  "--singular",
+  type=str,
+  default=None,
+  help="Singular word to use, e.g. 'tree' for '1 tree'",
+)
+@click.option(
+  "--plural",
+  type=str,
+  default=None,
+  help="Plural word to use, e.g. 'trees' for '2 trees'",
+)
+@click.option(
+  "--show-unchanged",
+  is_flag=True,
+  help="Show unchanged fields for rows with at least one change",
+)
+@click.option(
+  "--stats",
+  is_flag=True,
+  help="Add per-column counts of changed cells and numeric deltas to the output",
+)
+def history(snapshots, key, ignore, iformat, oformat, timeline, jobs, singular, plural, show_unchanged, stats):
+  "Diff each of SNAPSHOTS against the one before it, loading each only once"
+  import json
+  from . import txt_diff, _collect
+  from .history import iter_history, Timeline, txt_timeline
+  if len(snapshots) < 2:
+    raise click.UsageError("At least two SNAPSHOTS are needed", ctx=click.get_current_context())
+  if timeline and (show_unchanged or stats):
+    raise click.UsageError(
+      "--timeline can't be combined with --show-unchanged or --stats",
+      ctx=click.get_current_context(),
+    )
+  events = Timeline() if timeline else None
+  steps = iter_history(snapshots, key=key, ignore=ignore, iformat=iformat, show_unchanged=show_unchanged,
+                       stats=stats, jobs=jobs, timeline=events)
+  if timeline:
+    for _, _, _, changes in steps:
+      for _ in changes:
+        pass
+    if oformat == "json":
+      click.echo(json.dumps(events.as_list(), indent=2))
+    else:
+      click.echo(txt_timeline(events, key))
+    return
+  # One pair's diff is held at a time
+  for i, (previous, current, current_table, changes) in enumerate(steps):
+    if oformat == "json":
+      step = {"previous": previous, "current": current, "diff": _collect(changes)}
+      text = json.dumps(step, indent=2, default=dict).replace("\n", "\n  ")
+      click.echo("{}\n  {}".format("," if i else "[", text), nl=False)
+    else:
+      text = txt_diff(changes, key, singular, plural, current=current_table)
+      click.echo("{}{} -> {}\n\n{}".format("\n" if i else "", previous, current, text))
+  if oformat == "json":
+    click.echo("\n]")
+
+@cli.command()
+@click.option(
+  "--host",
+  default="127.0.0.1",
+  help="Address to listen on (default 127.0.0.1, use 0.0.0.0 for every interface)",
+)
+@click.option(
+  "--port",
+  type=click.IntRange(min=0, max=65535),
+  default=8765,
+  help="Port to listen on (default 8765)",
+)
+def worker(host, port):
+  "Compare key ranges of files for 'csv-diff --worker HOST:PORT'"
+  from .distributed import DiffWorker
+  server = DiffWorker((host, port))
+  click.echo("Listening on {}:{}".format(*server.server_address[:2]), err=True)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+@cli.command()
+@click.argument("socket", type=click.Path(dir_okay=False))
+@click.option(
+  "--workers",
+  type=click.IntRange(min=1),
+  default=4,
+  help="Number of diffs to run at the same time (default 4)",
+)
+@click.option(
+  "--cache-size",
+  type=click.IntRange(min=0),
+  default=512,
+  help="Megabytes of loaded files to keep in memory between requests (default 512)",
+)
+def serve(socket, workers, cache_size):
+  "Run diffs for 'csv-diff --client SOCKET' from a server listening on SOCKET"
+  from .cache import TableCache
+  from .server import DiffServer
+  server = DiffServer(socket, workers=workers, cache=TableCache(cache_size * 1024 ** 2))
+  click.echo("Listening on {}".format(socket), err=True)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+@cli.command()
+@click.option(
+  "--clear",
+  is_flag=True,
+  help="Delete every stored result",
+)
+def cache(clear):
+  "Show how the result cache in $CSV_DIFF_CACHE_DIR is doing"
+  from .cache import ResultCache, ResultCacheError
+  try:
+    results = ResultCache()
+  except ResultCacheError as e:
+    raise click.ClickException(str(e))
+  if clear:
+    results.clear()
+  stats = results.stats()
+  looked_up = stats["hits"] + stats["misses"]
+  click.echo("Directory: {}".format(stats["directory"]))
+  click.echo("Results: {} using {} of {} bytes".format(stats["results"], stats["bytes"], stats["max_bytes"]))
+  click.echo("Hits: {}, misses: {} ({:.0%} hit rate)".format(
+    stats["hits"], stats["misses"], stats["hits"] / looked_up if looked_up else 0
+  ))
+  click.echo("Evictions: {}".format(stats["evictions"]))
@@ -0,0 +1,277 @@
+import heapq
+import itertools
+import json
+import os
+import socket
+import socketserver
+from . import (
+    RMOD, RADD, RREM, CADD, CREM, STAT, DIALECTS, Change, ColumnStats,
+    iter_compare, load_json, _iter_keyed_rows, _key_hash,
+)
+
+# Coordinator and workers speak in single lines of JSON, like the --client
+# server. The coordinator sends
+#
+#   {"previous": ..., "current": ..., "key": ..., "partition": 2, "partitions": 8, ...}
+#
+# and the worker compares the rows whose _key_hash(key) % partitions is
+# partition, answering with one line per change, in the order iter_compare
+# yields them:
+#
+#   {"action": ..., "key": ..., "fields": ..., "position": ...}
+#
+# then {"done": <number of changes>}, or {"error": "<message>"}. position
+# is the index of the row in the file it comes from (current for modified
+# and added rows, previous for removed ones), which lets the coordinator
+# merge the partitions back into the order a single compare would use.
+OPTIONS = ("key", "ignore", "iformat", "show_unchanged")
+# Rank of each action in the merged output
+ORDER = {CADD: 0, CREM: 1, RMOD: 2, RADD: 3, RREM: 4}
+# Seconds to wait for a worker to connect or send the next change
+TIMEOUT = 300
+RETRIES = 2
+
+
+class DistributedError(Exception):
+    pass
+
+
+class WorkerError(Exception):
+    pass
+
+
+class DiffWorker(socketserver.ThreadingTCPServer):
+    """Compares one key-hash range of two files for a coordinator.
+
+    Each connection is handled in its own thread. The files are opened by
+    the paths the coordinator sends, so they must be readable from the
+    worker's host at the same paths, on a shared file system for example.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _Handler)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            params = json.loads(self.rfile.readline())
+            load = lambda filename: load_partition(
+                filename, params["partition"], params["partitions"],
+                key=params.get("key"), ignore=params.get("ignore"), iformat=params.get("iformat"),
+            )
+            previous, previous_positions = load(params["previous"])
+            current, current_positions = load(params["current"])
+            count = 0
+            for change in _columns_sorted(iter_compare(previous, current, params.get("show_unchanged", False))):
+                positions = previous_positions if change.action == RREM else current_positions
+                record = {
+                    "action": change.action,
+                    "key": change.key,
+                    "fields": change.fields,
+                    "position": positions.get(change.key, 0),
+                }
+                if change.unchanged is not None:
+                    record["unchanged"] = dict(change.unchanged)
+                self._send(record)
+                count += 1
+            response = {"done": count}
+        except Exception as e:
+            response = {"error": "{}: {}".format(type(e).__name__, e)}
+        self._send(response)
+
+    def _send(self, record):
+        self.wfile.write(json.dumps(record).encode("utf8") + b"\n")
+
+
+def _columns_sorted(changes):
+    # The column changes come first, in set order; the coordinator merges
+    # them by name
+    columns = []
+    for change in changes:
+        if change.action not in (CADD, CREM):
+            yield from sorted(columns, key=lambda c: (ORDER[c.action], c.key))
+            columns = None
+            yield change
+            break
+        columns.append(change)
+    if columns:
+        yield from sorted(columns, key=lambda c: (ORDER[c.action], c.key))
+    yield from changes
+
+
+def load_partition(filename, partition, partitions, key=None, ignore=None, iformat=None):
+    """Load the rows of filename whose key hash falls in partition.
+
+    Returns (table, positions), where positions maps each key to the index
+    of its row among all the rows of the file, counting a repeated key at
+    its first row as load_file does.
+    """
+    select = lambda id: _key_hash(id) % partitions == partition
+    table = {}
+    positions = {}
+    if iformat == "json":
+        with open(filename) as fp:
+            for position, (id, row) in enumerate(load_json(fp, key=key, ignore=ignore).items()):
+                if select(id):
+                    table[id] = row
+                    positions[id] = position
+        return table, positions
+    counter = itertools.count()
+    position = [0]
+
+    def counted(id):
+        position[0] = next(counter)
+        return select(id)
+
+    with open(filename, newline="") as fp:
+        for id, row in _iter_keyed_rows(fp, key, DIALECTS.get(iformat), ignore, counted):
+            table[id] = row
+            positions.setdefault(id, position[0])
+    return table, positions
+
+
+def distributed_compare(previous, current, workers, partitions=None, stats=False,
+                        retries=RETRIES, timeout=TIMEOUT, **options):
+    """Yields the changes iter_compare(previous, current) would, worked out
+    by workers, a list of (host, port) of DiffWorker servers.
+
+    Both files are split into partitions key-hash ranges (one per worker by
+    default), handed out to the workers in turn. Every worker streams back
+    the changes for its ranges, which are merged as they arrive. A range
+    whose worker can't be reached, fails or stops answering is run again on
+    the next worker, up to retries times, picking up where the failed one
+    left off. options are key, ignore, iformat and show_unchanged.
+
+    Added and removed columns come first, sorted by name. pair_similar
+    needs all the rows in one place and isn't supported.
+    """
+    if not workers:
+        raise ValueError("At least one worker is needed")
+    partitions = partitions or len(workers)
+    request = {
+        "previous": os.path.abspath(previous),
+        "current": os.path.abspath(current),
+        "partitions": partitions,
+    }
+    for option in OPTIONS:
+        if options.get(option) is not None:
+            request[option] = options[option]
+    streams = [_Partition(request, i, workers, retries, timeout) for i in range(partitions)]
+    try:
+        # Every range is requested before any is read, so that the workers
+        # load and compare at the same time
+        for stream in streams:
+            stream.start()
+        column_stats = {}
+        last = None
+        for order, change in heapq.merge(*streams, key=lambda item: item[0]):
+            if change.action in (CADD, CREM):
+                # Every range with rows on both sides reports the columns
+                if order == last:
+                    continue
+                last = order
+            elif stats and change.action == RMOD:
+                for field, (prev_value, current_value) in change.fields.items():
+                    if field not in column_stats:
+                        column_stats[field] = ColumnStats()
+                    column_stats[field].add(prev_value, current_value)
+            yield change
+        if stats:
+            yield Change(STAT, None, {field: c.as_dict() for field, c in column_stats.items()})
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def parse_address(text):
+    "Parse host:port into (host, port)"
+    host, _, port = text.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError("Expected host:port, not {!r}".format(text))
+    return host, int(port)
+
+
+class _Partition:
+    # The changes of one key-hash range, as (sort key, Change) pairs
+
+    def __init__(self, request, index, workers, retries, timeout):
+        self.request = dict(request, partition=index)
+        self.index = index
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.attempts = 0
+        self.errors = []
+        self.sock = None
+        self.fp = None
+
+    def start(self):
+        try:
+            self.sock = socket.create_connection(self.worker(), timeout=self.timeout)
+            self.sock.sendall(json.dumps(self.request).encode("utf8") + b"\n")
+            self.fp = self.sock.makefile("rb")
+        except OSError as e:
+            self.failed(e)
+
+    def worker(self):
+        return self.workers[(self.index + self.attempts) % len(self.workers)]
+
+    def failed(self, error):
+        self.close()
+        self.errors.append("{}:{}: {}".format(*self.worker(), error))
+        self.attempts += 1
+        if self.attempts > self.retries:
+            raise DistributedError("Range {} of {} failed on every try ({})".format(
+                self.index, self.request["partitions"], "; ".join(self.errors)
+            ))
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = self.fp = None
+
+    def __iter__(self):
+        received = 0
+        while True:
+            if self.fp is None:
+                self.start()
+                continue
+            try:
+                # A retry starts from the beginning of the range; the changes
+                # already passed on come out the same and are skipped
+                skip = received
+                for line in self.fp:
+                    record = json.loads(line)
+                    if "error" in record:
+                        raise WorkerError(record["error"])
+                    if "done" in record:
+                        self.close()
+                        return
+                    if skip:
+                        skip -= 1
+                        continue
+                    received += 1
+                    yield _sort_key(record), _change(record)
+                raise WorkerError("Connection closed before the last change")
+            except (OSError, ValueError, WorkerError) as e:
+                self.failed(e)
+
+
+def _sort_key(record):
+    if record["action"] in (CADD, CREM):
+        return ORDER[record["action"]], 0, record["key"]
+    return ORDER[record["action"]], record["position"], ""
+
+
+def _change(record):
+    key = record["key"]
+    # Multi-column keys are sent as lists
+    if isinstance(key, list):
+        key = tuple(key)
+    return Change(record["action"], key, record["fields"], record.get("unchanged"))
@@ -0,0 +1,103 @@
+import math
+from . import (
+    RMOD, RADD, RREM, CADD, CREM, FLDS,
+    compare, load_json, _iter_keyed_rows, _key_hash,
+)
+
+# Two-sided 95% confidence
+Z = 1.96
+
+
+def sample_csv(fp, key=None, dialect=None, ignore=None, modulus=100):
+    """Return (rows whose key hash is divisible by modulus, total rows).
+
+    Keys are hashed the same way for both files, so the previous and current
+    samples hold the same keys and can be compared directly.
+    """
+    total = [0]
+
+    def select(id):
+        total[0] += 1
+        return _key_hash(id) % modulus == 0
+
+    sample = dict(_iter_keyed_rows(fp, key, dialect, ignore, select))
+    return sample, total[0]
+
+
+def sample_json(fp, key=None, ignore=None, modulus=100):
+    # JSON has to be parsed as a whole, so this only saves the compare cost
+    table = load_json(fp, key=key, ignore=ignore)
+    sample = {id: row for id, row in table.items() if _key_hash(id) % modulus == 0}
+    return sample, len(table)
+
+
+def estimate(previous, current, modulus, previous_rows, current_rows):
+    """Scale up the diff of two key samples into estimated change counts"""
+    diff = compare(previous, current)
+    common = sum(1 for id in current if id in previous)
+    changed = {}
+    for row in diff[RMOD]:
+        for field in row[FLDS]:
+            changed[field] = changed.get(field, 0) + 1
+    return {
+        "Sample": {
+            "modulus": modulus,
+            "previous_rows": previous_rows,
+            "current_rows": current_rows,
+            "previous_sampled": len(previous),
+            "current_sampled": len(current),
+        },
+        RMOD: _scale(len(diff[RMOD]), modulus),
+        RADD: _scale(len(diff[RADD]), modulus),
+        RREM: _scale(len(diff[RREM]), modulus),
+        CADD: sorted(diff[CADD]),
+        CREM: sorted(diff[CREM]),
+        "Column change rates": {
+            field: count / common for field, count in sorted(changed.items())
+        },
+    }
+
+
+def _scale(count, modulus):
+    # Each row is sampled with probability p = 1/modulus, so the count is
+    # binomial: the estimate is count/p with variance count*(1-p)/p^2
+    p = 1 / modulus
+    if count:
+        spread = Z * math.sqrt(count * (1 - p)) / p
+    else:
+        # Rule of three: nothing seen, fewer than 3/p with 95% confidence
+        spread = 3 / p if modulus > 1 else 0
+    return {
+        "estimate": count * modulus,
+        "low": max(0, int(count * modulus - spread)),
+        "high": int(math.ceil(count * modulus + spread)),
+    }
+
+
+def estimate_text(est, plural=None):
+    plural = plural or "rows"
+    sample = est["Sample"]
+    lines = [
+        "Estimated from 1 in {} keys ({} of {} previous and {} of {} current {})".format(
+            sample["modulus"],
+            sample["previous_sampled"], sample["previous_rows"],
+            sample["current_sampled"], sample["current_rows"],
+            plural,
+        ),
+        "",
+    ]
+    for action, verb in ((RMOD, "changed"), (RADD, "added"), (RREM, "removed")):
+        bounds = est[action]
+        lines.append(
+            "  ~{} {} {} (95% confidence: {} to {})".format(
+                bounds["estimate"], plural, verb, bounds["low"], bounds["high"]
+            )
+        )
+    for action, verb in ((CADD, "added"), (CREM, "removed")):
+        if est[action]:
+            lines.append("  columns {}: {}".format(verb, ", ".join(est[action])))
+    if est["Column change rates"]:
+        lines.extend(["", "Column change rates", ""])
+        for field, rate in est["Column change rates"].items():
+            lines.append("  {}: {:.1%}".format(field, rate))
+    return "\n".join(lines)
@@ -0,0 +1,115 @@
+import gc
+import json
+import multiprocessing
+import os
+from . import RMOD, RADD, RREM, CADD, CREM, load_file, iter_compare, write_diff
+
+EXTENSIONS = {"txt": ".txt", "tsv": ".tsv", "json": ".json", "ndjson": ".ndjson", "xlsx": ".xlsx", "patch": ".patch"}
+SUMMARY = "summary.json"
+
+# The previous table, set before the worker processes are forked so that they
+# all read the parent's copy instead of loading or unpickling their own
+_previous = None
+
+
+def fan_out(previous, currents, output_dir, key=None, ignore=None, iformat=None, oformat="txt",
+            workers=None, **options):
+    """Diff one previous file against each of currents.
+
+    previous is loaded once. Each current file is loaded and compared in a
+    worker process forked from this one, which shares the previous table
+    copy-on-write, and its diff is written to output_dir as the current
+    file's name plus the extension of oformat. Other options (singular,
+    plural, show_unchanged, stats, extras) are as for write_diff and
+    iter_compare.
+
+    Returns a summary per current file, in order, which is also written to
+    output_dir/summary.json. Where fork isn't available the comparisons
+    run one after another in this process.
+    """
+    global _previous
+    names = [os.path.basename(current) for current in currents]
+    if len(set(names)) != len(names):
+        raise ValueError("Current files must have different names")
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [
+        (current, os.path.join(output_dir, name + EXTENSIONS.get(oformat, "." + oformat)),
+         key, ignore, iformat, oformat, options)
+        for current, name in zip(currents, names)
+    ]
+
+    _previous = load_file(previous, key=key, ignore=ignore, iformat=iformat)
+    try:
+        if "fork" in multiprocessing.get_all_start_methods() and (workers or 0) != 1 and len(tasks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            # Keep the collector from touching, and so copying, every object
+            # of the previous table in each worker
+            gc.freeze()
+            try:
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                    summaries = list(pool.map(_diff_one, tasks))
+            finally:
+                gc.unfreeze()
+        else:
+            summaries = [_diff_one(task) for task in tasks]
+    finally:
+        _previous = None
+
+    with open(os.path.join(output_dir, SUMMARY), "w") as fp:
+        json.dump(summaries, fp, indent=2)
+    return summaries
+
+
+def summary_text(summaries, singular=None, plural=None):
+    singular = singular or "row"
+    plural = plural or "rows"
+    lines = []
+    for summary in summaries:
+        if "error" in summary:
+            lines.append("{}: error: {}".format(summary["current"], summary["error"]))
+            continue
+        counts = ", ".join(
+            "{} {} {}".format(summary[action], singular if summary[action] == 1 else plural, word)
+            for action, word in ((RMOD, "changed"), (RADD, "added"), (RREM, "removed"))
+        )
+        for action, word in ((CADD, "added"), (CREM, "removed")):
+            if summary[action]:
+                counts += ", {} {} {}".format(
+                    len(summary[action]), "column" if len(summary[action]) == 1 else "columns", word
+                )
+        lines.append("{}: {} -> {}".format(summary["current"], counts, summary["output"]))
+    return "\n".join(lines)
+
+
+def _diff_one(task):
+    current, output, key, ignore, iformat, oformat, options = task
+    summary = {"current": current, "output": output}
+    try:
+        current_table = load_file(current, key=key, ignore=ignore, iformat=iformat)
+        counts = {RMOD: 0, RADD: 0, RREM: 0, CADD: [], CREM: []}
+        changes = _counted(
+            iter_compare(_previous, current_table, options.get("show_unchanged", False), options.get("stats", False)),
+            counts,
+        )
+        render = dict(
+            key=key, singular=options.get("singular"), plural=options.get("plural"),
+            current=current_table, extras=options.get("extras"),
+        )
+        if oformat in ("txt", "tsv"):
+            with open(output, "w") as fp:
+                write_diff(changes, oformat, stdout=fp, **render)
+        else:
+            write_diff(changes, oformat, o=output, **render)
+        summary.update(counts)
+    except Exception as e:
+        summary["error"] = "{}: {}".format(type(e).__name__, e)
+    return summary
+
+
+def _counted(changes, counts):
+    for change in changes:
+        if change.action in (CADD, CREM):
+            counts[change.action].append(change.key)
+        elif change.action in counts:
+            counts[change.action] += 1
+        yield change
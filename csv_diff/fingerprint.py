@@ -0,0 +1,103 @@
+import hashlib
+import json
+from . import load_json, _iter_keyed_rows, _key_hash
+
+# A fingerprint is a complete binary hash tree over 2**depth key ranges. A row
+# belongs to range _key_hash(key) % 2**depth, and a leaf combines the digests
+# of its rows by addition, so it doesn't depend on row order. Comparing two
+# trees from the root down finds the ranges that differ by looking at a few
+# hashes instead of every row.
+VERSION = 1
+DEFAULT_DEPTH = 10
+_MOD = 2 ** 128
+
+
+class FingerprintError(Exception):
+    pass
+
+
+def fingerprint_csv(fp, key=None, dialect=None, ignore=None, depth=DEFAULT_DEPTH):
+    return _build(_iter_keyed_rows(fp, key, dialect, ignore), key, ignore, depth)
+
+
+def fingerprint_json(fp, key=None, ignore=None, depth=DEFAULT_DEPTH):
+    return _build(load_json(fp, key=key, ignore=ignore).items(), key, ignore, depth)
+
+
+def _build(rows, key, ignore, depth):
+    size = 2 ** depth
+    sums = [0] * size
+    counts = [0] * size
+    columns = None
+    for id, row in rows:
+        if columns is None:
+            columns = sorted(row.keys())
+        bucket = _key_hash(id) % size
+        digest = hashlib.sha1(
+            json.dumps([id, row], sort_keys=True).encode("utf8")
+        ).digest()
+        sums[bucket] = (sums[bucket] + int.from_bytes(digest[:16], "big")) % _MOD
+        counts[bucket] += 1
+    level = [
+        _digest("{}:{:032x}".format(count, total).encode("utf8"))
+        for count, total in zip(counts, sums)
+    ]
+    levels = [level]
+    while len(level) > 1:
+        level = [
+            _digest((level[i] + level[i + 1]).encode("utf8"))
+            for i in range(0, len(level), 2)
+        ]
+        levels.insert(0, level)
+    return {
+        "version": VERSION,
+        "key": key,
+        "ignore": ignore,
+        "depth": depth,
+        "rows": sum(counts),
+        "columns": columns or [],
+        "levels": levels,
+    }
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()[:32]
+
+
+def mismatched_buckets(previous, current):
+    """Return the sorted key ranges whose rows differ between two trees"""
+    for setting in ("version", "key", "ignore", "depth"):
+        if previous.get(setting) != current.get(setting):
+            raise FingerprintError(
+                "Fingerprints were made with different {} settings".format(setting)
+            )
+    depth = previous["depth"]
+    mismatched = []
+    pending = [(0, 0)]
+    while pending:
+        level, index = pending.pop()
+        if previous["levels"][level][index] == current["levels"][level][index]:
+            continue
+        if level == depth:
+            mismatched.append(index)
+        else:
+            pending.extend([(level + 1, 2 * index), (level + 1, 2 * index + 1)])
+    return sorted(mismatched)
+
+
+def load_csv_buckets(fp, buckets, depth, key=None, dialect=None, ignore=None):
+    """Like load_csv, but only keeps the rows in the given key ranges"""
+    size = 2 ** depth
+    buckets = set(buckets)
+    select = lambda id: _key_hash(id) % size in buckets
+    return dict(_iter_keyed_rows(fp, key, dialect, ignore, select))
+
+
+def load_json_buckets(fp, buckets, depth, key=None, ignore=None):
+    size = 2 ** depth
+    buckets = set(buckets)
+    return {
+        id: row
+        for id, row in load_json(fp, key=key, ignore=ignore).items()
+        if _key_hash(id) % size in buckets
+    }
@@ -0,0 +1,88 @@
+from . import RMOD, RADD, RREM, load_file, iter_compare
+
+WORDS = {RMOD: "changed", RADD: "added", RREM: "removed"}
+
+
+def iter_history(snapshots, key=None, ignore=None, iformat=None, show_unchanged=False, stats=False,
+                 jobs=1, timeline=None):
+    """Diff each of snapshots against the one before it.
+
+    Yields (previous, current, current_table, changes) for each neighbouring
+    pair of file names, where changes is the iter_compare() generator for
+    the pair. Each snapshot is loaded once, and only the two tables of the
+    current pair are kept, so changes must be used up before asking for the
+    next pair, and current_table shouldn't be kept after that.
+
+    Pass a Timeline as timeline to have it record every row change.
+    """
+    if len(snapshots) < 2:
+        raise ValueError("At least two snapshots are needed")
+    load = lambda filename: load_file(filename, key=key, ignore=ignore, iformat=iformat, jobs=jobs)
+    previous_table = load(snapshots[0])
+    for previous, current in zip(snapshots, snapshots[1:]):
+        current_table = load(current)
+        changes = iter_compare(previous_table, current_table, show_unchanged, stats)
+        if timeline is not None:
+            changes = timeline.recorded(current, changes)
+        yield previous, current, current_table, changes
+        # Drop the older table before the next snapshot is loaded
+        previous_table = current_table
+
+
+class Timeline:
+    """The changes made to each row across a series of snapshots.
+
+    Only what is needed to tell the story of a row is kept: the snapshot a
+    change was first seen in, the action, and for modified rows the
+    previous and current values of the changed fields. Added and removed
+    rows can be looked up in their snapshot.
+    """
+
+    def __init__(self):
+        self.events = {}
+
+    def add(self, snapshot, change):
+        if change.action not in WORDS:
+            return
+        fields = change.fields if change.action == RMOD else None
+        self.events.setdefault(change.key, []).append((snapshot, change.action, fields))
+
+    def recorded(self, snapshot, changes):
+        for change in changes:
+            self.add(snapshot, change)
+            yield change
+
+    def __len__(self):
+        return len(self.events)
+
+    def items(self):
+        "(key, events) for each changed row, in the order they first changed"
+        return self.events.items()
+
+    def as_list(self):
+        return [
+            {
+                "key": list(id) if isinstance(id, tuple) else id,
+                "changes": [
+                    dict({"snapshot": snapshot, "action": action}, **({"fields": fields} if fields else {}))
+                    for snapshot, action, fields in events
+                ],
+            }
+            for id, events in self.items()
+        ]
+
+
+def txt_timeline(timeline, key=None):
+    blocks = []
+    for id, events in timeline.items():
+        if key:
+            block = ["{}: {}".format(key, ", ".join(id) if isinstance(id, tuple) else id)]
+        else:
+            # Rows without a key are known by the hash of their values
+            block = ["Row: {}".format(id)]
+        for snapshot, action, fields in events:
+            block.append("  {}: {}".format(snapshot, WORDS[action]))
+            for field, (prev_value, current_value) in (fields or {}).items():
+                block.append('    {}: "{}" => "{}"'.format(field, prev_value, current_value))
+        blocks.append("\n".join(block))
+    return "\n\n".join(blocks)
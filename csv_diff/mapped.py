@@ -0,0 +1,265 @@
+import codecs
+import csv
+import io
+import locale
+import mmap
+import re
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate, repeat
+from operator import add, methodcaller
+from . import load_csv, _keyfn, _sniff_dialect
+from .parallel import _format_params
+
+# Bytes of the file scanned at a time while loading
+READ_SIZE = 16 * 1024 ** 2
+
+
+def load_mapped(filename, key=None, dialect=None, ignore=None, encoding=None):
+    """Like load_csv(open(filename)), without decoding the file up front.
+
+    Returns a MappedTable, or what load_csv returns if the encoding isn't
+    ASCII compatible (UTF-8, Latin-1, ... are), which the byte scanning
+    relies on.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    if dialect is None:
+        with open(filename, newline="", encoding=encoding) as fp:
+            dialect = _sniff_dialect(fp)
+    params = _format_params(dialect or "excel")
+    separators = params["delimiter"] + params["quotechar"] + (params["escapechar"] or "") + "\r\n"
+    if separators.encode(encoding, "replace") != separators.encode("ascii", "replace"):
+        with open(filename, newline="", encoding=encoding) as fp:
+            return load_csv(fp, key=key, dialect=dialect, ignore=ignore)
+    return MappedTable(filename, params, key=key, ignore=ignore, encoding=encoding)
+
+
+class MappedTable(Mapping):
+    """The rows of a memory-mapped CSV file by key, decoded as they are used.
+
+    Only the key columns are decoded while loading. The table keeps where
+    each record starts in the file, and builds the row dict each time its
+    key is looked up. same_row_test() compares two records' bytes, which
+    iter_compare uses to pass over rows that are identical in both files
+    without decoding either.
+
+    With a key, the file is scanned READ_SIZE bytes at a time. A block
+    without quote or escape characters is one record per line, and its keys
+    are picked out with a regular expression and decoded in bulk. Other
+    blocks are fed line by line to the csv module, which says where each
+    record ends. The file stays mapped until close().
+    """
+
+    def __init__(self, filename, params, key=None, ignore=None, encoding=None):
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.params = params
+        self.ignore = frozenset(ignore.split(",")) if ignore else frozenset()
+        self._delimiter = params["delimiter"]
+        # Records without these are their fields joined by the delimiter,
+        # unless spaces after delimiters are to be skipped
+        self._special = [params["escapechar"].encode(self.encoding)] if params["escapechar"] else []
+        if params["quoting"] != csv.QUOTE_NONE:
+            self._special.append(params["quotechar"].encode(self.encoding))
+        self._split = not params["skipinitialspace"]
+        # key -> record number
+        self._index = {}
+        # Where each record starts, then where the one after the last would.
+        # Records are followed by a newline, so record n ends a byte before
+        # record n + 1 starts
+        self._starts = array("q")
+        with open(filename, "rb") as fp:
+            try:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                self._map = b""
+        self._view = memoryview(self._map)
+        _, pos, self.headings = next(self._records(0), (0, 0, []))
+        self._crlf = self._map[pos - 2:pos] == b"\r\n"
+        # Rows laid out the same way with the same bytes are the same rows;
+        # the line terminator is only for writing
+        read_params = tuple(sorted((k, v) for k, v in params.items() if k != "lineterminator"))
+        self._layout = (tuple(self.headings), self.ignore, read_params, self.encoding)
+        self._load(pos, key)
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, id):
+        n = self._index[id]
+        return self._row(self._map[self._starts[n]:self._starts[n + 1] - 1])
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, id):
+        return id in self._index
+
+    def same_row_test(self, other):
+        """A function telling whether a key's row in this table is made of
+        the same bytes as in other, which is then the same row, or None if
+        other isn't a MappedTable laid out the same way."""
+        if not isinstance(other, MappedTable) or other._layout != self._layout:
+            return None
+        index, starts, view = self._index, self._starts, self._view
+        other_index, other_starts, other_view = other._index, other._starts, other._view
+        if self._crlf == other._crlf:
+            def same_row(id):
+                n = index[id]
+                m = other_index[id]
+                return view[starts[n]:starts[n + 1] - 1] == other_view[other_starts[m]:other_starts[m + 1] - 1]
+
+            return same_row
+
+        # One file's lines end in \r\n and the other's in \n
+        def record(view, starts, n):
+            end = starts[n + 1] - 1
+            if view[end - 1:end] == b"\r":
+                end -= 1
+            return view[starts[n]:end]
+
+        def same_row(id):
+            return record(view, starts, index[id]) == record(other_view, other_starts, other_index[id])
+
+        return same_row
+
+    def _load(self, pos, key):
+        data = self._map
+        size = len(data)
+        starts = self._starts
+        index = self._index
+        # Missing key columns only matter if there are rows to key
+        columns = self._key_columns(key) if pos < size else None
+        bulk_keys = self._bulk_keys(columns)
+        keyfn = _keyfn(None)
+        while pos < size:
+            if pos + READ_SIZE >= size:
+                # The last block, without the file's final newline
+                end = size - 1 if data[size - 1:size] == b"\n" else size
+            else:
+                end = data.rfind(b"\n", pos, pos + READ_SIZE)
+            block = data[pos:end] if end > pos else b""
+            ids = bulk_keys(block) if bulk_keys and block else None
+            if ids is not None:
+                index.update(zip(ids, range(len(starts), len(starts) + len(ids))))
+                starts.extend(accumulate(map(add, map(len, block.split(b"\n")), repeat(1)), initial=pos))
+                # That was where the next block starts
+                starts.pop()
+                pos = end + 1
+                continue
+            # The records that start in this block, the last of which can
+            # end after it
+            for start, pos, fields in self._records(pos):
+                if columns is None:
+                    id = keyfn(self._fields_row(fields))
+                elif len(columns) == 1:
+                    id = fields[columns[0]]
+                else:
+                    id = tuple(fields[c] for c in columns)
+                index[id] = len(starts)
+                starts.append(start)
+                if pos > end:
+                    break
+        starts.append(pos)
+
+    def _key_columns(self, key):
+        # The positions of the key columns in a record, or None without a key
+        if not key:
+            return None
+        columns = []
+        for name in key.split(","):
+            if name not in self.headings or name in self.ignore:
+                raise KeyError(name)
+            # The last column with each name, as zip() into a dict gives
+            columns.append(len(self.headings) - 1 - self.headings[::-1].index(name))
+        return columns
+
+    def _bulk_keys(self, columns):
+        # A function from a block of plain lines to their keys, returning
+        # None for blocks that have to be read record by record
+        if columns is None or not self._split:
+            return None
+        delimiter = re.escape(self._delimiter.encode(self.encoding))
+        # Blank lines don't match, as they have no fields
+        patterns = [
+            re.compile(
+                b"^(?=[^\\r\\n])(?:[^%s\\n]*%s){%d}([^%s\\r\\n]*)" % (delimiter, delimiter, column, delimiter),
+                re.M,
+            )
+            for column in columns
+        ]
+        if codecs.lookup(self.encoding).name == "utf-8":
+            decode = bytes.decode
+        else:
+            decode = methodcaller("decode", self.encoding)
+        special = self._special
+
+        def keys(block):
+            for char in special:
+                if char in block:
+                    return None
+            lines = block.count(b"\n") + 1
+            columns = []
+            for pattern in patterns:
+                found = pattern.findall(block)
+                if len(found) != lines:
+                    # A blank line or one without enough fields
+                    return None
+                columns.append(list(map(decode, found)))
+            return columns[0] if len(columns) == 1 else list(zip(*columns))
+
+        return keys
+
+    def _records(self, pos):
+        # (start, start of the next record, fields) for each record from pos
+        # on, as the csv module reads them
+        data = self._map
+        size = len(data)
+        encoding = self.encoding
+        consumed = pos
+
+        def lines():
+            nonlocal consumed
+            while consumed < size:
+                end = data.find(b"\n", consumed)
+                end = size if end == -1 else end + 1
+                line = data[consumed:end].decode(encoding)
+                consumed = end
+                yield line
+
+        start = pos
+        # The reader asks for another line only while a record is unfinished
+        for fields in csv.reader(lines(), **self.params):
+            # A last record without a newline ends where one would be
+            following = consumed if data[consumed - 1:consumed] == b"\n" else consumed + 1
+            yield start, following, fields
+            start = following
+
+    def _fields(self, record):
+        if record.endswith(b"\r"):
+            record = record[:-1]
+        if not record:
+            # Blank lines, which csv.reader reads as no fields
+            return []
+        text = record.decode(self.encoding)
+        if self._split and not any(char in record for char in self._special):
+            return text.split(self._delimiter)
+        return next(csv.reader(io.StringIO(text, newline=""), **self.params), [])
+
+    def _row(self, record):
+        return self._fields_row(self._fields(record))
+
+    def _fields_row(self, fields):
+        ignore = self.ignore
+        return dict((k, v) for k, v in zip(self.headings, fields) if k not in ignore)
@@ -0,0 +1,132 @@
+import csv
+import io
+import locale
+import os
+from concurrent.futures import ProcessPoolExecutor
+from . import load_csv, _doubled_quotes, _keyfn, _sniff_dialect
+
+# Files are split into ranges of about this many bytes, each parsed by a
+# worker process. Smaller files are parsed in-process with load_csv.
+CHUNK_SIZE = 32 * 1024 ** 2
+BLOCK_SIZE = 1024 ** 2
+FORMAT_PARAMS = (
+    "delimiter", "quotechar", "escapechar", "doublequote",
+    "skipinitialspace", "lineterminator", "quoting", "strict",
+)
+
+
+def load_csv_parallel(filename, key=None, dialect=None, ignore=None, workers=None,
+                      chunk_size=None, encoding=None):
+    """Like load_csv(open(filename)), parsing byte ranges in worker processes.
+
+    A range may only start where a record starts. A newline ends a record
+    unless it is inside a quoted field, and every quote character toggles
+    whether we are inside one ("" escapes toggle twice), so the workers first
+    count the quotes in each range. Each boundary is then moved to the first
+    newline after it that has an even number of quotes before it.
+
+    The encoding must be ASCII compatible (UTF-8, Latin-1, ...). Dialects that
+    escape quotes with an escape character fall back to load_csv.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    chunk_size = chunk_size or CHUNK_SIZE
+    if dialect is None:
+        with open(filename, newline="", encoding=encoding) as fp:
+            dialect = _doubled_quotes(_sniff_dialect(fp))
+    params = _format_params(dialect or "excel")
+    size = os.path.getsize(filename)
+    if size <= chunk_size or params["escapechar"] or not params["doublequote"]:
+        with open(filename, newline="", encoding=encoding) as fp:
+            return load_csv(fp, key=key, dialect=dialect, ignore=ignore)
+
+    quote = None
+    if params["quoting"] != csv.QUOTE_NONE:
+        quote = params["quotechar"].encode(encoding)
+
+    with open(filename, "rb") as fp:
+        data_start = _next_record(fp, 0, False, quote) or size
+        fp.seek(0)
+        headings = next(csv.reader(io.StringIO(fp.read(data_start).decode(encoding), newline=""), **params))
+        nominal = list(range(data_start, size, chunk_size)) + [size]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = pool.map(
+                _count_quotes, [(filename, start, end, quote) for start, end in zip(nominal, nominal[1:])]
+            )
+            boundaries = [data_start]
+            inside = False
+            for start, count in zip(nominal[1:-1], counts):
+                inside ^= bool(count & 1)
+                boundary = _next_record(fp, start, inside, quote)
+                if boundary is not None and boundary > boundaries[-1]:
+                    boundaries.append(boundary)
+            boundaries.append(size)
+
+            table = {}
+            ranges = [
+                (filename, start, end, encoding, headings, params, key, ignore)
+                for start, end in zip(boundaries, boundaries[1:])
+                if start < end
+            ]
+            # Merged in file order, so later duplicate keys win as in load_csv
+            for part in pool.map(_parse_range, ranges):
+                table.update(part)
+    return table
+
+
+def _format_params(dialect):
+    # A reader fills in what dialect names or classes (like the Sniffer's)
+    # leave out
+    dialect = csv.reader([], dialect).dialect
+    return {name: getattr(dialect, name) for name in FORMAT_PARAMS}
+
+
+def _next_record(fp, pos, inside, quote):
+    # Offset of the first record that starts at or after pos, given whether
+    # pos is inside a quoted field, or None if no record starts after pos
+    fp.seek(pos)
+    while True:
+        data = fp.read(BLOCK_SIZE)
+        if not data:
+            return None
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline == -1:
+                break
+            if quote:
+                inside ^= bool(data.count(quote, start, newline) & 1)
+            if not inside:
+                return pos + newline + 1
+            start = newline + 1
+        if quote:
+            inside ^= bool(data.count(quote, start) & 1)
+        pos += len(data)
+
+
+def _count_quotes(args):
+    filename, start, end, quote = args
+    if not quote:
+        return 0
+    count = 0
+    with open(filename, "rb") as fp:
+        fp.seek(start)
+        while start < end:
+            data = fp.read(min(BLOCK_SIZE, end - start))
+            if not data:
+                break
+            count += data.count(quote)
+            start += len(data)
+    return count
+
+
+def _parse_range(args):
+    filename, start, end, encoding, headings, params, key, ignore = args
+    with open(filename, "rb") as fp:
+        fp.seek(start)
+        text = fp.read(end - start).decode(encoding)
+    reader = csv.reader(io.StringIO(text, newline=""), **params)
+    ignore = set(ignore.split(',')) if ignore else set()
+    keyfn = _keyfn(key)
+    rows = (dict((k, v) for k, v in zip(headings, line) if k not in ignore) for line in reader)
+    return {keyfn(r): r for r in rows}
@@ -0,0 +1,232 @@
+import csv
+import gzip
+import zlib
+from . import RMOD, RADD, RREM, CADD, CREM, KEY, FLDS, _collect, _keyfn, _sniff_dialect
+
+# A patch is a gzip stream of length-prefixed records:
+#
+#   header: magic, key spec, column table, ordered flag, added, removed
+#   D key                   delete a row of previous
+#   U key n (col value)*n   update some fields of a row of previous
+#   I n (col value)*n       insert a new row
+#   E                       end of patch
+#
+# Every D and U record comes before the first I record, so applying a patch
+# only keeps the deletes and updates in memory while previous is streamed,
+# then streams the inserts straight from the patch.
+MAGIC = b"CSVDIFFP\x01"
+DELETE = b"D"
+UPDATE = b"U"
+INSERT = b"I"
+END = b"E"
+
+
+class PatchError(Exception):
+    pass
+
+
+def patch_diff(adiff, output, key=None, current=None):
+    """Write adiff to the binary file object output as a compact patch.
+
+    Pass the loaded current table as current when columns were added: the
+    values of those columns for existing rows are not part of adiff itself.
+    """
+    adiff = _collect(adiff)
+    if adiff[CADD] and current is None:
+        raise PatchError("current is required to patch in added columns")
+
+    if current:
+        table = list(next(iter(current.values())).keys())
+    else:
+        table = []
+        for row in adiff[RADD]:
+            table.extend(c for c in row[FLDS] if c not in table)
+        for row in adiff[RMOD]:
+            table.extend(c for c in row[FLDS] if c not in table)
+    index = {c: i for i, c in enumerate(table)}
+
+    with gzip.GzipFile(fileobj=output, mode="wb") as fp:
+        w = _Writer(fp)
+        fp.write(MAGIC)
+        w.string(key)
+        w.strings(table)
+        w.varint(1 if current else 0)
+        w.varint(len(adiff[CADD]))
+        for c in adiff[CADD]:
+            w.varint(index[c])
+        w.strings(adiff[CREM])
+
+        for row in adiff[RREM]:
+            fp.write(DELETE)
+            w.key(row[KEY])
+
+        updates = (
+            ((row[KEY], {f: v[1] for f, v in row[FLDS].items()}) for row in adiff[RMOD])
+            if not adiff[CADD]
+            else _updates_with_added_columns(adiff, current)
+        )
+        for id, fields in updates:
+            fp.write(UPDATE)
+            w.key(id)
+            w.fields(fields, index)
+
+        for row in adiff[RADD]:
+            fp.write(INSERT)
+            w.fields(row[FLDS], index)
+        fp.write(END)
+
+
+def write_patch(adiff, o=None, stdout=None, key=None, current=None, **options):
+    if o:
+        with open(o, "wb") as output:
+            patch_diff(adiff, output, key, current=current)
+    else:
+        stdout.flush()
+        patch_diff(adiff, stdout.buffer, key, current=current)
+
+def _updates_with_added_columns(adiff, current):
+    # Rows kept from previous also need a value for every added column
+    changed = {row[KEY]: row[FLDS] for row in adiff[RMOD]}
+    added = {row[KEY] for row in adiff[RADD]}
+    for id, row in current.items():
+        if id in added:
+            continue
+        fields = {c: row.get(c) for c in adiff[CADD]}
+        fields.update((f, v[1]) for f, v in changed.get(id, {}).items())
+        yield id, fields
+
+
+def apply_patch(previous, patch, output, dialect=None):
+    """Stream the CSV file object previous through patch into output"""
+    try:
+        _apply_patch(previous, gzip.GzipFile(fileobj=patch, mode="rb"), output, dialect)
+    except (gzip.BadGzipFile, EOFError, zlib.error) as e:
+        raise PatchError("Truncated or corrupt patch: {}".format(e))
+
+
+def _apply_patch(previous, fp, output, dialect):
+    r = _Reader(fp)
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise PatchError("Not a csv-diff patch")
+    key = r.string()
+    table = r.strings()
+    ordered = r.varint()
+    added = [table[r.varint()] for _ in range(r.varint())]
+    removed = set(r.strings())
+
+    deletes = set()
+    updates = {}
+    op = fp.read(1)
+    while op in (DELETE, UPDATE):
+        id = r.key()
+        if op == DELETE:
+            deletes.add(id)
+        else:
+            updates[id] = r.fields(table)
+        op = fp.read(1)
+
+    if dialect is None:
+        dialect = _sniff_dialect(previous)
+    reader = csv.reader(previous, dialect=(dialect or "excel"))
+    headings = next(reader)
+    if ordered:
+        columns = table
+    else:
+        columns = [c for c in headings if c not in removed]
+        columns.extend(c for c in added if c not in columns)
+
+    # Written with previous's delimiter and quotes, but doubling quotes:
+    # the sniffer says not to for files without any, and new values can
+    # have them
+    writer = csv.writer(
+        output, dialect=(dialect or "excel"), doublequote=True, quoting=csv.QUOTE_MINIMAL
+    )
+    writer.writerow(columns)
+    keyfn = _keyfn(key)
+    for line in reader:
+        row = dict(zip(headings, line))
+        id = keyfn(row)
+        if id in deletes:
+            continue
+        if id in updates:
+            row.update(updates[id])
+        writer.writerow([row.get(c) for c in columns])
+
+    while op == INSERT:
+        row = r.fields(table)
+        writer.writerow([row.get(c) for c in columns])
+        op = fp.read(1)
+    if op != END:
+        raise PatchError("Truncated or corrupt patch")
+
+
+class _Writer:
+    def __init__(self, fp):
+        self.fp = fp
+
+    def varint(self, n):
+        out = bytearray()
+        while n > 0x7F:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+        self.fp.write(out)
+
+    def string(self, s):
+        # Length is stored plus one so that zero can stand for None
+        if s is None:
+            self.varint(0)
+            return
+        data = str(s).encode("utf8")
+        self.varint(len(data) + 1)
+        self.fp.write(data)
+
+    def strings(self, items):
+        self.varint(len(items))
+        for s in items:
+            self.string(s)
+
+    def key(self, id):
+        self.strings(id if isinstance(id, (tuple, list)) else [id])
+
+    def fields(self, fields, index):
+        self.varint(len(fields))
+        for f, v in fields.items():
+            self.varint(index[f])
+            self.string(v)
+
+
+class _Reader:
+    def __init__(self, fp):
+        self.fp = fp
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            b = self.fp.read(1)
+            if not b:
+                raise PatchError("Truncated or corrupt patch")
+            n |= (b[0] & 0x7F) << shift
+            if b[0] < 0x80:
+                return n
+            shift += 7
+
+    def string(self):
+        size = self.varint()
+        if size == 0:
+            return None
+        data = self.fp.read(size - 1)
+        if len(data) != size - 1:
+            raise PatchError("Truncated or corrupt patch")
+        return data.decode("utf8")
+
+    def strings(self):
+        return [self.string() for _ in range(self.varint())]
+
+    def key(self):
+        parts = self.strings()
+        return parts[0] if len(parts) == 1 else tuple(parts)
+
+    def fields(self, table):
+        return {table[self.varint()]: self.string() for _ in range(self.varint())}
+
@@ -0,0 +1,161 @@
+import io
+import logging
+import os
+from . import DIALECTS, load_csv, load_file, _iter_keyed_rows, _keyfn, _sniff_dialect
+from .cache import row_size, table_size
+
+logger = logging.getLogger(__name__)
+
+# The first SAMPLE_BYTES of a CSV file are parsed to measure what a row
+# costs on disk and once loaded
+SAMPLE_BYTES = 1024 ** 2
+# Bytes per row of the table dict itself, on top of the row
+ENTRY_OVERHEAD = 48
+# Loaded JSON takes about this many times its size on disk
+JSON_FACTOR = 4
+# How often the loader checks the budget, in rows
+CHECK_EVERY = 1000
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+def parse_size(text):
+    "Parse sizes like 800M, 2G or 1048576 into bytes"
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in UNITS else ""
+    number = text[:len(text) - len(unit)]
+    try:
+        size = float(number) * UNITS[unit]
+    except ValueError:
+        raise ValueError("Not a size: {!r}".format(text))
+    return int(size)
+
+
+def estimate_size(filename, key=None, ignore=None, iformat=None):
+    """Estimate (bytes, rows, columns) for load_file(filename) from its first rows.
+
+    The rows in the first SAMPLE_BYTES give the average size of a row on
+    disk, and so the number of rows in the file, and the average cost of a
+    loaded row. Smaller files are simply loaded and measured.
+    """
+    if filename.startswith("sqlite:///"):
+        return _estimate_sqlite(filename, key, ignore)
+    size = os.path.getsize(filename)
+    if iformat == "json":
+        return size * JSON_FACTOR, None, None
+    if size <= SAMPLE_BYTES:
+        table = load_file(filename, key=key, ignore=ignore, iformat=iformat)
+        return _measured(table)
+    with open(filename, newline="") as fp:
+        dialect = DIALECTS.get(iformat) or _sniff_dialect(fp)
+        head = fp.read(SAMPLE_BYTES)
+    # The last line is probably cut short
+    lines = head.rsplit("\n", 1)[0]
+    sample = load_csv(io.StringIO(lines, newline=""), key=key, dialect=dialect, ignore=ignore)
+    if not sample:
+        return size, None, None
+    header_bytes = len(head.split("\n", 1)[0]) + 1
+    bytes_per_row = max(1, (len(lines.encode("utf8")) - header_bytes) / len(sample))
+    rows = int((size - header_bytes) / bytes_per_row)
+    per_row = _measured(sample)[0] / len(sample)
+    return int(rows * per_row), rows, len(next(iter(sample.values())))
+
+
+def load_within_budget(previous, current, max_memory, key=None, ignore=None, iformat=None):
+    """Load both tables in memory if they fit in max_memory bytes.
+
+    Returns (previous, current), or None when the tables are estimated to
+    be too big or turn out to be while loading them; the caller should then
+    diff them on disk instead. Every decision is logged.
+    """
+    estimates = [estimate_size(f, key=key, ignore=ignore, iformat=iformat) for f in (previous, current)]
+    estimated = sum(e[0] for e in estimates)
+    rows = [e[1] for e in estimates]
+    columns = max((e[2] or 0) for e in estimates)
+    if estimated > max_memory:
+        logger.info(
+            "Plan: disk. Loading %s and %s would take about %s (%s rows, %d columns), over the %s budget",
+            previous, current, human_size(estimated), _rows(rows), columns, human_size(max_memory),
+        )
+        return None
+    logger.info(
+        "Plan: memory. Loading %s and %s should take about %s (%s rows, %d columns) of the %s budget",
+        previous, current, human_size(estimated), _rows(rows), columns, human_size(max_memory),
+    )
+    try:
+        previous_table, used = load_with_budget(previous, max_memory, 0, key=key, ignore=ignore, iformat=iformat)
+        current_table, used = load_with_budget(current, max_memory, used, key=key, ignore=ignore, iformat=iformat)
+    except MemoryBudgetExceeded as e:
+        logger.info("Plan changed to disk: %s", e)
+        return None
+    logger.info("Loaded both tables in about %s", human_size(used))
+    return previous_table, current_table
+
+
+def load_with_budget(filename, budget, used=0, key=None, ignore=None, iformat=None):
+    """load_file(filename), adding up the size of the rows as they are loaded.
+
+    Returns (table, used) with the bytes used so far, or raises
+    MemoryBudgetExceeded as soon as used goes over budget.
+    """
+    if iformat == "json" or filename.startswith("sqlite:///"):
+        table = load_file(filename, key=key, ignore=ignore, iformat=iformat)
+        used += table_size(table)
+        _check(filename, used, budget)
+        return table, used
+    table = {}
+    with open(filename, newline="") as fp:
+        for i, (id, row) in enumerate(_iter_keyed_rows(fp, key=key, dialect=DIALECTS.get(iformat), ignore=ignore)):
+            table[id] = row
+            used += row_size(id, row) + ENTRY_OVERHEAD
+            if i % CHECK_EVERY == 0:
+                _check(filename, used, budget)
+    _check(filename, used, budget)
+    return table, used
+
+
+def human_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return "{:.0f}{}".format(size, unit)
+        size /= 1024
+    return "{:.1f}TB".format(size)
+
+
+def _check(filename, used, budget):
+    if used > budget:
+        raise MemoryBudgetExceeded(
+            "{} took the loaded tables past {}, over the {} budget".format(
+                filename, human_size(used), human_size(budget)
+            )
+        )
+
+
+def _measured(table):
+    columns = len(next(iter(table.values()))) if table else 0
+    return table_size(table) + ENTRY_OVERHEAD * len(table), len(table), columns
+
+
+def _rows(rows):
+    if None in rows:
+        return "?"
+    return "{:,}".format(sum(rows))
+
+
+def _estimate_sqlite(url, key, ignore):
+    from itertools import islice
+    from .sqlite import count_sqlite_rows, _sqlite_rows
+    rows = count_sqlite_rows(url)
+    keyfn = _keyfn(key)
+    _, sample_rows = _sqlite_rows(url, ignore)
+    try:
+        sample = {keyfn(row): row for row in islice(sample_rows, CHECK_EVERY)}
+    finally:
+        sample_rows.close()
+    if not sample:
+        return _measured(sample)
+    per_row = _measured(sample)[0] / len(sample)
+    return int(rows * per_row), rows, len(next(iter(sample.values())))
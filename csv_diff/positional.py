@@ -0,0 +1,244 @@
+import csv
+from . import RMOD, RADD, RREM, CADD, CREM, STAT, Change, ColumnStats, UnchangedFields, _sniff_dialect
+
+# Keys in positional diffs are row numbers, counted from 1 after the header
+KEY_NAME = "row"
+# Most row pairs compared to line up the two sides of an uneven hunk
+MAX_ALIGNMENTS = 10000
+
+
+def load_rows(fp, dialect=None, ignore=None):
+    "The rows of a CSV file as a list of dicts, in file order"
+    if dialect is None:
+        dialect = _sniff_dialect(fp)
+    reader = csv.reader(fp, dialect=(dialect or "excel"))
+    headings = next(reader, [])
+    ignore = set(ignore.split(",")) if ignore else set()
+    return [dict((k, v) for k, v in zip(headings, line) if k not in ignore) for line in reader]
+
+
+def iter_positional(previous, current, show_unchanged=False, stats=False):
+    """Diff two lists of rows by position, for files without a key.
+
+    Each distinct row is given a number, and a Myers O(ND) diff of the two
+    sequences of numbers finds the fewest rows to remove and add. Where a run of removed rows
+    meets a run of added ones, the rows are paired up in order and reported
+    as modified, the rest as removed or added. Keys are row numbers: in
+    current for modified and added rows, in previous for removed ones.
+
+    Yields Change records in the order iter_compare does.
+    """
+    previous_columns = list(previous[0]) if previous else []
+    current_columns = list(current[0]) if current else []
+    ignore_columns = None
+    if previous and current and set(previous_columns) != set(current_columns):
+        for c in current_columns:
+            if c not in previous_columns:
+                yield Change(CADD, c, None)
+        for c in previous_columns:
+            if c not in current_columns:
+                yield Change(CREM, c, None)
+        ignore_columns = set(current_columns).symmetric_difference(previous_columns)
+    # Rows are matched on the columns both files have
+    common = [c for c in previous_columns if c in current_columns] if ignore_columns else previous_columns
+    # Each distinct row is numbered, which the dict does by comparing the
+    # rows themselves, so rows that only share a hash() stay apart
+    numbers = {}
+    row_number = lambda row: numbers.setdefault(tuple(row.get(c) for c in common), len(numbers))
+
+    hunks = list(_hunks(diff_sequences(
+        [row_number(row) for row in previous], [row_number(row) for row in current]
+    )))
+    pairs = [_pair(removed, added, previous, current, common) for removed, added in hunks]
+    column_stats = {}
+    for paired, _, _ in pairs:
+        for i, j in paired:
+            fields = {
+                c: [previous[i][c], current[j][c]]
+                for c in common if previous[i].get(c) != current[j].get(c)
+            }
+            if stats:
+                for field, (prev_value, current_value) in fields.items():
+                    if field not in column_stats:
+                        column_stats[field] = ColumnStats()
+                    column_stats[field].add(prev_value, current_value)
+            unchanged = None
+            if show_unchanged:
+                unchanged = UnchangedFields(current[j], fields, ignore_columns)
+            yield Change(RMOD, j + 1, fields, unchanged)
+    for _, added, _ in pairs:
+        for j in added:
+            yield Change(RADD, j + 1, current[j])
+    for _, _, removed in pairs:
+        for i in removed:
+            yield Change(RREM, i + 1, previous[i])
+    if stats:
+        yield Change(STAT, None, {field: c.as_dict() for field, c in column_stats.items()})
+
+
+def _pair(removed, added, previous, current, common):
+    # Pair the rows of a hunk in order, as (pairs, unpaired added, unpaired
+    # removed). When one side has more rows, the shorter run is lined up
+    # where the most cells match, so that an inserted row next to an edited
+    # one isn't taken for the edit.
+    short, long = (removed, added) if len(removed) <= len(added) else (added, removed)
+    best = 0
+    if short and len(short) != len(long) and len(short) * (len(long) - len(short) + 1) <= MAX_ALIGNMENTS:
+        def matching(shift):
+            rows = zip(removed, added[shift:]) if short is removed else zip(removed[shift:], added)
+            return sum(previous[i].get(c) == current[j].get(c) for i, j in rows for c in common)
+        best = max(range(len(long) - len(short) + 1), key=matching)
+    unpaired = long[:best] + long[best + len(short):]
+    if short is removed:
+        return list(zip(removed, added[best:])), unpaired, []
+    return list(zip(removed[best:], added)), [], unpaired
+
+
+def diff_sequences(a, b):
+    """The shortest edit script from a to b, as a list of ("-", i) for each
+    a[i] to delete and ("+", j) for each b[j] to insert, in order."""
+    # Trim the common start and end, which is all there is to do for
+    # nearly identical files
+    alo, ahi, blo, bhi = 0, len(a), 0, len(b)
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    # Items only one side has are deleted or inserted whatever happens, and
+    # leaving them out shortens the search, to nothing for unrelated files
+    in_a = set(a[alo:ahi])
+    in_b = set(b[blo:bhi])
+    a_kept = [i for i in range(alo, ahi) if a[i] in in_b]
+    b_kept = [j for j in range(blo, bhi) if b[j] in in_a]
+    deleted = set(range(alo, ahi)).difference(a_kept)
+    inserted = set(range(blo, bhi)).difference(b_kept)
+    for op, index in _myers([a[i] for i in a_kept], [b[j] for j in b_kept]):
+        if op == "-":
+            deleted.add(a_kept[index])
+        else:
+            inserted.add(b_kept[index])
+    ops = []
+    i, j = alo, blo
+    while i < ahi or j < bhi:
+        while i < ahi and i in deleted:
+            ops.append(("-", i))
+            i += 1
+        while j < bhi and j in inserted:
+            ops.append(("+", j))
+            j += 1
+        if i < ahi and j < bhi and i not in deleted and j not in inserted:
+            i += 1
+            j += 1
+    return ops
+
+
+def _myers(a, b):
+    # Edit script from a to b; see diff_sequences
+    ops = []
+    # Ranges still to diff, handled depth first so ops come out in order
+    pending = [(0, len(a), 0, len(b))]
+    while pending:
+        alo, ahi, blo, bhi = pending.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if alo < ahi and blo < bhi:
+            x, y = _middle(a, alo, ahi, b, blo, bhi)
+            if (x, y) not in ((alo, blo), (ahi, bhi)):
+                pending.append((x, ahi, y, bhi))
+                pending.append((alo, x, blo, y))
+                continue
+        # One side is empty, or the two have nothing in common
+        ops.extend(("-", i) for i in range(alo, ahi))
+        ops.extend(("+", j) for j in range(blo, bhi))
+    return ops
+
+
+def _middle(a, alo, ahi, b, blo, bhi):
+    # Myers' linear space search: run the O(ND) greedy search from both
+    # ends at once until the paths overlap, and return a point (x, y) on a
+    # shortest edit path to split the problem at
+    n = ahi - alo
+    m = bhi - blo
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    forward = [-1] * (2 * max_d + 2)
+    backward = [-1] * (2 * max_d + 2)
+    forward[offset + 1] = 0
+    backward[offset + 1] = 0
+    delta = n - m
+    odd = delta % 2 != 0
+    # Diagonals that ran off the edges are skipped from then on
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            i = offset + k1
+            if k1 == -d or (k1 != d and forward[i - 1] < forward[i + 1]):
+                x1 = forward[i + 1]
+            else:
+                x1 = forward[i - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[i] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif odd:
+                j = offset + delta - k1
+                if 0 <= j < len(backward) and backward[j] != -1 and x1 >= n - backward[j]:
+                    return alo + x1, blo + y1
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            i = offset + k2
+            if k2 == -d or (k2 != d and backward[i - 1] < backward[i + 1]):
+                x2 = backward[i + 1]
+            else:
+                x2 = backward[i - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            backward[i] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not odd:
+                j = offset + delta - k2
+                if 0 <= j < len(forward) and forward[j] != -1:
+                    x1 = forward[j]
+                    y1 = offset + x1 - j
+                    if x1 >= n - x2:
+                        return alo + x1, blo + y1
+    return alo, blo
+
+
+def _hunks(ops):
+    # Group an edit script into (removed, added) runs of indexes, one per
+    # place where the sequences differ
+    removed, added = [], []
+    # Next index of a and b; equal items move both on together
+    ai = bi = 0
+    for op, index in ops:
+        skip = index - (ai if op == "-" else bi)
+        if skip:
+            if removed or added:
+                yield removed, added
+                removed, added = [], []
+            ai += skip
+            bi += skip
+        if op == "-":
+            removed.append(index)
+            ai = index + 1
+        else:
+            added.append(index)
+            bi = index + 1
+    if removed or added:
+        yield removed, added
@@ -0,0 +1,176 @@
+import csv
+import io
+import locale
+from . import DIALECTS, SKIPPED, STAT, load_csv, _doubled_quotes, _keyfn, _sniff_dialect
+
+BLOCK_SIZE = 1024 ** 2
+
+
+class PrefixError(Exception):
+    pass
+
+
+def common_prefix(previous, current, quote=b'"', block_size=BLOCK_SIZE):
+    """Length of the whole records that two binary files both start with.
+
+    The files are compared a block at a time, and the result is cut back to
+    the end of the last record in the shared bytes: a newline that isn't
+    inside a quoted field, which is the case when an even number of quote
+    characters come before it.
+    """
+    end = 0
+    inside = False
+    offset = 0
+    while True:
+        a = previous.read(block_size)
+        b = current.read(block_size)
+        same = _mismatch(a, b)
+        record_end, inside = _last_record_end(a[:same], inside, quote)
+        if record_end != -1:
+            end = offset + record_end
+        if same < block_size or not a:
+            return end
+        offset += same
+
+
+def load_tails(previous, current, key=None, ignore=None, iformat=None, encoding=None):
+    """Load the rows of two CSV files that follow the records they share.
+
+    Returns (previous_rows, current_rows, stats), or None when the files
+    don't even share their header row. Raises PrefixError for formats this
+    can't split, and when a key of the rows both files start with comes up
+    again further down either file: the rows after the shared ones could
+    then be changes to rows in it, so the files have to be compared in full.
+    """
+    if iformat == "json":
+        raise PrefixError("Only CSV and TSV files can be compared from where they differ")
+    encoding = encoding or locale.getpreferredencoding(False)
+    dialect = DIALECTS.get(iformat)
+    if dialect is None:
+        with open(previous, newline="", encoding=encoding) as fp:
+            dialect = _doubled_quotes(_sniff_dialect(fp))
+    if isinstance(dialect, str) or dialect is None:
+        dialect = csv.get_dialect(dialect or "excel")
+    if dialect.escapechar or not dialect.doublequote:
+        raise PrefixError("Files with escaped quotes can't be compared from where they differ")
+    quote = None if dialect.quoting == csv.QUOTE_NONE else dialect.quotechar.encode(encoding)
+
+    with open(previous, "rb") as prev_fp, open(current, "rb") as cur_fp:
+        prefix = common_prefix(prev_fp, cur_fp, quote)
+        if not prefix:
+            return None
+        prev_fp.seek(0)
+        header = _next_line(prev_fp, quote)
+        prefix_keys = _prefix_keys(prev_fp, prefix, encoding, key, dialect, ignore)
+        prev_fp.seek(prefix)
+        cur_fp.seek(prefix)
+        tails = [prev_fp.read(), cur_fp.read()]
+
+    tables = [
+        load_csv(io.StringIO((header + tail).decode(encoding), newline=""), key=key, dialect=dialect, ignore=ignore)
+        for tail in tails
+    ]
+    if not prefix_keys.isdisjoint(tables[0]) or not prefix_keys.isdisjoint(tables[1]):
+        raise PrefixError("A row both files start with comes up again further down")
+    stats = {
+        "prefix_bytes": prefix,
+        # Not counting the header
+        "prefix_rows": prefix_keys.rows,
+        "previous_tail_bytes": len(tails[0]),
+        "current_tail_bytes": len(tails[1]),
+        "append_only": not tails[0],
+    }
+    return tables[0], tables[1], stats
+
+
+def add_prefix_stats(changes, stats):
+    "Add what load_tails skipped to the STAT change among changes"
+    for change in changes:
+        if change.action == STAT:
+            skipped = {"rows": stats["prefix_rows"], "bytes": stats["prefix_bytes"]}
+            change = change._replace(fields={SKIPPED: skipped, **change.fields})
+        yield change
+
+
+class _Keys(set):
+    # The keys of some rows, and how many rows there were
+    rows = 0
+
+
+def _prefix_keys(fp, end, encoding, key, dialect, ignore):
+    # The keys of the rows in the first end bytes of fp, which end with a
+    # record, worked out as load_csv would
+    def lines():
+        fp.seek(0)
+        pos = 0
+        for line in fp:
+            if pos >= end:
+                return
+            pos += len(line)
+            yield line.decode(encoding)
+
+    reader = csv.reader(lines(), dialect=dialect)
+    headings = next(reader, [])
+    ignore = set(ignore.split(",")) if ignore else set()
+    keyfn = _keyfn(key)
+    keys = _Keys()
+    for line in reader:
+        keys.add(keyfn(dict((k, v) for k, v in zip(headings, line) if k not in ignore)))
+        keys.rows += 1
+    return keys
+
+
+def _mismatch(a, b):
+    # Index of the first differing byte, found by halving: slice comparisons
+    # run at memcmp speed where a byte at a time loop would not
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    lo, hi = 0, n
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _last_record_end(data, inside, quote):
+    # (offset just after the last newline in data outside quotes or -1,
+    # whether the end of data is inside quotes), given the state at its start
+    at_end = inside ^ bool(quote and data.count(quote) & 1)
+    state = at_end
+    pos = len(data)
+    while True:
+        newline = data.rfind(b"\n", 0, pos)
+        if newline == -1:
+            return -1, at_end
+        if quote:
+            state ^= bool(data.count(quote, newline, pos) & 1)
+        if not state:
+            return newline + 1, at_end
+        pos = newline
+
+
+def _next_line(fp, quote):
+    # The first record of fp, as bytes
+    data = b""
+    inside = False
+    while True:
+        block = fp.read(BLOCK_SIZE)
+        if not block:
+            return data
+        start = 0
+        while True:
+            newline = block.find(b"\n", start)
+            if newline == -1:
+                break
+            if quote:
+                inside ^= bool(block.count(quote, start, newline) & 1)
+            if not inside:
+                return data + block[:newline + 1]
+            start = newline + 1
+        if quote:
+            inside ^= bool(block.count(quote, start) & 1)
+        data += block
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import socket
+import socketserver
+from . import iter_compare, write_diff
+
+# Requests and responses are single lines of JSON. A request holds the same
+# options as the command line tool, with absolute paths:
+#
+#   {"previous": ..., "current": ..., "key": ..., "oformat": ..., ...}
+#
+# and the response is {"output": "<what the CLI would print>"} or
+# {"error": "<message>"}.
+OPTIONS = (
+    "key", "ignore", "iformat", "oformat", "o", "singular", "plural", "show_unchanged", "extras",
+    "stats", "pair_similar",
+)
+
+
+class ServerError(Exception):
+    pass
+
+
+class DiffServer(socketserver.UnixStreamServer):
+    """Answers diff requests on a Unix socket from a pool of worker threads.
+
+    Loaded files are kept in a TableCache shared by all workers, so repeated
+    diffs against the same files skip parsing them.
+    """
+
+    def __init__(self, path, workers=4, cache=None):
+        # Imported here so that "csv-diff --client" stays quick to start
+        from concurrent.futures import ThreadPoolExecutor
+        from .cache import TableCache
+        self.cache = cache or TableCache()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        super().__init__(path, _Handler)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+    def diff(self, params):
+        load = lambda filename: self.cache.load(
+            filename, key=params.get("key"), ignore=params.get("ignore"), iformat=params.get("iformat")
+        )
+        previous = load(params["previous"])
+        current = load(params["current"])
+        output = io.StringIO()
+        write_diff(
+            iter_compare(
+                previous, current, params.get("show_unchanged", False), params.get("stats", False),
+                params.get("pair_similar"),
+            ),
+            params.get("oformat") or "txt",
+            params.get("o"),
+            stdout=output,
+            key=params.get("key"),
+            singular=params.get("singular"),
+            plural=params.get("plural"),
+            current=current,
+            extras=[tuple(extra) for extra in params.get("extras") or ()],
+        )
+        return output.getvalue()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            params = json.loads(self.rfile.readline())
+            response = {"output": self.server.diff(params)}
+        except Exception as e:
+            response = {"error": "{}: {}".format(type(e).__name__, e)}
+        self.wfile.write(json.dumps(response).encode("utf8") + b"\n")
+
+
+def request(path, previous, current, **options):
+    "Ask the server listening on path for a diff, returning its output"
+    params = {
+        "previous": os.path.abspath(previous),
+        "current": os.path.abspath(current),
+    }
+    for option in OPTIONS:
+        if options.get(option) is not None:
+            params[option] = options[option]
+    if params.get("o"):
+        params["o"] = os.path.abspath(params["o"])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(params).encode("utf8") + b"\n")
+        response = json.loads(sock.makefile("rb").readline())
+    if "error" in response:
+        raise ServerError(response["error"])
+    return response["output"]
@@ -0,0 +1,100 @@
+import random
+import zlib
+from collections import defaultdict
+
+NUM_PERM = 64
+# Bands shared by more removed rows than this say little about which one is
+# the match (think of a column that is mostly empty) and are skipped, and
+# each added row is checked against at most MAX_CANDIDATES removed rows,
+# those sharing the most bands with it. Both keep pairing close to linear.
+MAX_BUCKET = 50
+MAX_CANDIDATES = 10
+_MASK = (1 << 64) - 1
+
+
+def pair_rows(removed, added, threshold=0.5, ignore=None, num_perm=NUM_PERM, seed=1):
+    """Pair up removed and added rows that look like edits of each other.
+
+    removed and added are lists of (id, row). Rows are compared as sets of
+    (column, value) cells: the similarity of two rows is the Jaccard index of
+    their cells, so a row of four columns with one of them edited scores 3/5.
+
+    Instead of comparing every removed row with every added one, each row
+    gets a MinHash signature and the signatures are split into bands. Rows
+    that share any band are candidates, which keeps the work close to linear,
+    and candidates are then checked exactly against the threshold. The most
+    similar candidates are paired first, and each row is paired at most once.
+
+    Returns [(removed_id, added_id), ...] in the order of the added rows.
+    """
+    ignore = ignore or ()
+    bands, rows_per_band = _bands(threshold, num_perm)
+    rng = random.Random(seed)
+    # Multiply-add hash functions over 64 bit integers stand in for random
+    # permutations of the cell hashes
+    perms = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+
+    buckets = defaultdict(list)
+    removed_cells = []
+    for i, (id, row) in enumerate(removed):
+        cells = _cells(row, ignore)
+        removed_cells.append(cells)
+        for band in _band_keys(cells, perms, bands, rows_per_band):
+            buckets[band].append(i)
+
+    candidates = []
+    for j, (id, row) in enumerate(added):
+        cells = _cells(row, ignore)
+        shared = defaultdict(int)
+        for band in _band_keys(cells, perms, bands, rows_per_band):
+            bucket = buckets.get(band, ())
+            if len(bucket) <= MAX_BUCKET:
+                for i in bucket:
+                    shared[i] += 1
+        best = sorted(shared, key=lambda i: (-shared[i], i))[:MAX_CANDIDATES]
+        for i in best:
+            other = removed_cells[i]
+            similarity = len(cells & other) / len(cells | other)
+            if similarity >= threshold:
+                candidates.append((-similarity, j, i))
+
+    pairs = []
+    paired_removed = set()
+    paired_added = set()
+    for _, j, i in sorted(candidates):
+        if i not in paired_removed and j not in paired_added:
+            paired_removed.add(i)
+            paired_added.add(j)
+            pairs.append((j, i))
+    return [(removed[i][0], added[j][0]) for j, i in sorted(pairs)]
+
+
+def _cells(row, ignore):
+    return frozenset((k, str(v)) for k, v in row.items() if k not in ignore)
+
+
+def _band_keys(cells, perms, bands, rows_per_band):
+    if not cells:
+        return []
+    hashes = [zlib.crc32("{}\x1f{}".format(k, v).encode("utf8")) for k, v in cells]
+    # One list of permuted hashes per cell, and the minimum of each column
+    permuted = [[(a * h + b) & _MASK for a, b in perms] for h in hashes]
+    signature = permuted[0] if len(permuted) == 1 else list(map(min, *permuted))
+    return [
+        (band, tuple(signature[band * rows_per_band:(band + 1) * rows_per_band]))
+        for band in range(bands)
+    ]
+
+
+def _bands(threshold, num_perm):
+    # Rows with similarity s share a band with probability 1 - (1 - s**r)**b
+    # for b bands of r rows. Longer bands mean fewer false candidates; pick
+    # the longest that still finds rows right at the threshold 95% of the time
+    best = (num_perm, 1)
+    for rows_per_band in range(1, num_perm + 1):
+        if num_perm % rows_per_band:
+            continue
+        bands = num_perm // rows_per_band
+        if 1 - (1 - threshold ** rows_per_band) ** bands >= 0.95:
+            best = (bands, rows_per_band)
+    return best
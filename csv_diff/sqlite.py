@@ -0,0 +1,319 @@
+import csv
+import json
+import sqlite3
+from collections.abc import Mapping
+from itertools import islice
+from . import (
+    RMOD, RADD, RREM, CADD, CREM, STAT, DIALECTS, Change, ColumnStats, UnchangedFields,
+    load_json, _keyfn, _sniff_dialect,
+)
+
+URL_PREFIX = "sqlite:///"
+BATCH_SIZE = 10000
+SIDES = ("previous", "current")
+
+
+class SqliteError(Exception):
+    pass
+
+
+def is_sqlite_url(filename):
+    return filename.startswith(URL_PREFIX)
+
+
+def parse_sqlite_url(url):
+    """Split sqlite:///path/to/file.db#table into the path and the table.
+
+    As with SQLAlchemy, sqlite:///file.db is relative to the current
+    directory and sqlite:////tmp/file.db is absolute. The table can be left
+    out when the database only has one.
+    """
+    path, _, table = url[len(URL_PREFIX):].partition("#")
+    if not path:
+        raise SqliteError("No database file in {}".format(url))
+    return path, table or None
+
+
+def load_sqlite(url, key=None, ignore=None):
+    "Load a table of a SQLite database into a dict, like load_csv"
+    keyfn = _keyfn(key)
+    columns, rows = _sqlite_rows(url, ignore)
+    try:
+        return {keyfn(row): row for row in rows}
+    finally:
+        rows.close()
+
+
+class SqliteDiff:
+    """Diffs two tables through a SQLite database instead of in memory.
+
+    Each side is bulk-loaded into a table indexed by row key, then added,
+    removed and modified rows are found with joins and streamed back as the
+    same Change records iter_compare yields. The database is a temporary
+    file by default, so tables larger than memory can be compared:
+
+        with SqliteDiff() as engine:
+            engine.load("previous", "one.csv", key="id")
+            engine.load("current", "two.csv", key="id")
+            for change in engine.iter_compare():
+                ...
+    """
+
+    def __init__(self, database="", batch_size=BATCH_SIZE):
+        # "" is a private on-disk database that SQLite deletes on close
+        self.conn = sqlite3.connect(database)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.batch_size = batch_size
+        self.columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def load(self, side, source, key=None, ignore=None, iformat=None):
+        """Load source (a file name or sqlite:/// URL) as side, which is
+        "previous" or "current". Later rows replace earlier ones with the
+        same key, as they do with load_file."""
+        if side not in SIDES:
+            raise ValueError("side must be one of {}".format(", ".join(SIDES)))
+        if is_sqlite_url(source):
+            columns, rows = _sqlite_rows(source, ignore)
+        elif iformat == "json":
+            with open(source) as fp:
+                table = load_json(fp, key=key, ignore=ignore)
+            columns = list(next(iter(table.values())).keys()) if table else []
+            rows = iter(table.values())
+        else:
+            columns, rows = _csv_rows(source, ignore, DIALECTS.get(iformat))
+        try:
+            self._create(side, columns)
+            self.insert(side, rows, key)
+            self.conn.commit()
+        finally:
+            if hasattr(rows, "close"):
+                rows.close()
+
+    def insert(self, side, rows, key=None):
+        """Add rows (dicts) to a loaded side, replacing those with the same
+        key. Left uncommitted, for the caller to commit."""
+        columns = self.columns[side]
+        keyfn = _keyfn(key)
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        if columns:
+            updates = ", ".join("c{0} = excluded.c{0}".format(i) for i in range(len(columns)))
+            upsert = "DO UPDATE SET " + updates
+        else:
+            upsert = "DO NOTHING"
+        sql = "INSERT INTO {} VALUES ({}) ON CONFLICT (_key) {}".format(side, placeholders, upsert)
+        values = (
+            [json.dumps(keyfn(row))] + [row.get(c) for c in columns] for row in rows
+        )
+        while True:
+            batch = list(islice(values, self.batch_size))
+            if not batch:
+                break
+            self.conn.executemany(sql, batch)
+
+    def table(self, side):
+        "A read-only Mapping over a loaded side, for write_diff(current=...)"
+        return SqliteTable(self, side)
+
+    def iter_compare(self, show_unchanged=False, stats=False):
+        "Yields the Change records iter_compare would for the loaded sides"
+        column_stats = {}
+        yield from self.column_changes()
+        for change in self.modified(show_unchanged):
+            if stats:
+                for field, (prev_value, current_value) in change.fields.items():
+                    if field not in column_stats:
+                        column_stats[field] = ColumnStats()
+                    column_stats[field].add(prev_value, current_value)
+            yield change
+        yield from self.added()
+        yield from self.removed()
+        if stats:
+            yield Change(STAT, None, {field: c.as_dict() for field, c in column_stats.items()})
+
+    def column_changes(self):
+        previous_columns = self.columns["previous"]
+        current_columns = self.columns["current"]
+        if self._has_rows("previous") and self._has_rows("current"):
+            if set(previous_columns) != set(current_columns):
+                for c in current_columns:
+                    if c not in previous_columns:
+                        yield Change(CADD, c, None)
+                for c in previous_columns:
+                    if c not in current_columns:
+                        yield Change(CREM, c, None)
+
+    def modified(self, show_unchanged=False, rowids=None):
+        """Modified rows, in current's order. rowids limits them to the
+        current rows with lo < rowid <= hi, for a (lo, hi) pair."""
+        previous_columns = self.columns["previous"]
+        current_columns = self.columns["current"]
+        ignore_columns = set(current_columns).symmetric_difference(previous_columns)
+        common = [c for c in previous_columns if c in current_columns]
+        differs = " OR ".join(
+            "p.c{} IS NOT c.c{}".format(previous_columns.index(c), current_columns.index(c))
+            for c in common
+        ) or "0"
+        where, args = _rowid_range("c", rowids)
+        modified = self.conn.execute(
+            "SELECT p.*, c.* FROM current AS c JOIN previous AS p ON p._key = c._key "
+            "WHERE ({}){} ORDER BY c.rowid".format(differs, where),
+            args,
+        )
+        width = len(previous_columns) + 1
+        for values in modified:
+            previous_row = dict(zip(previous_columns, values[1:width]))
+            current_row = dict(zip(current_columns, values[width + 1:]))
+            fields = {
+                c: [previous_row[c], current_row[c]]
+                for c in common if previous_row[c] != current_row[c]
+            }
+            unchanged = None
+            if show_unchanged:
+                unchanged = UnchangedFields(current_row, fields, ignore_columns)
+            yield Change(RMOD, _decode_key(values[width]), fields, unchanged)
+
+    def added(self, rowids=None):
+        "Added rows, in current's order, optionally in a (lo, hi] range of rowids"
+        return self._one_sided(RADD, "current", "previous", rowids)
+
+    def removed(self, rowids=None):
+        "Removed rows, in previous' order, optionally in a (lo, hi] range of rowids"
+        return self._one_sided(RREM, "previous", "current", rowids)
+
+    def _one_sided(self, action, side, other, rowids):
+        where, args = _rowid_range("s", rowids)
+        rows = self.conn.execute(
+            "SELECT s.* FROM {0} AS s LEFT JOIN {1} AS o ON o._key = s._key "
+            "WHERE o._key IS NULL{2} ORDER BY s.rowid".format(side, other, where),
+            args,
+        )
+        for values in rows:
+            yield Change(action, _decode_key(values[0]), dict(zip(self.columns[side], values[1:])))
+
+    def _create(self, side, columns):
+        self.conn.execute("DROP TABLE IF EXISTS {}".format(side))
+        # Columns are named c0, c1, ... so any heading can be stored, and
+        # have no declared type so values are compared as they were loaded
+        self.conn.execute("CREATE TABLE {} (_key TEXT PRIMARY KEY{})".format(
+            side, "".join(", c{}".format(i) for i in range(len(columns)))
+        ))
+        self.columns[side] = list(columns)
+
+    def _has_rows(self, side):
+        return self.conn.execute("SELECT 1 FROM {} LIMIT 1".format(side)).fetchone() is not None
+
+
+class SqliteTable(Mapping):
+    def __init__(self, engine, side):
+        self.engine = engine
+        self.side = side
+
+    def __getitem__(self, id):
+        values = self.engine.conn.execute(
+            "SELECT * FROM {} WHERE _key = ?".format(self.side), (json.dumps(id),)
+        ).fetchone()
+        if values is None:
+            raise KeyError(id)
+        return dict(zip(self.engine.columns[self.side], values[1:]))
+
+    def __iter__(self):
+        for (key,) in self.engine.conn.execute("SELECT _key FROM {} ORDER BY rowid".format(self.side)):
+            yield _decode_key(key)
+
+    def __len__(self):
+        return self.engine.conn.execute("SELECT COUNT(*) FROM {}".format(self.side)).fetchone()[0]
+
+
+def _rowid_range(table, rowids):
+    if rowids is None:
+        return "", ()
+    return " AND {0}.rowid > ? AND {0}.rowid <= ?".format(table), rowids
+
+
+def _decode_key(text):
+    # Keys are stored as JSON; multi-column keys come back as the tuples
+    # that _keyfn makes
+    id = json.loads(text)
+    return tuple(id) if isinstance(id, list) else id
+
+
+def _csv_rows(filename, ignore, dialect):
+    fp = open(filename, newline="")
+    try:
+        if dialect is None:
+            dialect = _sniff_dialect(fp)
+        reader = csv.reader(fp, dialect=(dialect or "excel"))
+        headings = next(reader, [])
+    except Exception:
+        fp.close()
+        raise
+    ignore = set(ignore.split(",")) if ignore else set()
+    columns = [h for h in headings if h not in ignore]
+
+    def rows():
+        with fp:
+            for line in reader:
+                yield dict((k, v) for k, v in zip(headings, line) if k not in ignore)
+
+    return columns, rows()
+
+
+def count_sqlite_rows(url):
+    conn, table = _open_table(url)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM {}".format(_quote(table))).fetchone()[0]
+    except sqlite3.Error as e:
+        raise SqliteError("Can't read {}: {}".format(url, e))
+    finally:
+        conn.close()
+
+
+def _sqlite_rows(url, ignore):
+    conn, table = _open_table(url)
+    try:
+        cursor = conn.execute("SELECT * FROM {}".format(_quote(table)))
+    except sqlite3.Error as e:
+        conn.close()
+        raise SqliteError("Can't read {}: {}".format(url, e))
+    ignore = set(ignore.split(",")) if ignore else set()
+    names = [d[0] for d in cursor.description]
+    columns = [name for name in names if name not in ignore]
+
+    def rows():
+        try:
+            for values in cursor:
+                yield dict((k, v) for k, v in zip(names, values) if k not in ignore)
+        finally:
+            conn.close()
+
+    return columns, rows()
+
+
+def _open_table(url):
+    # A read-only connection to the database in url, and its table
+    path, table = parse_sqlite_url(url)
+    try:
+        conn = sqlite3.connect("file:{}?mode=ro".format(path), uri=True)
+        if table is None:
+            tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            if len(tables) != 1:
+                conn.close()
+                raise SqliteError("{} has {} tables, pick one with #table".format(path, len(tables)))
+            table = tables[0]
+    except sqlite3.Error as e:
+        raise SqliteError("Can't read {}: {}".format(url, e))
+    return conn, table
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
@@ -0,0 +1,268 @@
+import array
+import csv
+import datetime
+import json
+import re
+from collections.abc import Mapping
+from itertools import islice
+from . import _keyfn, _sniff_dialect
+
+TYPES = ("int", "float", "date", "str")
+# Rows read by infer_schema
+SAMPLE_ROWS = 1000
+# array typecodes of the typed columns; dates are stored as ordinals
+TYPECODES = {"int": "q", "float": "d", "date": "l"}
+INT = re.compile(r"[+-]?(0|[1-9][0-9]*)$")
+# Leading zeros, as in ZIP codes or IDs, keep a column as text
+FLOAT = re.compile(r"[+-]?((0|[1-9][0-9]*)(\.[0-9]*)?|\.[0-9]+)([eE][+-]?[0-9]+)?$")
+DATE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}$")
+INT_LIMIT = 2 ** 63
+
+
+class SchemaError(Exception):
+    pass
+
+
+def infer_schema(fp, dialect=None, ignore=None, sample_rows=SAMPLE_ROWS):
+    """Guess the type of each column from the first sample_rows rows.
+
+    A column is int, float or date (YYYY-MM-DD) if every non-empty value in
+    the sample is one, and str otherwise.
+    """
+    if dialect is None:
+        dialect = _sniff_dialect(fp)
+    reader = csv.reader(fp, dialect=(dialect or "excel"))
+    headings = next(reader, [])
+    ignore = set(ignore.split(",")) if ignore else set()
+    candidates = [{"int", "float", "date"} for _ in headings]
+    seen = [False] * len(headings)
+    for line in islice(reader, sample_rows):
+        for i, value in enumerate(line[:len(headings)]):
+            if value == "":
+                continue
+            seen[i] = True
+            for type in list(candidates[i]):
+                if not _parses(type, value):
+                    candidates[i].discard(type)
+    return {
+        heading: next((t for t in ("int", "float", "date") if t in types), "str") if any_values else "str"
+        for heading, types, any_values in zip(headings, candidates, seen)
+        if heading not in ignore
+    }
+
+
+def merge_schemas(*schemas):
+    "One schema for files with these schemas: int and float make float, other mixes str"
+    merged = {}
+    for schema in schemas:
+        for column, type in schema.items():
+            if column not in merged or merged[column] == type:
+                merged[column] = type
+            elif {merged[column], type} == {"int", "float"}:
+                merged[column] = "float"
+            else:
+                merged[column] = "str"
+    return merged
+
+
+def load_schema(fp):
+    "Read a schema file: a JSON object mapping column names to int, float, date or str"
+    try:
+        schema = json.load(fp)
+    except ValueError as e:
+        raise SchemaError("Schema is not valid JSON: {}".format(e))
+    if not isinstance(schema, dict):
+        raise SchemaError("Schema must be a JSON object of column names to types")
+    for column, type in schema.items():
+        if type not in TYPES:
+            raise SchemaError("Unknown type {!r} for column {!r}, expected one of {}".format(
+                type, column, ", ".join(TYPES)
+            ))
+    return schema
+
+
+def load_typed_csv(fp, schema, key=None, dialect=None, ignore=None, strict=True):
+    """Like load_csv, but returns a TypedTable with the columns in schema
+    parsed into their types. Key columns and columns missing from schema
+    stay str, and empty cells stay "".
+
+    A value that doesn't fit its column's type raises SchemaError. With
+    strict=False (for inferred schemas) an int column takes floats by
+    becoming a float column, and other columns become str instead.
+    """
+    if dialect is None:
+        dialect = _sniff_dialect(fp)
+    reader = csv.reader(fp, dialect=(dialect or "excel"))
+    headings = next(reader)
+    ignore = set(ignore.split(",")) if ignore else set()
+    keys = set(key.split(",")) if key else set()
+    table = TypedTable({
+        h: "str" if h in keys else schema.get(h, "str")
+        for h in headings if h not in ignore
+    })
+    keyfn = _keyfn(key)
+    for number, line in enumerate(reader, 2):
+        row = dict((k, v) for k, v in zip(headings, line) if k not in ignore)
+        while True:
+            try:
+                table.add(row, keyfn)
+                break
+            except (ValueError, OverflowError) as e:
+                column = e.args[-1]
+                if strict:
+                    raise SchemaError("Line {}: {!r} in column {!r} is not {}".format(
+                        number, row.get(column), column, table.types[column]
+                    ))
+                table.widen(column)
+    return table
+
+
+class TypedTable(Mapping):
+    """A table of rows, stored by column.
+
+    int, float and date columns are kept in arrays, which take 8 bytes a
+    value rather than a str object each. Rows are built when they are read,
+    as dicts like those of load_csv but holding ints and floats, and dates
+    as YYYY-MM-DD, so that they compare as numbers.
+
+    Numbers written other than as Python would print them, like 1.50, also
+    keep their text, so that a column turned into str shows what the file
+    had.
+    """
+
+    def __init__(self, types):
+        self.types = dict(types)
+        self.index = {}
+        self.columns = {c: array.array(TYPECODES[t]) if t in TYPECODES else [] for c, t in self.types.items()}
+        # Positions of empty cells in the typed columns
+        self.empty = {c: set() for c in self.types}
+        # Position -> text of the numbers that str() doesn't give back
+        self.text = {c: {} for c in self.types}
+        # Float columns that were int up to this position
+        self.int_until = {}
+
+    def add(self, row, keyfn):
+        # Raises ValueError or OverflowError with the column as the last
+        # argument when a value doesn't fit, before anything is stored
+        values = {}
+        texts = {}
+        for column, type in self.types.items():
+            value = row.get(column, "")
+            if type != "str" and value != "":
+                if not _parses(type, value):
+                    raise ValueError("Not {}".format(type), column)
+                if type != "date":
+                    texts[column] = value
+                value = PARSERS[type](value)
+            values[column] = value
+        id = keyfn(values)
+        position = self.index.get(id)
+        if position is None:
+            position = self.index[id] = len(self.index)
+            for column, value in values.items():
+                self._append(column, value)
+        else:
+            # A key that comes up again replaces its row, as in load_csv
+            for column, value in values.items():
+                self._set(column, position, value)
+            for text_of in self.text.values():
+                text_of.pop(position, None)
+        for column, text in texts.items():
+            if position < self.int_until.get(column, 0) or str(self.columns[column][position]) != text:
+                self.text[column][position] = text
+
+    def widen(self, column):
+        "Make column float if it is int, or str"
+        if self.types[column] == "int":
+            self.columns[column] = array.array("d", self.columns[column])
+            self.types[column] = "float"
+            self.int_until[column] = len(self.index)
+        else:
+            self.to_str(column)
+
+    def to_str(self, column):
+        "Store column as text, as its values are shown"
+        if self.types[column] != "str":
+            self.columns[column] = [self._text(column, i) for i in range(len(self.index))]
+            self.types[column] = "str"
+            self.empty[column] = set()
+            self.text[column] = {}
+            self.int_until.pop(column, None)
+
+    def _append(self, column, value):
+        values = self.columns[column]
+        if value == "" and self.types[column] != "str":
+            self.empty[column].add(len(values))
+            value = 0
+        values.append(value)
+
+    def _set(self, column, position, value):
+        if self.types[column] != "str":
+            if value == "":
+                self.empty[column].add(position)
+                value = 0
+            else:
+                self.empty[column].discard(position)
+        self.columns[column][position] = value
+
+    def _text(self, column, position):
+        # The cell as it was written in the file
+        if position in self.text[column]:
+            return self.text[column][position]
+        value = self._cell(column, position)
+        if value != "" and position < self.int_until.get(column, 0):
+            return str(int(value))
+        return str(value)
+
+    def _cell(self, column, position):
+        type = self.types[column]
+        value = self.columns[column][position]
+        if type == "str":
+            return value
+        if position in self.empty[column]:
+            return ""
+        if type == "date":
+            return datetime.date.fromordinal(value).isoformat()
+        return value
+
+    def __getitem__(self, id):
+        position = self.index[id]
+        return {column: self._cell(column, position) for column in self.types}
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+def align(*tables):
+    "Turn columns that ended up str in one table into str in the others too"
+    for column in set().union(*(t.types for t in tables)):
+        if any(t.types.get(column) == "str" for t in tables):
+            for table in tables:
+                if column in table.types:
+                    table.to_str(column)
+
+
+def _parses(type, value):
+    if type == "int":
+        return bool(INT.match(value)) and abs(int(value)) < INT_LIMIT
+    if type == "float":
+        return bool(FLOAT.match(value))
+    if type == "date":
+        if not DATE.match(value):
+            return False
+        try:
+            datetime.date.fromisoformat(value)
+        except ValueError:
+            return False
+        return True
+    return True
+
+
+PARSERS = {
+    "int": int,
+    "float": float,
+    "date": lambda value: datetime.date.fromisoformat(value).toordinal(),
+}
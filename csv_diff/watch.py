@@ -0,0 +1,107 @@
+import csv
+import io
+import locale
+import os
+from . import CADD, CREM, DIALECTS, load_file, iter_compare, _keyfn, _sniff_dialect
+from .prefix import _last_record_end
+
+# Bytes kept from the start of the file and from just before the read
+# offset, to tell a file that grew from one that was rewritten
+SAMPLE_BYTES = 4096
+
+
+class Watcher:
+    """Keeps the diff of previous against a CSV file that is being appended to.
+
+    The previous table and the rows of current read so far stay in memory,
+    along with the byte offset read up to. Each poll() parses only the
+    complete records added since the last one, and returns the diff of just
+    the rows they hold. If the file is truncated, replaced or rewritten, it
+    is read again from the start and poll() returns the whole diff.
+    """
+
+    def __init__(self, previous, current, key=None, ignore=None, iformat=None,
+                 show_unchanged=False, stats=False, encoding=None):
+        self.filename = current
+        self.ignore = set(ignore.split(",")) if ignore else set()
+        self.dialect = DIALECTS.get(iformat)
+        self.show_unchanged = show_unchanged
+        self.stats = stats
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.keyfn = _keyfn(key)
+        self.previous = load_file(previous, key=key, ignore=ignore, iformat=iformat)
+        self.reloads = 0
+        self._reset()
+
+    def _reset(self):
+        self.current = {}
+        self.offset = 0
+        self.headings = None
+        self._inode = None
+        self._head = b""
+        self._tail = b""
+
+    def poll(self):
+        """Read the records added to the current file since the last poll.
+
+        Returns a list of changes: the whole diff on the first poll and after
+        a reload, otherwise the changes made by the new records only (which
+        are modified or added rows). A new record that makes a row match
+        previous again is not reported.
+        """
+        full = self.offset == 0
+        if not full and self._rewritten():
+            self._reset()
+            self.reloads += 1
+            full = True
+        with open(self.filename, "rb") as fp:
+            self._inode = os.fstat(fp.fileno()).st_ino
+            fp.seek(self.offset)
+            data = fp.read()
+        if self.dialect is None:
+            self.dialect = _sniff_dialect(io.StringIO(data[:1024 ** 2].decode(self.encoding, "ignore"))) or "excel"
+        dialect = csv.get_dialect(self.dialect) if isinstance(self.dialect, str) else self.dialect
+        quote = None if dialect.quoting == csv.QUOTE_NONE else dialect.quotechar.encode(self.encoding)
+        end, _ = _last_record_end(data, False, quote)
+        touched = {}
+        if end > 0:
+            touched = self._parse(data[:end])
+            self.offset += end
+            if len(self._head) < SAMPLE_BYTES:
+                self._head = (self._head + data[:end])[:SAMPLE_BYTES]
+            self._tail = (self._tail + data[:end])[-SAMPLE_BYTES:]
+
+        if full:
+            return list(iter_compare(self.previous, self.current, self.show_unchanged, self.stats))
+        previous = {id: self.previous[id] for id in touched if id in self.previous}
+        return [
+            change for change in iter_compare(previous, touched, self.show_unchanged, self.stats)
+            # Column changes were reported by the first, full diff
+            if change.action not in (CADD, CREM)
+        ]
+
+    def _parse(self, data):
+        reader = csv.reader(io.StringIO(data.decode(self.encoding), newline=""), dialect=self.dialect)
+        if self.headings is None:
+            self.headings = next(reader, [])
+        touched = {}
+        for line in reader:
+            row = dict((k, v) for k, v in zip(self.headings, line) if k not in self.ignore)
+            id = self.keyfn(row)
+            # A key that comes up again replaces its row, as in load_csv
+            touched.pop(id, None)
+            touched[id] = self.current[id] = row
+        return touched
+
+    def _rewritten(self):
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            return True
+        if st.st_ino != self._inode or st.st_size < self.offset:
+            return True
+        with open(self.filename, "rb") as fp:
+            if fp.read(len(self._head)) != self._head:
+                return True
+            fp.seek(self.offset - len(self._tail))
+            return fp.read(len(self._tail)) != self._tail
@@ -0,0 +1,101 @@
+import xlsxwriter
+from . import RMOD, RADD, RREM, STAT, SKIPPED, SUMM, KEY, FLDS, _collect, _key_text
+
+def xlsx_diff(adiff, output=None, key=None, singular=None, plural=None, current=None, extras=None):
+    adiff = _collect(adiff)
+  
+    # Start from the first cell. Rows and columns are zero indexed.
+    r = 0
+    c = 0
+    wb = xlsxwriter.Workbook(output)
+    
+    singular = singular or "row"
+    plural = plural or "rows"
+    title = []
+    header = []
+    show_headers = sum(1 for key in adiff if key != STAT and adiff[key]) > 1
+
+    if adiff[RMOD]:
+        ws = wb.add_worksheet(RMOD)
+        xlsx_header(wb, ws, RMOD)
+        r = xlsx_row (ws, 1, [SUMM,"","rows",format(len(adiff[RMOD]))])
+        
+        change_blocks = []
+        for row in adiff[RMOD]:
+            block = []
+            rkey = _key_text(row[KEY])
+            r = xlsx_row (ws, r, ["Row",rkey,key])
+            for field, (prev_value, current_value) in row[FLDS].items():
+                r = xlsx_row (ws, r, ["Field",rkey,field, prev_value, current_value])
+
+        ws.freeze_panes(1,0)
+        ws.autofilter(0, 0, r-1, 4)
+          
+    actions = {RADD,RREM}
+    for action in actions:
+        if adiff[action]:
+            ws = wb.add_worksheet(action)
+            xlsx_header(wb, ws, action)
+            r = xlsx_row (ws, 1, [SUMM,"","rows",format(len(adiff[action]))])
+          
+            for row in adiff[action]:
+                rkey = _key_text(row[KEY])
+                r = xlsx_row (ws, r, ["Row",rkey,key])
+                for k,v in row[FLDS].items():
+                    r = xlsx_row (ws, r, ["Field",rkey,k,v])
+
+            ws.freeze_panes(1,0)
+            ws.autofilter(0, 0, r-1, 3)
+
+    if adiff.get(STAT):
+        ws = wb.add_worksheet(STAT)
+        xlsx_header(wb, ws, STAT)
+        r = 1
+        for field, counters in adiff[STAT].items():
+            if field == SKIPPED:
+                r = xlsx_row (ws, r, ["Skipped rows", counters["rows"]])
+                r = xlsx_row (ws, r, ["Skipped bytes", counters["bytes"]])
+                continue
+            r = xlsx_row (ws, r, [field] + ["" if v is None else v for v in counters.values()])
+        ws.freeze_panes(1,0)
+        ws.autofilter(0, 0, r-1, 7)
+
+    wb.close()
+
+    return
+
+def xlsx_header(wb, ws, action):
+
+    f = wb.add_format()
+    f.set_bold()
+    f.set_bg_color("#DDEBF7")
+
+    ws.set_column(0, 8)
+    ws.set_column(1, 1, 25)
+    ws.set_column(2, 2, 20)
+
+    if action == RMOD:
+      ws.write_row("A1:F1", ["Type",KEY,"Field","Previous","Current"], f)
+      ws.set_column(3, 4, 15)
+    elif action == STAT:
+      ws.write_row("A1:H1", ["Column","Changed","To empty","From empty","Numeric","Delta min","Delta max","Delta mean"], f)
+      ws.set_column(0, 0, 20)
+      ws.set_column(1, 7, 12)
+    elif action == RADD:
+      ws.write_row("A1:F1", ["Type",KEY,"Field","Current"], f)
+      ws.set_column(3, 3, 15)
+    else:
+      ws.write_row("A1:F1", ["Type",KEY,"Field","Previous"], f)
+      ws.set_column(3, 3, 15)  
+
+    return
+
+def xlsx_row(ws, row, r):
+    col=0
+    for c in r:
+      ws.write(row, col, c)
+      col += 1
+    return row+1
+
+def write_xlsx(adiff, o=None, stdout=None, key=None, singular=None, plural=None, current=None, extras=None):
+    xlsx_diff(adiff, o, key, singular, plural, current=current, extras=extras)
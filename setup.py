@@ -22,7 +22,7 @@ setup(
     version=VERSION,
     license="Apache License, Version 2.0",
     packages=find_packages(),
-    install_requires=["click", "dictdiffer","xlsxwriter"],
+    install_requires=["click", "dictdiffer>=0.9","xlsxwriter"],
     setup_requires=["pytest-runner"],
     extras_require={"test": ["pytest"]},
     entry_points="""
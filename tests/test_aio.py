@@ -0,0 +1,110 @@
+from csv_diff import load_csv, compare, iter_compare, iter_json, iter_ndjson
+from csv_diff.aio import aload_csv, aload_json, aiter_compare, acompare, aiter_json, aiter_ndjson
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import json
+import pytest
+
+PREVIOUS = 'id,name,notes\n1,Cleo,"two\nlines"\n2,Pancakes,"say ""hi"""\n3,Bailey,\n'
+CURRENT = 'id,name,notes\n1,Cleo,"two\nlines, now three\n!"\n2,Pancakes,"say ""hi"""\n4,Dash,new\n'
+
+
+@pytest.fixture
+def files(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write(PREVIOUS)
+    current = tmpdir / "current.csv"
+    current.write(CURRENT)
+    return str(previous), str(current)
+
+
+async def collect(agen):
+    return [item async for item in agen]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1024])
+def test_aload_csv_matches_load_csv(files, chunk_size):
+    for filename in files:
+        expected = load_csv(open(filename, newline=""), key="id")
+        assert asyncio.run(aload_csv(filename, key="id", chunk_size=chunk_size)) == expected
+
+
+def test_aload_csv_in_process_pool(files, tmpdir):
+    tsv = tmpdir / "one.tsv"
+    tsv.write("id\tname\tage\n1\tCleo\t4\n2\tPancakes\t2\n")
+
+    async def load():
+        with ProcessPoolExecutor(1) as pool:
+            return await aload_csv(str(tsv), key="id", ignore="age", executor=pool, chunk_size=8)
+
+    assert asyncio.run(load()) == {"1": {"id": "1", "name": "Cleo"}, "2": {"id": "2", "name": "Pancakes"}}
+
+
+def test_aload_json(tmpdir):
+    filename = tmpdir / "one.json"
+    filename.write(json.dumps([{"id": 1, "name": "Cleo"}, {"id": 2, "name": "Pancakes"}]))
+    table = asyncio.run(aload_json(str(filename), key="id", chunk_size=5))
+    assert table == {1: {"id": 1, "name": "Cleo"}, 2: {"id": 2, "name": "Pancakes"}}
+
+
+def test_acompare_matches_compare(files):
+    previous, current = [load_csv(open(f, newline=""), key="id") for f in files]
+    result = asyncio.run(acompare(previous, current, stats=True, batch_size=1))
+    assert result == compare(previous, current, stats=True)
+
+
+def test_renderers_match_sync_ones(files):
+    previous, current = [load_csv(open(f, newline=""), key="id") for f in files]
+    current["1"]["extra"] = "column"
+    for stats in (False, True):
+        expected_json = "".join(iter_json(iter_compare(previous, current, stats=stats)))
+        expected_ndjson = "".join(iter_ndjson(iter_compare(previous, current, stats=stats)))
+        json_text = asyncio.run(collect(aiter_json(aiter_compare(previous, current, stats=stats, batch_size=1))))
+        ndjson_text = asyncio.run(collect(aiter_ndjson(aiter_compare(previous, current, stats=stats))))
+        assert "".join(json_text) == expected_json
+        assert "".join(ndjson_text) == expected_ndjson
+    assert "".join(asyncio.run(collect(aiter_json([])))) == "".join(iter_json([]))
+
+
+def test_loop_keeps_running_during_compare():
+    previous = {i: {"id": i, "value": "a"} for i in range(100000)}
+    current = {i: {"id": i, "value": "b"} for i in range(100000)}
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        count = 0
+        async for change in aiter_compare(previous, current, batch_size=1000):
+            count += 1
+        task.cancel()
+        return count
+
+    assert asyncio.run(main()) == 100000
+    # The ticker ran between batches, not just once the diff was done
+    assert len(ticks) >= 100
+
+
+def test_timeout_and_cancellation(tmpdir):
+    filename = tmpdir / "big.csv"
+    filename.write("id,name\n" + "".join("{},name {}\n".format(i, i) for i in range(200000)))
+
+    async def load():
+        return await asyncio.wait_for(aload_csv(str(filename), key="id", chunk_size=64), timeout=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(load())
+
+    previous = {i: {"id": i} for i in range(50000)}
+
+    async def first_change():
+        changes = aiter_compare(previous, {}, batch_size=10)
+        async for change in changes:
+            await changes.aclose()
+            return change
+
+    assert asyncio.run(first_change()).key == 0
@@ -0,0 +1,159 @@
+from click.testing import CliRunner
+from csv_diff import cli, iter_compare, load_csv
+from csv_diff.cache import ResultCache, TableCache, table_size
+from .test_csv_diff import ONE, TWO, FIVE
+import io
+import os
+import pytest
+
+
+def test_hits_and_misses(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    cache = TableCache()
+    table = cache.load(str(one), key="id")
+    assert table == load_csv(io.StringIO(ONE), key="id")
+    assert cache.load(str(one), key="id") is table
+    assert cache.load(str(one), key="name") is not table
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["tables"] == 2
+
+
+def test_changed_file_is_reloaded(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    cache = TableCache()
+    cache.load(str(one), key="id")
+    one.write(FIVE)
+    stat = os.stat(str(one))
+    os.utime(str(one), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert len(cache.load(str(one), key="id")) == 4
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tables"]) == (0, 2, 1)
+
+
+def test_lru_eviction(tmpdir):
+    paths = []
+    for name, content in (("one", ONE), ("two", TWO), ("five", FIVE)):
+        path = tmpdir / (name + ".csv")
+        path.write(content)
+        paths.append(str(path))
+    budget = table_size(load_csv(io.StringIO(FIVE), key="id")) * 2
+    cache = TableCache(max_bytes=budget)
+    cache.load(paths[0], key="id")
+    cache.load(paths[1], key="id")
+    cache.load(paths[0], key="id")
+    cache.load(paths[2], key="id")
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["bytes"] <= budget
+    # two.csv was the least recently used
+    cache.load(paths[0], key="id")
+    assert cache.stats()["hits"] == 2
+    cache.load(paths[1], key="id")
+    assert cache.stats()["misses"] == 4
+
+
+def test_invalidate(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    cache = TableCache()
+    cache.load(str(one), key="id")
+    cache.load(str(two), key="id")
+    cache.invalidate(str(one))
+    assert cache.stats()["tables"] == 1
+    cache.load(str(one), key="id")
+    assert cache.stats()["misses"] == 3
+    cache.invalidate()
+    assert cache.stats()["tables"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+@pytest.fixture
+def files(tmpdir):
+    paths = []
+    for name, content in (("one", ONE), ("two", TWO), ("five", FIVE)):
+        path = tmpdir / (name + ".csv")
+        path.write(content)
+        paths.append(str(path))
+    return paths
+
+
+def test_result_keys(files, tmpdir):
+    one, two, five = files
+    cache = ResultCache(str(tmpdir / "results"))
+    key = cache.key(one, two, key="id", ignore="name,age")
+    assert cache.key(one, two, key="id", ignore="age,name") == key
+    assert cache.key(one, two, key="id", ignore="age") != key
+    assert cache.key(one, two, key="id", ignore="age,name", stats=True) != key
+    assert cache.key(two, one, key="id", ignore="age,name") != key
+    # Only the contents count, not the name or the modification time
+    copy = tmpdir / "copy.csv"
+    copy.write(ONE)
+    assert cache.key(str(copy), two, key="id", ignore="name,age") == key
+    copy.write(FIVE)
+    assert cache.key(str(copy), two, key="id", ignore="name,age") != key
+
+
+def test_store_and_get(files, tmpdir):
+    one, _, five = files
+    cache = ResultCache(str(tmpdir / "results"))
+    previous = load_csv(io.StringIO(ONE), key="id,name")
+    current = load_csv(io.StringIO(FIVE), key="id,name")
+    expected = list(iter_compare(previous, current, show_unchanged=True, stats=True))
+    key = cache.key(one, five, key="id,name", show_unchanged=True, stats=True)
+    assert cache.get(key) is None
+    # Nothing is kept from changes that weren't all used
+    changes = cache.store(key, iter_compare(previous, current, show_unchanged=True, stats=True))
+    next(changes)
+    changes.close()
+    assert cache.get(key) is None
+    stored = cache.store(key, iter_compare(previous, current, show_unchanged=True, stats=True))
+    assert list(stored) == expected
+    assert list(cache.get(key)) == expected
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["results"]) == (1, 2, 1)
+
+
+def test_results_lru_eviction(files, tmpdir):
+    one, two, five = files
+    cache = ResultCache(str(tmpdir / "results"))
+    def changes():
+        return iter_compare(load_csv(io.StringIO(ONE)), load_csv(io.StringIO(FIVE)))
+
+    keys = [cache.key(one, two), cache.key(one, five)]
+    for key in keys:
+        list(cache.store(key, changes()))
+    # Room for one result, and the first is the least recently used
+    cache.max_bytes = cache.stats()["bytes"] // 2
+    os.utime(cache._path(keys[0]), ns=(0, 0))
+    third = cache.key(two, five)
+    list(cache.store(third, changes()))
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is None
+    assert cache.get(third) is not None
+    assert cache.stats()["evictions"] == 2
+
+
+def test_cli(files, tmpdir, monkeypatch):
+    one, two, _ = files
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ["cache"])
+    assert result.exit_code == 1
+    monkeypatch.setenv("CSV_DIFF_CACHE_DIR", str(tmpdir / "results"))
+    first = runner.invoke(cli.cli, [one, two, "--key", "id", "--oformat", "json"])
+    again = runner.invoke(cli.cli, [one, two, "--key", "id", "--oformat", "json"])
+    txt = runner.invoke(cli.cli, [one, two, "--key", "id"])
+    assert first.exit_code == again.exit_code == txt.exit_code == 0
+    assert again.output == first.output
+    assert txt.output.startswith("1 row changed")
+    runner.invoke(cli.cli, [one, two, "--key", "id", "--no-cache"])
+    result = runner.invoke(cli.cli, ["cache"])
+    assert result.exit_code == 0, result.output
+    assert "Results: 1 using" in result.output
+    assert "Hits: 2, misses: 1 (67% hit rate)" in result.output
+    result = runner.invoke(cli.cli, ["cache", "--clear"])
+    assert "Results: 0 using 0 of 1073741824 bytes" in result.output
@@ -0,0 +1,110 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv, RMOD, STAT
+from csv_diff.checkpoint import CheckpointedDiff, CheckpointError
+import os
+import subprocess
+import sys
+import pytest
+
+# Runs the CLI, dying with exit code 3 at the given checkpoint
+KILLER = """
+import os, sys
+from csv_diff import checkpoint, cli
+checkpoint.CHECKPOINT_ROWS = 7
+checkpoint.READ_SIZE = 64
+calls = 0
+save = checkpoint.CheckpointedDiff._checkpoint
+def dying(self, name, state):
+    global calls
+    calls += 1
+    if calls == int(sys.argv[1]):
+        os._exit(3)
+    save(self, name, state)
+checkpoint.CheckpointedDiff._checkpoint = dying
+cli.cli(sys.argv[2:])
+"""
+
+
+@pytest.fixture
+def files(tmpdir):
+    previous = tmpdir / "previous.csv"
+    current = tmpdir / "current.csv"
+    previous.write("id,name,note\n" + "".join(
+        '{0},name {0},"a note\nover two lines"\n'.format(i) for i in range(100)
+    ))
+    current.write("id,name,note\n" + "".join(
+        '{0},name {1},"a note\nover two lines"\n'.format(i, i if i % 9 else "changed") for i in range(5, 120)
+    ))
+    return str(previous), str(current)
+
+
+def test_same_as_compare(files, tmpdir):
+    with open(files[0], newline="") as fp:
+        previous = load_csv(fp, key="id")
+    with open(files[1], newline="") as fp:
+        current = load_csv(fp, key="id")
+    with CheckpointedDiff(str(tmpdir / "state"), *files, key="id") as diff:
+        changes = list(diff.run(stats=True))
+    expected = compare(previous, current, stats=True)
+    assert [c.key for c in changes if c.action == RMOD] == [row["Key"] for row in expected[RMOD]]
+    assert len(changes) == sum(len(expected[action]) for action in expected if action != STAT) + 1
+    assert changes[-1] == (STAT, None, expected[STAT], None)
+
+
+def test_resume_checks_the_inputs(files, tmpdir):
+    state = str(tmpdir / "state")
+    CheckpointedDiff(state, *files, key="id").close()
+    with pytest.raises(CheckpointError):
+        CheckpointedDiff(state, *files, key="name", resume=True)
+    # Without --resume the old state is thrown away
+    CheckpointedDiff(state, *files, key="name").close()
+
+
+def test_killed_and_resumed(files, tmpdir):
+    expected = tmpdir / "expected.json"
+    args = [*files, "--key", "id", "--engine", "sqlite", "--oformat", "json", "--show-unchanged", "--stats"]
+    result = CliRunner().invoke(cli.cli, args + ["--o", str(expected)])
+    assert result.exit_code == 0, result.output
+    # Kill it while loading each file, in each stage of the comparison and
+    # just before writing the output; a full run makes 174 checkpoints
+    for n in (2, 30, 58, 100, 130, 150, 165, 174):
+        state = str(tmpdir / "state{}".format(n))
+        output = str(tmpdir / "output{}.json".format(n))
+        args_n = args + ["--state-dir", state, "--o", output]
+        killed = subprocess.run([sys.executable, "-c", KILLER, str(n), *args_n])
+        assert killed.returncode == 3
+        assert not os.path.exists(output)
+        resumed = subprocess.run([sys.executable, "-c", KILLER, "0", *args_n, "--resume"])
+        assert resumed.returncode == 0
+        assert open(output).read() == expected.read()
+
+
+def test_cli_options(files, tmpdir):
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, [*files, "--key", "id", "--state-dir", str(tmpdir / "state")])
+    assert result.exit_code == 2
+    result = runner.invoke(cli.cli, [*files, "--key", "id", "--engine", "sqlite", "--resume"])
+    assert result.exit_code == 2
+    # Resuming with nothing saved starts from scratch
+    result = runner.invoke(cli.cli, [
+        *files, "--key", "id", "--engine", "sqlite", "--state-dir", str(tmpdir / "state"), "--resume",
+    ])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("11 rows changed, 20 rows added, 5 rows removed")
+    # --state-dir needs the sqlite engine, which these modes don't use
+    for mode in (["--watch"], ["--worker", "localhost:1"], ["--positional"]):
+        result = runner.invoke(cli.cli, [
+            *files, "--engine", "sqlite", "--state-dir", str(tmpdir / "state"), *mode,
+        ])
+        assert result.exit_code == 2
+
+
+def test_output_formats(files, tmpdir):
+    # txt and tsv output go to stdout even with --o
+    args = [*files, "--key", "id", "--engine", "sqlite", "--state-dir", str(tmpdir / "state")]
+    for oformat in ("txt", "tsv", "json"):
+        output = str(tmpdir / "out." + oformat)
+        result = CliRunner().invoke(cli.cli, args + ["--oformat", oformat, "--o", output])
+        assert result.exit_code == 0, result.output
+        assert not os.path.exists(output + ".partial")
+        assert os.path.exists(output) == (oformat == "json")
@@ -361,3 +361,74 @@ def test_diff_with_extras(tmpdir):
     """
     ).strip()
     assert result.output.strip() == expected
+
+
+def test_ndjson_output(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    five = tmpdir / "five.csv"
+    five.write(FIVE)
+    result = CliRunner().invoke(
+        cli.cli,
+        [str(one), str(five), "--key", "id", "--oformat", "ndjson"],
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [(r["Action"], r["Key"]) for r in records] == [
+        ("Modified", "1"),
+        ("Added", "3"),
+        ("Added", "4"),
+    ]
+
+
+def test_json_output_to_file(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    out = tmpdir / "diff.json"
+    result = CliRunner().invoke(
+        cli.cli,
+        [str(one), str(two), "--key", "id", "--oformat", "json", "--o", str(out)],
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code
+    assert json.loads(out.read())["Modified"] == [
+        {"Key": "1", "Fields": {"age": ["4", "5"]}}
+    ]
+
+
+def test_show_unchanged(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--key", "id", "--show-unchanged"])
+    assert 0 == result.exit_code
+    assert (
+        dedent(
+            """
+    1 row changed
+
+      id: 1
+        age: "4" => "5"
+
+        Unchanged:
+          name: "Cleo"
+    """
+        ).strip()
+        == result.output.strip()
+    )
+
+
+def test_stats(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--key", "id", "--stats", "--oformat", "json"])
+    assert 0 == result.exit_code
+    assert json.loads(result.output)["Column Statistics"]["age"]["changed"] == 1
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--key", "id", "--stats", "--oformat", "patch"])
+    assert 2 == result.exit_code
@@ -1,4 +1,6 @@
-from csv_diff import load_csv, compare
+from csv_diff import load_csv, compare, iter_compare, Change, UnchangedFields, iter_json, iter_ndjson, txt_diff, tsv_diff
+from csv_diff import RMOD, RADD, RREM, CADD, STAT
+import json
 import io
 
 ONE = """id,name,age
@@ -164,4 +166,132 @@ def test_ignore_columns():
         "changed": [{"key": "2", "changes": {"age": ["4", "3"]}}],
         "columns_added": [],
         "columns_removed": [],
-    } == diff
\ No newline at end of file
+    } == diff
+
+def test_iter_json_matches_json_dumps():
+    diff = compare(
+        load_csv(io.StringIO(SIX), key="id"), load_csv(io.StringIO(EIGHT), key="id")
+    )
+    assert "".join(iter_json(diff)) == json.dumps(diff, indent=2) + "\n"
+    empty = compare(
+        load_csv(io.StringIO(ONE), key="id"), load_csv(io.StringIO(ONE), key="id")
+    )
+    assert "".join(iter_json(empty)) == json.dumps(empty, indent=2) + "\n"
+
+
+def test_iter_ndjson():
+    diff = compare(
+        load_csv(io.StringIO(SIX), key="id"), load_csv(io.StringIO(EIGHT), key="id")
+    )
+    records = [json.loads(line) for line in iter_ndjson(diff)]
+    assert records == [
+        {"Action": "Columns Added", "Column": "length"},
+        {"Action": "Modified", "Key": "3", "Fields": {"name": ["Bailey", "Bailee"]}},
+        {
+            "Action": "Added",
+            "Key": "4",
+            "Fields": {"id": "4", "name": "Bob", "age": "7", "length": "422"},
+        },
+        {
+            "Action": "Removed",
+            "Key": "1",
+            "Fields": {"id": "1", "name": "Cleo", "age": "5"},
+        },
+    ]
+
+
+def test_iter_compare():
+    changes = list(
+        iter_compare(
+            load_csv(io.StringIO(SIX), key="id"), load_csv(io.StringIO(EIGHT), key="id")
+        )
+    )
+    assert changes == [
+        Change(CADD, "length", None),
+        Change(RMOD, "3", {"name": ["Bailey", "Bailee"]}),
+        Change(RADD, "4", {"id": "4", "name": "Bob", "age": "7", "length": "422"}),
+        Change(RREM, "1", {"id": "1", "name": "Cleo", "age": "5"}),
+    ]
+    assert changes[1].action == "Modified"
+
+
+def test_renderers_accept_iterator():
+    previous = load_csv(io.StringIO(SIX), key="id")
+    current = load_csv(io.StringIO(EIGHT), key="id")
+    diff = compare(previous, current)
+    for renderer in (txt_diff, tsv_diff):
+        assert renderer(iter_compare(previous, current), "id") == renderer(diff, "id")
+    for renderer in (iter_json, iter_ndjson):
+        assert list(renderer(iter_compare(previous, current))) == list(renderer(diff))
+
+
+def test_show_unchanged():
+    previous = load_csv(io.StringIO(ONE), key="id")
+    current = load_csv(io.StringIO(TWO), key="id")
+    (change,) = list(iter_compare(previous, current, show_unchanged=True))
+    assert isinstance(change.unchanged, UnchangedFields)
+    assert change.unchanged == {"id": "1", "name": "Cleo"}
+    assert "age" not in change.unchanged
+    # A view over the current row, not a copy of it
+    current["1"]["name"] = "Cleopatra"
+    assert change.unchanged["name"] == "Cleopatra"
+    assert compare(previous, current)[RMOD][0].get("unchanged") is None
+
+
+def test_show_unchanged_skips_changed_columns():
+    previous = load_csv(io.StringIO(ONE), key="id")
+    current = load_csv(io.StringIO("id,name,age,weight\n1,Cleo,5,48\n2,Pancakes,2,10"), key="id")
+    diff = compare(previous, current, show_unchanged=True)
+    assert dict(diff[RMOD][0]["unchanged"]) == {"id": "1", "name": "Cleo"}
+    assert json.loads("".join(iter_json(diff)))[RMOD][0]["unchanged"] == {"id": "1", "name": "Cleo"}
+    records = [json.loads(line) for line in iter_ndjson(diff)]
+    assert [r["unchanged"] for r in records if r["Action"] == RMOD] == [{"id": "1", "name": "Cleo"}]
+    assert txt_diff(diff, key="id").endswith('Unchanged:\n      name: "Cleo"')
+
+
+STATS_PREVIOUS = """id,name,age,score
+1,Cleo,4,1.5
+2,Pancakes,2,
+3,Bailey,1,2
+4,Fido,3,x"""
+
+STATS_CURRENT = """id,name,age,score
+1,Cleo,5,
+2,Pancakes,4,3
+3,Bailey,0,2
+4,Rex,3,y
+5,Rover,1,1"""
+
+
+def test_column_stats():
+    diff = compare(
+        load_csv(io.StringIO(STATS_PREVIOUS), key="id"),
+        load_csv(io.StringIO(STATS_CURRENT), key="id"),
+        stats=True,
+    )
+    assert len(diff[RMOD]) == 4
+    assert diff[STAT] == {
+        "age": {"changed": 3, "to_empty": 0, "from_empty": 0, "numeric": 3,
+                "delta_min": -1.0, "delta_max": 2.0, "delta_mean": 2 / 3},
+        "score": {"changed": 3, "to_empty": 1, "from_empty": 1, "numeric": 0,
+                  "delta_min": None, "delta_max": None, "delta_mean": None},
+        "name": {"changed": 1, "to_empty": 0, "from_empty": 0, "numeric": 0,
+                 "delta_min": None, "delta_max": None, "delta_mean": None},
+    }
+    assert STAT not in compare(load_csv(io.StringIO(ONE), key="id"), load_csv(io.StringIO(TWO), key="id"))
+
+
+def test_column_stats_outputs():
+    diff = compare(
+        load_csv(io.StringIO(ONE), key="id"), load_csv(io.StringIO(TWO), key="id"), stats=True
+    )
+    assert "".join(iter_json(diff)) == json.dumps(diff, indent=2) + "\n"
+    assert json.loads(list(iter_ndjson(diff))[-1]) == {
+        "Action": STAT, "Column": "age", "changed": 1, "to_empty": 0, "from_empty": 0,
+        "numeric": 1, "delta_min": 1.0, "delta_max": 1.0, "delta_mean": 1.0,
+    }
+    assert txt_diff(diff, key="id").endswith(
+        "Column statistics\n\n  age: 1 changed, 0 to empty, 0 from empty, "
+        "1 numeric (delta min 1, max 1, mean 1)"
+    )
+    assert tsv_diff(diff, key="id").endswith(STAT + "\tdelta_mean\t\tage\t\t1.0")
@@ -0,0 +1,138 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_csv, iter_compare, CADD, CREM
+from csv_diff.distributed import DiffWorker, DistributedError, distributed_compare, load_partition, _Handler
+import json
+import socket
+import threading
+import pytest
+
+
+def start(server_class=DiffWorker):
+    server = server_class(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def workers():
+    servers = [start(), start()]
+    yield [server.server_address[:2] for server in servers]
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def files(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write("id,name,age\n" + "".join("{},name {},{}\n".format(i, i, i % 7) for i in range(300)))
+    current = tmpdir / "current.csv"
+    current.write("id,name,age,color\n" + "".join(
+        "{},name {},{},red\n".format(i, i, i % 7 if i % 5 else i % 7 + 1)
+        for i in range(30, 330) if i % 11
+    ))
+    return str(previous), str(current)
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()
+
+
+def load(filename, key="id"):
+    with open(filename, newline="") as fp:
+        return load_csv(fp, key=key)
+
+
+def rows_only(changes):
+    # Column changes come out of iter_compare in set order
+    return [tuple(c[:3]) for c in changes if c.action not in (CADD, CREM)]
+
+
+def columns(changes):
+    return sorted((c.action, c.key) for c in changes if c.action in (CADD, CREM))
+
+
+def test_matches_iter_compare(files, workers):
+    expected = list(iter_compare(load(files[0]), load(files[1]), stats=True))
+    for partitions in (None, 1, 5):
+        changes = list(distributed_compare(*files, workers, partitions=partitions, key="id", stats=True))
+        assert rows_only(changes) == rows_only(expected)
+        assert columns(changes) == columns(expected) == [(CADD, "color")]
+        assert changes[-1] == expected[-1]
+
+
+def test_multi_column_key(files, workers):
+    expected = list(iter_compare(load(files[0], "id,name"), load(files[1], "id,name")))
+    changes = list(distributed_compare(*files, workers, partitions=3, key="id,name"))
+    assert rows_only(changes) == rows_only(expected)
+    assert isinstance(changes[-1].key, tuple)
+
+
+def test_load_partition_positions(files):
+    tables = [load_partition(files[1], i, 3, key="id") for i in range(3)]
+    assert sorted(id for table, _ in tables for id in table) == sorted(load(files[1]))
+    positions = {id: position for _, p in tables for id, position in p.items()}
+    assert sorted(positions, key=positions.get) == list(load(files[1]))
+
+
+def test_unreachable_worker_is_retried(files, workers):
+    expected = rows_only(iter_compare(load(files[0]), load(files[1])))
+    changes = distributed_compare(*files, [closed_port()] + workers, partitions=6, key="id")
+    assert rows_only(changes) == expected
+
+
+class FlakyHandler(_Handler):
+    # Drops the connection after a few changes
+    def _send(self, record):
+        self.sent = getattr(self, "sent", 0) + 1
+        if self.sent > 3:
+            raise ConnectionResetError("worker died")
+        super()._send(record)
+
+
+class FlakyWorker(DiffWorker):
+    def __init__(self, address):
+        super(DiffWorker, self).__init__(address, FlakyHandler)
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def test_failed_range_resumes_on_another_worker(files, workers):
+    flaky = start(FlakyWorker)
+    try:
+        expected = rows_only(iter_compare(load(files[0]), load(files[1])))
+        changes = distributed_compare(*files, [flaky.server_address[:2]] + workers, partitions=3, key="id")
+        assert rows_only(changes) == expected
+        with pytest.raises(DistributedError) as e:
+            list(distributed_compare(*files, [flaky.server_address[:2]], key="id", retries=1))
+        assert "failed on every try" in str(e.value)
+    finally:
+        flaky.shutdown()
+        flaky.server_close()
+
+
+def test_worker_error_is_reported(files, workers):
+    with pytest.raises(DistributedError) as e:
+        list(distributed_compare(files[0], files[1] + ".missing", workers, key="id"))
+    assert "FileNotFoundError" in str(e.value)
+
+
+def test_cli(files, workers):
+    runner = CliRunner()
+    expected = runner.invoke(cli.cli, [*files, "--key", "id", "--oformat", "json"])
+    result = runner.invoke(
+        cli.cli,
+        [*files, "--key", "id", "--oformat", "json", "--partitions", "4"]
+        + [arg for address in workers for arg in ("--worker", "{}:{}".format(*address))],
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output) == json.loads(expected.output)
+
+    result = runner.invoke(cli.cli, [*files, "--worker", "localhost", "--key", "id"])
+    assert result.exit_code == 2
+    assert "host:port" in result.output
+    result = runner.invoke(cli.cli, [*files, "--worker", "localhost:1", "--jobs", "2"])
+    assert result.exit_code == 2
@@ -0,0 +1,85 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_csv, compare, RMOD, RADD, RREM
+from csv_diff.estimate import sample_csv, estimate
+from .test_csv_diff import ONE, FIVE, SIX, SEVEN
+import io
+import json
+
+
+def big_files():
+    previous = ["id,name,score"]
+    current = ["id,name,score"]
+    for i in range(20000):
+        if i % 10 != 3:
+            previous.append("{},name {},{}".format(i, i, i % 7))
+        if i % 25 == 4:
+            continue
+        score = i % 7 + (1 if i % 8 == 0 else 0)
+        current.append("{},name {},{}".format(i, i, score))
+    for i in range(20000, 21000):
+        current.append("{},name {},0".format(i, i))
+    return "\n".join(previous), "\n".join(current)
+
+
+def run_estimate(previous, current, modulus, key="id"):
+    previous_sample, previous_rows = sample_csv(io.StringIO(previous), key=key, modulus=modulus)
+    current_sample, current_rows = sample_csv(io.StringIO(current), key=key, modulus=modulus)
+    return estimate(previous_sample, current_sample, modulus, previous_rows, current_rows)
+
+
+def test_modulus_one_is_exact():
+    est = run_estimate(ONE, FIVE, 1)
+    diff = compare(load_csv(io.StringIO(ONE), key="id"), load_csv(io.StringIO(FIVE), key="id"))
+    for action in (RMOD, RADD, RREM):
+        assert est[action] == {
+            "estimate": len(diff[action]),
+            "low": len(diff[action]),
+            "high": len(diff[action]),
+        }
+    assert est["Column change rates"] == {"age": 0.5}
+
+
+def test_bounds_contain_true_counts():
+    previous, current = big_files()
+    diff = compare(load_csv(io.StringIO(previous), key="id"), load_csv(io.StringIO(current), key="id"))
+    est = run_estimate(previous, current, 20)
+    assert est["Sample"]["previous_rows"] == 18000
+    assert est["Sample"]["current_sampled"] < est["Sample"]["current_rows"] / 10
+    for action in (RMOD, RADD, RREM):
+        assert est[action]["low"] <= len(diff[action]) <= est[action]["high"]
+    assert 0.05 < est["Column change rates"]["score"] < 0.2
+
+
+def test_columns_changed():
+    est = run_estimate(SIX, SEVEN, 1)
+    assert est["Columns Added"] == ["weight"]
+    assert est["Columns Removed"] == ["age"]
+
+
+def test_keyless_sample():
+    previous, current = big_files()
+    est = run_estimate(previous, current, 10, key=None)
+    assert est[RMOD]["estimate"] == 0
+    assert est[RADD]["low"] > 0
+
+
+def test_cli_estimate(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    five = tmpdir / "five.csv"
+    five.write(FIVE)
+    result = CliRunner().invoke(
+        cli.cli,
+        [str(one), str(five), "--key", "id", "--estimate", "--sample-modulus", "1"],
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code, result.output
+    assert "~2 rows added (95% confidence: 2 to 2)" in result.output
+    assert "age: 50.0%" in result.output
+    result = CliRunner().invoke(
+        cli.cli,
+        [str(one), str(five), "--key", "id", "--estimate", "--oformat", "json"],
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code, result.output
+    assert json.loads(result.output)["Sample"]["modulus"] == 100
@@ -0,0 +1,58 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv, RMOD
+from csv_diff.fanout import fan_out
+from .test_csv_diff import ONE, TWO, FIVE, SEVEN
+import io
+import json
+import pytest
+
+
+@pytest.fixture
+def currents(tmpdir):
+    paths = []
+    for name, content in (("east.csv", TWO), ("west.csv", FIVE), ("north.csv", SEVEN)):
+        path = tmpdir / name
+        path.write(content)
+        paths.append(str(path))
+    previous = tmpdir / "reference.csv"
+    previous.write(ONE)
+    return str(previous), paths
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_fan_out(tmpdir, currents, workers):
+    previous, paths = currents
+    output_dir = str(tmpdir / "out")
+    summaries = fan_out(previous, paths, output_dir, key="id", oformat="json", workers=workers)
+    assert [s["current"] for s in summaries] == paths
+    for summary, content in zip(summaries, (TWO, FIVE, SEVEN)):
+        expected = compare(load_csv(io.StringIO(ONE), key="id"), load_csv(io.StringIO(content), key="id"))
+        with open(summary["output"]) as fp:
+            assert json.load(fp) == expected
+        assert summary[RMOD] == len(expected[RMOD])
+    assert summaries[1]["Added"] == 2
+    assert summaries[2]["Columns Added"] == ["weight"]
+    with open(str(tmpdir / "out" / "summary.json")) as fp:
+        assert json.load(fp) == summaries
+
+
+def test_errors_are_reported_per_file(tmpdir, currents):
+    previous, paths = currents
+    bad = tmpdir / "bad.csv"
+    bad.write("name\nno id column\n")
+    summaries = fan_out(previous, paths[:1] + [str(bad)], str(tmpdir / "out"), key="id")
+    assert "error" not in summaries[0]
+    assert summaries[1]["error"].startswith("KeyError")
+
+
+def test_cli_fanout(tmpdir, currents):
+    previous, paths = currents
+    output_dir = tmpdir / "out"
+    result = CliRunner().invoke(cli.cli, ["fanout", previous] + paths + ["--key", "id", "--output-dir", str(output_dir)])
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0].startswith(paths[0] + ": 1 row changed, 0 rows added, 0 rows removed -> ")
+    assert "1 column added, 1 column removed" in lines[2]
+    assert (output_dir / "east.csv.txt").read().startswith("1 row changed")
+    result = CliRunner().invoke(cli.cli, ["fanout", previous, paths[0], paths[0], "--output-dir", str(output_dir)])
+    assert result.exit_code == 2
@@ -0,0 +1,93 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_csv, compare
+from csv_diff.fingerprint import (
+    fingerprint_csv,
+    mismatched_buckets,
+    load_csv_buckets,
+    FingerprintError,
+)
+from .test_csv_diff import ONE, TWO
+import io
+import json
+import pytest
+
+
+def make_files():
+    previous = ["id,name,score"] + ["{},name {},{}".format(i, i, i % 7) for i in range(3000)]
+    current = list(previous)
+    current[11] = "10,name 10,99"
+    current[2001] = "2000,renamed,5"
+    del current[501]
+    current.append("3000,new,1")
+    return "\n".join(previous), "\n".join(current)
+
+
+def test_identical_files_have_no_mismatches():
+    previous, _ = make_files()
+    a = fingerprint_csv(io.StringIO(previous), key="id", depth=6)
+    b = fingerprint_csv(io.StringIO(previous), key="id", depth=6)
+    assert a["rows"] == 3000
+    assert len(a["levels"]) == 7
+    assert len(a["levels"][-1]) == 64
+    assert mismatched_buckets(a, b) == []
+
+
+def test_row_order_does_not_matter():
+    lines = ONE.splitlines()
+    shuffled = "\n".join([lines[0], lines[2], lines[1]])
+    assert mismatched_buckets(
+        fingerprint_csv(io.StringIO(ONE), key="id"),
+        fingerprint_csv(io.StringIO(shuffled), key="id"),
+    ) == []
+
+
+def test_only_mismatching_ranges_are_compared():
+    previous, current = make_files()
+    a = fingerprint_csv(io.StringIO(previous), key="id", depth=8)
+    b = fingerprint_csv(io.StringIO(current), key="id", depth=8)
+    buckets = mismatched_buckets(a, b)
+    assert 1 <= len(buckets) <= 4
+    previous_data = load_csv_buckets(io.StringIO(previous), buckets, 8, key="id")
+    current_data = load_csv_buckets(io.StringIO(current), buckets, 8, key="id")
+    assert len(previous_data) < 100
+    full = compare(
+        load_csv(io.StringIO(previous), key="id"), load_csv(io.StringIO(current), key="id")
+    )
+    assert compare(previous_data, current_data) == full
+
+
+def test_different_settings_rejected():
+    a = fingerprint_csv(io.StringIO(ONE), key="id", depth=4)
+    b = fingerprint_csv(io.StringIO(ONE), key="id", depth=5)
+    with pytest.raises(FingerprintError):
+        mismatched_buckets(a, b)
+
+
+def test_cli_fingerprints(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    trees = []
+    for name in ("one", "two"):
+        tree = str(tmpdir / (name + ".fp"))
+        result = CliRunner().invoke(
+            cli.cli,
+            ["fingerprint", str(tmpdir / (name + ".csv")), "--key", "id", "--o", tree],
+            catch_exceptions=False,
+        )
+        assert 0 == result.exit_code, result.output
+        trees.append(tree)
+    result = CliRunner().invoke(
+        cli.cli,
+        [str(one), str(two), "--key", "id", "--oformat", "json", "--fingerprints"] + trees,
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code, result.output
+    assert json.loads(result.output)["Modified"] == [
+        {"Key": "1", "Fields": {"age": ["4", "5"]}}
+    ]
+    result = CliRunner().invoke(
+        cli.cli, [str(one), str(two), "--fingerprints"] + trees
+    )
+    assert 2 == result.exit_code
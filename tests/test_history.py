@@ -0,0 +1,82 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_file, compare, RMOD, RADD, RREM, _collect
+from csv_diff.history import iter_history, Timeline
+import csv_diff.history
+import json
+import pytest
+
+
+@pytest.fixture
+def snapshots(tmpdir):
+    days = [
+        "id,name,age\n1,Cleo,4\n2,Pancakes,2\n",
+        "id,name,age\n1,Cleo,5\n2,Pancakes,2\n3,Bailey,1\n",
+        "id,name,age\n1,Cleo,6\n3,Bailey,1\n",
+        "id,name,age\n1,Cleo,6\n3,Bailey,1\n2,Pancakes,3\n",
+    ]
+    filenames = []
+    for i, text in enumerate(days, 1):
+        filename = tmpdir / "day{}.csv".format(i)
+        filename.write(text)
+        filenames.append(str(filename))
+    return filenames
+
+
+def test_each_snapshot_loaded_once(snapshots, monkeypatch):
+    loaded = []
+
+    def counting_load(filename, **kwargs):
+        loaded.append(filename)
+        return load_file(filename, **kwargs)
+
+    monkeypatch.setattr(csv_diff.history, "load_file", counting_load)
+    for previous, current, _, changes in iter_history(snapshots, key="id"):
+        expected = compare(load_file(previous, key="id"), load_file(current, key="id"))
+        assert _collect(changes) == expected
+    assert loaded == snapshots
+
+
+def test_timeline(snapshots):
+    timeline = Timeline()
+    for _, _, _, changes in iter_history(snapshots, key="id", timeline=timeline):
+        list(changes)
+    day = lambda n: snapshots[n - 1]
+    assert dict(timeline.items()) == {
+        "1": [(day(2), RMOD, {"age": ["4", "5"]}), (day(3), RMOD, {"age": ["5", "6"]})],
+        "3": [(day(2), RADD, None)],
+        "2": [(day(3), RREM, None), (day(4), RADD, None)],
+    }
+    assert timeline.as_list()[2] == {
+        "key": "2",
+        "changes": [{"snapshot": day(3), "action": RREM}, {"snapshot": day(4), "action": RADD}],
+    }
+
+
+def test_needs_two_snapshots(snapshots):
+    with pytest.raises(ValueError):
+        next(iter_history(snapshots[:1]))
+
+
+def test_cli(snapshots):
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ["history"] + snapshots + ["--key", "id"])
+    assert result.exit_code == 0, result.output
+    assert result.output.count(" -> ") == 3
+    assert result.output.startswith("{} -> {}\n\n1 row changed, 1 row added\n".format(*snapshots[:2]))
+
+    result = runner.invoke(cli.cli, ["history"] + snapshots + ["--key", "id", "--oformat", "json"])
+    steps = json.loads(result.output)
+    assert [(s["previous"], s["current"]) for s in steps] == list(zip(snapshots, snapshots[1:]))
+    assert steps[2]["diff"][RADD] == [{"Key": "2", "Fields": {"id": "2", "name": "Pancakes", "age": "3"}}]
+
+    result = runner.invoke(cli.cli, ["history"] + snapshots + ["--key", "id", "--timeline"])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith(
+        'id: 1\n  {}: changed\n    age: "4" => "5"\n  {}: changed\n'.format(snapshots[1], snapshots[2])
+    )
+    result = runner.invoke(cli.cli, ["history"] + snapshots + ["--timeline"])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("Row: ")
+    assert "None" not in result.output
+    result = runner.invoke(cli.cli, ["history"] + snapshots[:1] + ["--key", "id"])
+    assert result.exit_code == 2
@@ -0,0 +1,37 @@
+from .test_csv_diff import ONE, TWO
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("xlsxwriter", "dictdiffer", "hashlib", "json", "csv_diff.patch", "csv_diff.xlsx")
+
+
+def imported_after(code):
+    check = "import sys; print('\\n' + ' '.join(m for m in {!r} if m in sys.modules))".format(HEAVY)
+    output = subprocess.check_output(
+        [sys.executable, "-c", code + "\n" + check], cwd=ROOT, universal_newlines=True
+    )
+    return output.splitlines()[-1].split() if output.strip() else []
+
+
+def test_import_is_light():
+    assert imported_after("import csv_diff.cli") == []
+
+
+def test_txt_diff_only_loads_what_it_needs(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    code = "from csv_diff.cli import cli\ncli([{!r}, {!r}, '--key', 'id'], standalone_mode=False)".format(
+        str(one), str(two)
+    )
+    assert imported_after(code) == ["dictdiffer"]
+
+
+def test_xlsx_diff_still_importable():
+    import csv_diff
+    from csv_diff.xlsx import xlsx_diff
+
+    assert csv_diff.xlsx_diff is xlsx_diff
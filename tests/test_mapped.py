@@ -0,0 +1,109 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv, RMOD
+from csv_diff import mapped
+from csv_diff.mapped import load_mapped, MappedTable
+import csv
+import io
+import pytest
+
+FILES = [
+    "id,name,age\n1,Cleo,4\n2,Pancakes,2\n",
+    "id,name,age\r\n1,Cleo,4\r\n2,Pancakes,2",
+    'id,name,age\n1,"Cleo, the\ncat",4\n2,"Pan""cakes",2\n3,Bailey,\n',
+    "id\tname\tage\n1\tCleo\t4\n2\tPancakes\t2\n",
+    "id,name,age\n1,Cleo,4\n2,Pancakes\n1,Cleo,5\n",
+    "id,name,age\n1,Cleo,4\n\n2,Pancakes,2\n",
+    "id,name,age\n",
+    "",
+]
+
+
+def write(text, tmpdir):
+    path = tmpdir / "file.csv"
+    path.write_binary(text.encode("utf-8"))
+    return str(path)
+
+
+@pytest.mark.parametrize("text", FILES)
+@pytest.mark.parametrize("options", [{"key": "id"}, {"key": "id,age", "ignore": "name"}, {}])
+def test_same_as_load_csv(text, options, tmpdir, monkeypatch):
+    path = write(text, tmpdir)
+    try:
+        with open(path, newline="", encoding="utf-8") as fp:
+            expected = load_csv(fp, **options) if text else {}
+    except LookupError:
+        # Rows without the key columns, which fail either way
+        with pytest.raises(LookupError):
+            load_mapped(path, encoding="utf-8", **options)
+        return
+    # Blocks that end in the middle of records, and quoted newlines
+    for read_size in (mapped.READ_SIZE, 7):
+        monkeypatch.setattr(mapped, "READ_SIZE", read_size)
+        with load_mapped(path, encoding="utf-8", **options) as table:
+            assert dict(table) == expected
+            assert list(table) == list(expected)
+
+
+def test_compare(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write('id,name,age\n1,Cleo,4\n2,Pancakes,2\n3,"Bailey\nthe dog",1\n')
+    current = tmpdir / "current.csv"
+    current.write('id,name,age\n1,Cleo,5\n2,Pancakes,2\n3,"Bailey\nthe dog",1\n4,Dash,3\n')
+    with load_mapped(str(previous), key="id") as one, load_mapped(str(current), key="id") as two:
+        assert isinstance(one, MappedTable)
+        same_row = two.same_row_test(one)
+        assert [same_row(id) for id in "123"] == [False, True, True]
+        result = compare(one, two, show_unchanged=True)
+    with open(str(previous), newline="") as fp:
+        expected = compare(load_csv(fp, key="id"), load_csv(io.StringIO(current.read()), key="id"), show_unchanged=True)
+    assert result == expected
+    assert result[RMOD] == [{"Key": "1", "Fields": {"age": ["4", "5"]}, "unchanged": {"id": "1", "name": "Cleo"}}]
+
+
+class Escaped(csv.excel):
+    escapechar = "\\"
+    doublequote = False
+
+
+def test_mixed_line_endings(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write_binary(b"id,name\r\n1,Cleo\r\n2,Pancakes\r\n")
+    current = tmpdir / "current.csv"
+    current.write_binary(b"id,name\n1,Cleo\n2,Pancakes\r\n")
+    with load_mapped(str(previous), key="id") as one, load_mapped(str(current), key="id") as two:
+        same_row = two.same_row_test(one)
+        assert same_row("1") and same_row("2")
+        assert compare(one, two)[RMOD] == []
+
+
+def test_escapes_and_stray_quotes(tmpdir):
+    path = tmpdir / "file.csv"
+    path.write('id,name\n1,Cleo\\,the cat\n2,"Pan\\"cakes"\n3,5\'10"\n4,Bailey\n')
+    with open(str(path), newline="") as fp:
+        expected = load_csv(fp, key="id", dialect=Escaped)
+    assert dict(load_mapped(str(path), key="id", dialect=Escaped)) == expected
+    # A quote inside an unquoted field doesn't start a quoted one
+    path.write('id,name\n1,5\'10"\n2,Pancakes\n')
+    assert dict(load_mapped(str(path), key="id", dialect="excel")) == {
+        "1": {"id": "1", "name": "5'10\""}, "2": {"id": "2", "name": "Pancakes"},
+    }
+
+
+def test_falls_back_to_load_csv(tmpdir):
+    path = tmpdir / "file.csv"
+    path.write_binary("id,name\n1,Cleo\n".encode("utf-16"))
+    assert load_mapped(str(path), key="id", dialect="excel", encoding="utf-16") == {"1": {"id": "1", "name": "Cleo"}}
+
+
+def test_cli(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write("id,name,age\n1,Cleo,4\n2,Pancakes,2\n")
+    current = tmpdir / "current.csv"
+    current.write("id,name,age\n1,Cleo,5\n3,Bailey,1\n")
+    runner = CliRunner()
+    args = [str(previous), str(current), "--key", "id"]
+    result = runner.invoke(cli.cli, args + ["--mmap"])
+    assert result.exit_code == 0, result.output
+    assert result.output == runner.invoke(cli.cli, args).output
+    result = runner.invoke(cli.cli, args + ["--mmap", "--jobs", "2"])
+    assert result.exit_code == 2
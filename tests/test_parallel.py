@@ -0,0 +1,79 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_csv
+from csv_diff import parallel
+from csv_diff.parallel import load_csv_parallel
+import json
+import pytest
+
+
+def write_tricky(path, delimiter=",", rows=3000, changed=None):
+    lines = ["id{0}name{0}notes".format(delimiter)]
+    for i in range(rows):
+        note = 'line one\nline two, "quoted"' if i % 7 == 0 else "plain {}".format(i)
+        if changed and i in changed:
+            note = "changed"
+        quoted = '"' + note.replace('"', '""') + '"'
+        lines.append("{1}{0}name {1}{0}{2}".format(delimiter, i, quoted if i % 2 else note.replace("\n", " ").replace('"', "")))
+    path.write_binary(("\r\n".join(lines) + "\r\n").encode("utf8"))
+    return str(path)
+
+
+@pytest.mark.parametrize("key", ["id", None])
+def test_matches_load_csv(tmpdir, key):
+    path = write_tricky(tmpdir / "tricky.csv")
+    expected = load_csv(open(path, newline="", encoding="utf8"), key=key)
+    table = load_csv_parallel(path, key=key, workers=3, chunk_size=4096, encoding="utf8")
+    assert table == expected
+    assert list(table) == list(expected)
+    assert "line one\nline two" in list(table.values())[7]["notes"]
+
+
+def test_tsv_and_ignore(tmpdir):
+    path = write_tricky(tmpdir / "tricky.tsv", delimiter="\t")
+    expected = load_csv(
+        open(path, newline="", encoding="utf8"), key="id", dialect="excel-tab", ignore="name"
+    )
+    table = load_csv_parallel(
+        path, key="id", dialect="excel-tab", ignore="name", workers=2, chunk_size=1000, encoding="utf8"
+    )
+    assert table == expected
+
+
+def test_small_files_parse_in_process(tmpdir):
+    path = write_tricky(tmpdir / "small.csv", rows=10)
+    assert load_csv_parallel(path, key="id", encoding="utf8") == load_csv(
+        open(path, newline="", encoding="utf8"), key="id"
+    )
+
+
+def test_cli_jobs(tmpdir, monkeypatch):
+    monkeypatch.setattr(parallel, "CHUNK_SIZE", 4096)
+    one = write_tricky(tmpdir / "one.csv")
+    two = write_tricky(tmpdir / "two.csv", changed={14, 2999})
+    result = CliRunner().invoke(
+        cli.cli,
+        [one, two, "--key", "id", "--iformat", "csv", "--jobs", "2", "--oformat", "json"],
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code, result.output
+    assert [row["Key"] for row in json.loads(result.output)["Modified"]] == ["14", "2999"]
+
+
+def test_cli_jobs_sniffed_plain_file(tmpdir, monkeypatch):
+    # Without any "" the sniffer says quotes aren't doubled, which must not
+    # send the file back to load_csv
+    monkeypatch.setattr(parallel, "CHUNK_SIZE", 4096)
+
+    def in_process(*args, **kwargs):
+        raise AssertionError("parsed in process")
+
+    monkeypatch.setattr(parallel, "load_csv", in_process)
+    one = tmpdir / "one.csv"
+    one.write("id,name\n" + "".join("{0},name {0}\n".format(i) for i in range(3000)))
+    two = tmpdir / "two.csv"
+    two.write(one.read().replace("14,name 14\n", "14,changed\n"))
+    result = CliRunner().invoke(
+        cli.cli, [str(one), str(two), "--key", "id", "--jobs", "2", "--oformat", "json"], catch_exceptions=False
+    )
+    assert 0 == result.exit_code, result.output
+    assert [row["Key"] for row in json.loads(result.output)["Modified"]] == ["14"]
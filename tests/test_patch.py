@@ -0,0 +1,103 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_csv, compare
+from csv_diff.patch import patch_diff, apply_patch, PatchError
+from .test_csv_diff import ONE, TWO, FIVE, SIX, SEVEN, EIGHT, ELEVEN, TWELVE
+import io
+import pytest
+
+
+def apply_and_compare(previous, current, key):
+    previous_data = load_csv(io.StringIO(previous), key=key)
+    current_data = load_csv(io.StringIO(current), key=key)
+    patch = io.BytesIO()
+    patch_diff(compare(previous_data, current_data), patch, key, current=current_data)
+    patch.seek(0)
+    output = io.StringIO()
+    apply_patch(io.StringIO(previous), patch, output)
+    output.seek(0)
+    return compare(load_csv(output, key=key), current_data), patch.getvalue()
+
+
+@pytest.mark.parametrize(
+    "previous,current,key",
+    [
+        (ONE, TWO, "id"),
+        (ONE, FIVE, "id"),
+        (FIVE, ONE, "id"),
+        (ELEVEN, TWELVE, "state,county"),
+        (ONE, FIVE, None),
+    ],
+)
+def test_round_trip(previous, current, key):
+    result, _ = apply_and_compare(previous, current, key)
+    assert not any(result.values())
+
+
+def test_round_trip_new_quotes():
+    # Previous has quoted fields but no doubled quotes, so the sniffer says
+    # quotes aren't doubled
+    previous = 'id,name\n1,"a,b"\n2,Pancakes\n'
+    current = 'id,name\n1,"a,b"\n2,"say ""hi"""\n3,"a ""new"" row"\n'
+    result, _ = apply_and_compare(previous, current, "id")
+    assert not any(result.values())
+
+
+def test_round_trip_columns_changed():
+    result, _ = apply_and_compare(SIX, EIGHT, "id")
+    assert not any(result.values())
+    result, _ = apply_and_compare(SEVEN, SIX, "id")
+    assert not any(result.values())
+
+
+def test_patch_is_compact():
+    previous = "id,name,age\n" + "".join(
+        "{},name {},{}\n".format(i, i, i % 90) for i in range(2000)
+    )
+    current = previous.replace("7,name 7,7\n", "7,name 7,8\n")
+    result, patch = apply_and_compare(previous, current, "id")
+    assert not any(result.values())
+    assert len(patch) < 100
+
+
+def test_added_columns_need_current():
+    diff = compare(
+        load_csv(io.StringIO(SIX), key="id"), load_csv(io.StringIO(EIGHT), key="id")
+    )
+    with pytest.raises(PatchError):
+        patch_diff(diff, io.BytesIO(), "id")
+
+
+def test_corrupt_patch():
+    with pytest.raises(PatchError):
+        apply_patch(io.StringIO(ONE), io.BytesIO(b"\x1f\x8b" + b"\x00" * 20), io.StringIO())
+
+
+def test_cli_patch_and_apply(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    five = tmpdir / "five.csv"
+    five.write(FIVE)
+    patch = tmpdir / "patch.bin"
+    out = tmpdir / "out.csv"
+    result = CliRunner().invoke(
+        cli.cli,
+        [str(one), str(five), "--key", "id", "--oformat", "patch", "--o", str(patch)],
+        catch_exceptions=False,
+    )
+    assert 0 == result.exit_code, result.output
+    result = CliRunner().invoke(
+        cli.cli, ["apply", str(one), str(patch), "--o", str(out)], catch_exceptions=False
+    )
+    assert 0 == result.exit_code, result.output
+    diff = compare(
+        load_csv(open(str(out), newline=""), key="id"),
+        load_csv(io.StringIO(FIVE), key="id"),
+    )
+    assert not any(diff.values())
+
+
+def test_help_lists_diff_options():
+    result = CliRunner().invoke(cli.cli, ["--help"])
+    assert 0 == result.exit_code
+    assert "--key TEXT" in result.output
+    assert "apply" in result.output
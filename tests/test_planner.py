@@ -0,0 +1,79 @@
+from click.testing import CliRunner
+from csv_diff import cli, load_file
+from csv_diff import planner
+from csv_diff.planner import parse_size, estimate_size, load_within_budget, load_with_budget, MemoryBudgetExceeded
+from .test_csv_diff import ONE, TWO
+import json
+import logging
+import pytest
+
+
+def write_big(path, rows=30000):
+    lines = ["id,name,score,notes"]
+    for i in range(rows):
+        lines.append("{0},name {0},{1},{2}".format(i, i % 97, "x" * (i % 40)))
+    path.write("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_parse_size():
+    assert parse_size("1048576") == 1024 ** 2
+    assert parse_size("800M") == 800 * 1024 ** 2
+    assert parse_size("1.5gb") == int(1.5 * 1024 ** 3)
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_estimate_size(tmpdir):
+    filename = write_big(tmpdir / "big.csv")
+    assert (tmpdir / "big.csv").size() > planner.SAMPLE_BYTES
+    estimated, rows, columns = estimate_size(filename, key="id")
+    actual = planner._measured(load_file(filename, key="id"))[0]
+    assert 0.8 < estimated / actual < 1.25
+    assert 27000 < rows < 33000
+    assert columns == 4
+
+
+def test_plan_memory(tmpdir, caplog):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    with caplog.at_level(logging.INFO, logger="csv_diff.planner"):
+        tables = load_within_budget(str(one), str(two), 1024 ** 2, key="id")
+    assert tables == (load_file(str(one), key="id"), load_file(str(two), key="id"))
+    assert "Plan: memory" in caplog.text
+
+
+def test_plan_disk(tmpdir, caplog):
+    one = write_big(tmpdir / "one.csv")
+    two = write_big(tmpdir / "two.csv")
+    with caplog.at_level(logging.INFO, logger="csv_diff.planner"):
+        assert load_within_budget(one, two, 1024 ** 2, key="id") is None
+    assert "Plan: disk" in caplog.text
+
+
+def test_plan_changes_while_loading(tmpdir, caplog, monkeypatch):
+    one = write_big(tmpdir / "one.csv")
+    two = write_big(tmpdir / "two.csv")
+    # The estimate is badly wrong, so the loader has to notice
+    monkeypatch.setattr(planner, "estimate_size", lambda *args, **kwargs: (1000, 10, 4))
+    with caplog.at_level(logging.INFO, logger="csv_diff.planner"):
+        assert load_within_budget(one, two, 4 * 1024 ** 2, key="id") is None
+    assert "Plan: memory" in caplog.text
+    assert "Plan changed to disk" in caplog.text
+    with pytest.raises(MemoryBudgetExceeded):
+        load_with_budget(one, 1024 ** 2, key="id")
+
+
+@pytest.mark.parametrize("max_memory", ["1K", "1G"])
+def test_cli_max_memory(tmpdir, max_memory):
+    one = tmpdir / "one.csv"
+    one.write(ONE)
+    two = tmpdir / "two.csv"
+    two.write(TWO)
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--key", "id", "--oformat", "json", "--max-memory", max_memory])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout)["Modified"] == [{"Key": "1", "Fields": {"age": ["4", "5"]}}]
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--max-memory", "lots"])
+    assert result.exit_code == 2
@@ -0,0 +1,119 @@
+from click.testing import CliRunner
+from csv_diff import cli, RMOD, RADD, RREM, CADD, STAT
+from csv_diff.positional import diff_sequences, iter_positional, load_rows, _hunks
+import io
+import json
+import random
+import pytest
+
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        row = [0]
+        for j, y in enumerate(b):
+            row.append(previous[j] + 1 if x == y else max(previous[j + 1], row[j]))
+        previous = row
+    return previous[-1]
+
+
+def test_diff_sequences_is_shortest():
+    rng = random.Random(1)
+    for _ in range(500):
+        a = [rng.randint(0, 4) for _ in range(rng.randint(0, 25))]
+        b = [rng.randint(0, 4) for _ in range(rng.randint(0, 25))]
+        ops = diff_sequences(a, b)
+        deleted = {i for op, i in ops if op == "-"}
+        inserted = {j for op, j in ops if op == "+"}
+        assert [x for i, x in enumerate(a) if i not in deleted] == [y for j, y in enumerate(b) if j not in inserted]
+        assert len(ops) == len(a) + len(b) - 2 * lcs_length(a, b)
+
+
+def test_hunks():
+    a = list("abcdefg")
+    b = list("abXdeYZg")
+    assert list(_hunks(diff_sequences(a, b))) == [([2], [2]), ([5], [5, 6])]
+    assert diff_sequences([], [1, 2]) == [("+", 0), ("+", 1)]
+    assert diff_sequences([1, 2], [3, 4]) == [("-", 0), ("-", 1), ("+", 0), ("+", 1)]
+
+
+def rows(text):
+    return load_rows(io.StringIO(text))
+
+
+def actions(changes):
+    return [(c.action, c.key) for c in changes]
+
+
+def test_iter_positional():
+    previous = rows("name,age\nCleo,4\nPancakes,2\nBailey,1\nDash,3\nCleo,4\n")
+    current = rows("name,age\nCleo,4\nNew,9\nPancakes,3\nBailey,1\nCleo,4\n")
+    changes = list(iter_positional(previous, current, stats=True))
+    assert actions(changes) == [(RMOD, 3), (RADD, 2), (RREM, 4), (STAT, None)]
+    assert changes[0].fields == {"age": ["2", "3"]}
+    # A repeated row that moves is a removal and an insertion, not nothing
+    changes = list(iter_positional(rows("a\n1\n2\n3\n"), rows("a\n3\n1\n2\n")))
+    assert actions(changes) == [(RADD, 1), (RREM, 3)]
+
+
+class Colliding(str):
+    # Values whose hash() is always the same, like a hash collision
+    def __hash__(self):
+        return 1
+
+
+def test_rows_with_the_same_hash():
+    previous = [{"a": Colliding("x")}, {"a": Colliding("y")}]
+    current = [{"a": Colliding("x")}, {"a": Colliding("z")}]
+    assert hash(tuple(previous[1].values())) == hash(tuple(current[1].values()))
+    assert actions(iter_positional(previous, current)) == [(RMOD, 2)]
+
+
+def test_columns_changed():
+    previous = rows("name,age\nCleo,4\nPancakes,2\n")
+    current = rows("name,age,color\nCleo,4,red\nPancakes,2,tan\nBailey,1,\n")
+    changes = list(iter_positional(previous, current, show_unchanged=True))
+    assert actions(changes) == [(CADD, "color"), (RADD, 3)]
+
+
+def test_nearly_identical_files_are_fast():
+    previous = [{"a": str(i)} for i in range(200000)]
+    current = list(previous)
+    current[1000] = {"a": "changed"}
+    del current[150000]
+    assert actions(iter_positional(previous, current)) == [(RMOD, 1001), (RREM, 150001)]
+
+
+@pytest.fixture
+def files(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write("name,age\nCleo,4\nPancakes,2\nBailey,1\n")
+    current = tmpdir / "current.csv"
+    current.write("name,age\nCleo,5\nPancakes,2\nDash,1\nBailey,1\n")
+    return str(previous), str(current)
+
+
+def test_cli(files):
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, [*files, "--positional"])
+    assert result.exit_code == 0, result.output
+    assert result.output == (
+        "1 row changed, 1 row added\n\n1 row changed\n\n  row: 1\n    age: \"4\" => \"5\"\n\n"
+        "1 row added\n\n  name: Dash\n  age: 1\n"
+    )
+    result = runner.invoke(cli.cli, [*files, "--positional", "--oformat", "json"])
+    assert json.loads(result.output)[RADD] == [{"Key": 3, "Fields": {"name": "Dash", "age": "1"}}]
+    result = runner.invoke(cli.cli, [*files, "--positional", "--key", "name"])
+    assert result.exit_code == 2
+
+
+def test_cli_tsv_and_xlsx(files, tmpdir):
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, [*files, "--positional", "--oformat", "tsv"])
+    assert result.exit_code == 0, result.output
+    assert "Modified\tRow\t1\trow" in result.output
+    assert "Added\tField\t3\tname\tDash" in result.output
+    output = str(tmpdir / "diff.xlsx")
+    result = runner.invoke(cli.cli, [*files, "--positional", "--oformat", "xlsx", "--o", output])
+    assert result.exit_code == 0, result.output
+    assert (tmpdir / "diff.xlsx").size() > 0
@@ -0,0 +1,122 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv
+from csv_diff.prefix import common_prefix, load_tails, PrefixError
+import io
+import json
+import pytest
+
+
+def write_rows(path, rows, changed=None):
+    lines = ["id,name,notes"]
+    for i in range(rows):
+        note = '"two\nlines, ""quoted"""' if i % 5 == 0 else "plain {}".format(i)
+        if changed and i in changed:
+            note = "changed"
+        lines.append("{0},name {0},{1}".format(i, note))
+    path.write_binary(("\n".join(lines) + "\n").encode("utf8"))
+    return str(path)
+
+
+def full_compare(previous, current):
+    with open(previous, newline="") as one, open(current, newline="") as two:
+        return compare(load_csv(one, key="id"), load_csv(two, key="id"))
+
+
+def test_common_prefix_ends_at_a_record():
+    one = b'id,notes\n1,"a\nb"\n2,x\n'
+    two = b'id,notes\n1,"a\nb"\n2,y\n'
+    for block_size in (3, 4, 7, 1024):
+        assert common_prefix(io.BytesIO(one), io.BytesIO(two), block_size=block_size) == 17
+    # The shared bytes end inside a quoted value
+    one = b'id,notes\n1,"a\nb\nc"\n'
+    two = b'id,notes\n1,"a\nb\nd"\n'
+    assert common_prefix(io.BytesIO(one), io.BytesIO(two), block_size=5) == 9
+    assert common_prefix(io.BytesIO(one), io.BytesIO(one)) == len(one)
+    assert common_prefix(io.BytesIO(b"a,b\n"), io.BytesIO(b"a,c\n")) == 0
+
+
+def test_append_only(tmpdir):
+    previous = write_rows(tmpdir / "previous.csv", 1000)
+    current = write_rows(tmpdir / "current.csv", 1010)
+    previous_rows, current_rows, stats = load_tails(previous, current, key="id")
+    assert previous_rows == {}
+    assert sorted(current_rows, key=int) == [str(i) for i in range(1000, 1010)]
+    assert stats["append_only"]
+    assert stats["previous_tail_bytes"] == 0
+    assert stats["prefix_bytes"] == (tmpdir / "previous.csv").size()
+    assert stats["prefix_rows"] == 1000
+    assert compare(previous_rows, current_rows) == full_compare(previous, current)
+
+
+def test_changed_in_the_middle(tmpdir):
+    previous = write_rows(tmpdir / "previous.csv", 1000)
+    current = write_rows(tmpdir / "current.csv", 1005, changed={500, 600})
+    previous_rows, current_rows, stats = load_tails(previous, current, key="id")
+    assert not stats["append_only"]
+    assert len(previous_rows) == 500
+    assert compare(previous_rows, current_rows) == full_compare(previous, current)
+
+
+def test_plain_unquoted_file(tmpdir):
+    # Without any "" in it, the sniffer says the file doesn't double quotes
+    previous = tmpdir / "previous.csv"
+    previous.write("id,name\n" + "".join("{0},name {0}\n".format(i) for i in range(50)))
+    current = tmpdir / "current.csv"
+    current.write(previous.read() + "50,name 50\n")
+    previous_rows, current_rows, stats = load_tails(str(previous), str(current), key="id")
+    assert stats["append_only"]
+    assert list(current_rows) == ["50"]
+    result = CliRunner().invoke(cli.cli, [str(previous), str(current), "--key", "id", "--append-only"])
+    assert result.exit_code == 0
+    assert "Skipped" in result.stderr
+    assert result.stdout.startswith("1 row added")
+
+
+def test_no_shared_header(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write("id,name\n1,Cleo\n")
+    current = tmpdir / "current.csv"
+    current.write("id,age\n1,4\n")
+    assert load_tails(str(previous), str(current), key="id") is None
+    with pytest.raises(PrefixError):
+        load_tails(str(previous), str(current), key="id", iformat="json")
+
+
+def test_cli_append_only(tmpdir):
+    previous = write_rows(tmpdir / "previous.csv", 200)
+    current = write_rows(tmpdir / "current.csv", 205, changed={150})
+    args = [previous, current, "--key", "id", "--oformat", "json"]
+    full = CliRunner().invoke(cli.cli, args)
+    result = CliRunner().invoke(cli.cli, args + ["--append-only"])
+    assert result.exit_code == 0
+    assert json.loads(result.stdout) == json.loads(full.stdout)
+    assert "Skipped" in result.stderr
+
+
+def test_key_repeated_after_the_prefix(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write("id,name\n1,Cleo\n2,Pancakes\n")
+    current = tmpdir / "current.csv"
+    # Row 1 comes up again further down, so it changed rather than was added
+    current.write("id,name\n1,Cleo\n2,Pancakes\n1,Bailey\n")
+    with pytest.raises(PrefixError):
+        load_tails(str(previous), str(current), key="id")
+    result = CliRunner().invoke(
+        cli.cli, [str(previous), str(current), "--key", "id", "--append-only", "--oformat", "json"]
+    )
+    assert result.exit_code == 0
+    assert "comparing them in full" in result.stderr
+    assert [row["Key"] for row in json.loads(result.stdout)["Modified"]] == ["1"]
+
+
+def test_stats_show_what_was_skipped(tmpdir):
+    previous = write_rows(tmpdir / "previous.csv", 200)
+    current = write_rows(tmpdir / "current.csv", 205, changed={150})
+    args = [previous, current, "--key", "id", "--append-only", "--stats"]
+    result = CliRunner().invoke(cli.cli, args + ["--oformat", "json"])
+    assert result.exit_code == 0, result.output
+    skipped = json.loads(result.stdout)["Column Statistics"]["(skipped)"]
+    assert skipped["rows"] == 150
+    assert skipped["bytes"] == load_tails(previous, current, key="id")[2]["prefix_bytes"]
+    result = CliRunner().invoke(cli.cli, args)
+    assert "  Skipped 150 rows ({} bytes) that both files start with".format(skipped["bytes"]) in result.stdout
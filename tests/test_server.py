@@ -0,0 +1,92 @@
+from click.testing import CliRunner
+from concurrent.futures import ThreadPoolExecutor
+from csv_diff import cli
+from csv_diff.server import DiffServer, request, ServerError
+from .test_csv_diff import ONE, TWO, FIVE
+import pytest
+import threading
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = DiffServer(str(tmpdir / "csv-diff.sock"), workers=3)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+@pytest.fixture
+def files(tmpdir):
+    paths = []
+    for name, content in (("one", ONE), ("two", TWO), ("five", FIVE)):
+        path = tmpdir / (name + ".csv")
+        path.write(content)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--key", "id"],
+        ["--key", "id", "--oformat", "json"],
+        ["--key", "id", "--oformat", "tsv", "--singular", "tree", "--plural", "trees"],
+        ["--key", "id", "--extra", "search", "https://www.google.com/search?q={name}"],
+    ],
+)
+def test_client_output_matches_cli(server, files, options):
+    one, _, five = files
+    expected = CliRunner().invoke(cli.cli, [one, five] + options, catch_exceptions=False)
+    result = CliRunner().invoke(
+        cli.cli, [one, five, "--client", server.server_address] + options, catch_exceptions=False
+    )
+    assert 0 == result.exit_code, result.output
+    assert result.output == expected.output
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--key", "id", "--extra", "search", "{name}", "--oformat", "json"],
+        ["--key", "id", "--stats", "--oformat", "patch", "--o", "out.patch"],
+        ["--key", "id", "--ignore", "age", "--oformat", "patch", "--o", "out.patch"],
+    ],
+)
+def test_client_rejects_what_cli_does(server, files, options):
+    one, _, five = files
+    expected = CliRunner().invoke(cli.cli, [one, five] + options)
+    assert 2 == expected.exit_code
+    result = CliRunner().invoke(cli.cli, [one, five, "--client", server.server_address] + options)
+    assert 2 == result.exit_code
+    assert result.output.splitlines()[-1] == expected.output.splitlines()[-1]
+
+
+def test_concurrent_requests_share_loaded_files(server, files):
+    one, two, five = files
+    with ThreadPoolExecutor(8) as pool:
+        outputs = list(
+            pool.map(
+                lambda current: request(server.server_address, one, current, key="id"),
+                [two, five] * 10,
+            )
+        )
+    assert outputs[0].startswith("1 row changed\n")
+    assert outputs[1].startswith("1 row changed, 2 rows added")
+    assert set(outputs[::2]) == {outputs[0]}
+    stats = server.cache.stats()
+    assert stats["hits"] + stats["misses"] == 40
+    assert stats["tables"] == 3
+
+
+def test_errors_are_reported(server, files):
+    one, _, _ = files
+    with pytest.raises(ServerError):
+        request(server.server_address, one, one + ".missing", key="id")
+    result = CliRunner().invoke(
+        cli.cli, [one, one, "--key", "nope", "--client", server.server_address]
+    )
+    assert 1 == result.exit_code
+    assert "KeyError" in result.output
@@ -0,0 +1,71 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv, RMOD, RADD, RREM
+from csv_diff.similar import pair_rows
+import io
+import json
+import random
+
+
+def test_pair_rows():
+    removed = [("a", {"name": "Cleo", "age": "4", "colour": "tabby", "home": "SF"}),
+               ("b", {"name": "Pancakes", "age": "2", "colour": "black", "home": "LA"})]
+    added = [("c", {"name": "Bailey", "age": "1", "colour": "white", "home": "NY"}),
+             ("d", {"name": "Pancakes", "age": "3", "colour": "black", "home": "LA"}),
+             ("e", {"name": "Cleo", "age": "5", "colour": "tabby", "home": "SF"})]
+    assert pair_rows(removed, added, 0.5) == [("b", "d"), ("a", "e")]
+    assert pair_rows(removed, added, 0.7) == []
+    assert pair_rows(removed, added, 0.5, ignore={"age"}) == [("b", "d"), ("a", "e")]
+
+
+def test_most_similar_row_wins():
+    removed = [("a", {"x": "1", "y": "2", "z": "3", "w": "4"})]
+    added = [("b", {"x": "1", "y": "2", "z": "0", "w": "0"}),
+             ("c", {"x": "1", "y": "2", "z": "3", "w": "0"})]
+    assert pair_rows(removed, added, 0.3) == [("a", "c")]
+
+
+def test_compare_pair_similar():
+    previous = load_csv(io.StringIO("name,age,colour\nCleo,4,tabby\nPancakes,2,black\nRex,9,brown\n"))
+    current = load_csv(io.StringIO("name,age,colour\nCleo,5,tabby\nPancakes,2,black\nBailey,1,white\n"))
+    plain = compare(previous, current)
+    assert (len(plain[RMOD]), len(plain[RADD]), len(plain[RREM])) == (0, 2, 2)
+    diff = compare(previous, current, pair_similar=0.5, stats=True)
+    assert [item["Fields"] for item in diff[RMOD]] == [{"age": ["4", "5"]}]
+    assert [row["Fields"]["name"] for row in diff[RADD]] == ["Bailey"]
+    assert [row["Fields"]["name"] for row in diff[RREM]] == ["Rex"]
+    assert diff["Column Statistics"]["age"]["changed"] == 1
+
+
+def test_large_keyless_diff_pairs_every_edit():
+    rng = random.Random(0)
+    rows = [[str(i), "name{}".format(i), str(rng.randrange(100)), "x" * (i % 7)] for i in range(3000)]
+    edited = [list(row) for row in rows]
+    for row in edited[::10]:
+        row[2] = "edited"
+    previous = {i: dict(zip("abcd", row)) for i, row in enumerate(rows)}
+    current = {i + len(rows): dict(zip("abcd", row)) for i, row in enumerate(edited)}
+    # Every row looks removed and added; only the edited ones are 3/5 similar
+    # to a removed row, the rest are identical to one
+    diff = compare(previous, current, pair_similar=0.5)
+    assert len(diff[RMOD]) == 300
+    assert not diff[RADD] and not diff[RREM]
+
+
+def test_cli_pair_similar(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write("name,age,colour\nCleo,4,tabby\nPancakes,2,black\n")
+    two = tmpdir / "two.csv"
+    two.write("name,age,colour\nCleo,5,tabby\nPancakes,2,black\n")
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--pair-similar", "--oformat", "json"])
+    assert result.exit_code == 0, result.output
+    assert [item["Fields"] for item in json.loads(result.output)[RMOD]] == [{"age": ["4", "5"]}]
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--pair-similar", "--key", "name"])
+    assert result.exit_code == 2
+    # csv-diff apply finds rows by key, which paired rows don't have
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--pair-similar", "--oformat", "patch"])
+    assert result.exit_code == 2
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--pair-similar"])
+    assert result.exit_code == 0, result.output
+    assert result.output == '1 row changed\n\n  Row: name=Cleo, age=5, colour=tabby\n    age: "4" => "5"\n'
+    result = CliRunner().invoke(cli.cli, [str(one), str(two), "--similarity", "0.8"])
+    assert result.exit_code == 2
@@ -0,0 +1,100 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv, load_file, _collect, CADD, CREM
+from csv_diff.sqlite import SqliteDiff, SqliteError, load_sqlite, parse_sqlite_url
+from .test_csv_diff import ONE, TWO, THREE, FIVE, SIX, SEVEN, EIGHT, ELEVEN, TWELVE, THIRTEEN, FOURTEEN
+import io
+import json
+import pytest
+import sqlite3
+
+PAIRS = [
+    (ONE, TWO, "id"),
+    (TWO, THREE, "id"),
+    (THREE, FIVE, "id"),
+    (FIVE, SIX, "id"),
+    (SIX, SEVEN, "id"),
+    (SEVEN, EIGHT, "id"),
+    (ELEVEN, TWELVE, "state,county"),
+    (THIRTEEN, FOURTEEN, "id"),
+    (ONE, ONE, None),
+]
+
+
+def sqlite_compare(previous, current, key, **options):
+    with SqliteDiff(batch_size=2) as engine:
+        engine.load("previous", previous, key=key)
+        engine.load("current", current, key=key)
+        return _collect(engine.iter_compare(**options))
+
+
+def normalized(diff):
+    for action in (CADD, CREM):
+        diff[action] = sorted(diff[action])
+    return diff
+
+
+@pytest.mark.parametrize("previous,current,key", PAIRS)
+def test_matches_memory_engine(tmpdir, previous, current, key):
+    one = tmpdir / "one.csv"
+    one.write(previous)
+    two = tmpdir / "two.csv"
+    two.write(current)
+    expected = compare(
+        load_csv(io.StringIO(previous), key=key), load_csv(io.StringIO(current), key=key),
+        show_unchanged=True, stats=True,
+    )
+    actual = sqlite_compare(str(one), str(two), key, show_unchanged=True, stats=True)
+    assert normalized(actual) == normalized(expected)
+
+
+def test_later_rows_replace_earlier_ones(tmpdir):
+    one = tmpdir / "one.csv"
+    one.write("id,name\n1,Cleo\n2,Pancakes\n1,Cleopatra\n3,Bailey\n")
+    two = tmpdir / "two.csv"
+    two.write("id,name\n3,Bailey\n2,Pancakes!\n1,Cleopatra\n4,Carl\n")
+    with SqliteDiff() as engine:
+        engine.load("previous", str(one), key="id")
+        engine.load("current", str(two), key="id")
+        assert list(engine.table("previous").items()) == list(load_file(str(one), key="id").items())
+        changes = [(c.action, c.key) for c in engine.iter_compare()]
+    assert changes == [("Modified", "2"), ("Added", "4")]
+
+
+@pytest.fixture
+def database(tmpdir):
+    path = str(tmpdir / "pets.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE pets (id INTEGER, name TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO pets VALUES (?, ?, ?)", [(1, "Cleo", 4), (2, "Pancakes", 2)])
+    conn.execute("CREATE TABLE pets_today (id INTEGER, name TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO pets_today VALUES (?, ?, ?)", [(1, "Cleo", 5), (3, "Bailey", 1)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_sqlite_url_input(database):
+    url = "sqlite:///{}#pets".format(database)
+    assert parse_sqlite_url(url) == (database, "pets")
+    assert load_file(url, key="id") == {1: {"id": 1, "name": "Cleo", "age": 4}, 2: {"id": 2, "name": "Pancakes", "age": 2}}
+    assert load_sqlite(url, key="id", ignore="age")[1] == {"id": 1, "name": "Cleo"}
+    with pytest.raises(SqliteError):
+        load_sqlite("sqlite:///{}".format(database))
+    with pytest.raises(SqliteError):
+        load_sqlite("sqlite:///{}#missing".format(database))
+
+
+def test_cli_engine_sqlite(tmpdir, database):
+    previous = "sqlite:///{}#pets".format(database)
+    current = "sqlite:///{}#pets_today".format(database)
+    outputs = []
+    for engine in ("memory", "sqlite"):
+        result = CliRunner().invoke(
+            cli.cli, [previous, current, "--key", "id", "--oformat", "json", "--engine", engine]
+        )
+        assert result.exit_code == 0, result.output
+        outputs.append(json.loads(result.output))
+    assert outputs[0] == outputs[1]
+    assert outputs[1]["Modified"] == [{"Key": 1, "Fields": {"age": [4, 5]}}]
+    result = CliRunner().invoke(cli.cli, [previous, current, "--key", "id", "--estimate"])
+    assert result.exit_code == 2
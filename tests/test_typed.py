@@ -0,0 +1,140 @@
+from click.testing import CliRunner
+from csv_diff import cli, compare, load_csv, RMOD
+from csv_diff.typed import (
+    infer_schema, merge_schemas, load_schema, load_typed_csv, align, SchemaError,
+)
+import array
+import io
+import json
+import pytest
+
+PREVIOUS = "id,price,qty,day,zip,note\n1,1.0,3,2024-01-31,02134,a\n2,2.50,4,2024-02-01,10001,\n3,7,,2024-02-02,94103,c\n"
+CURRENT = "id,price,qty,day,zip,note\n1,1.00,3,2024-01-31,02134,a\n2,2.5001,5,2024-02-01,10001,\n3,7.0,,2024-02-03,94103,c\n"
+
+
+def typed(text, schema=None, key="id", **kwargs):
+    schema = schema or infer_schema(io.StringIO(text))
+    return load_typed_csv(io.StringIO(text), schema, key=key, **kwargs)
+
+
+def test_infer_schema():
+    assert infer_schema(io.StringIO(PREVIOUS)) == {
+        "id": "int", "price": "float", "qty": "int", "day": "date", "zip": "str", "note": "str",
+    }
+    assert infer_schema(io.StringIO(PREVIOUS), ignore="note,zip", sample_rows=1) == {
+        "id": "int", "price": "float", "qty": "int", "day": "date",
+    }
+    assert infer_schema(io.StringIO("a,b\n2024-13-01,\n")) == {"a": "str", "b": "str"}
+    assert merge_schemas({"a": "int", "b": "date"}, {"a": "float", "b": "int", "c": "str"}) == {
+        "a": "float", "b": "str", "c": "str",
+    }
+
+
+def test_typed_table():
+    table = typed(PREVIOUS)
+    assert table["3"] == {"id": "3", "price": 7.0, "qty": "", "day": "2024-02-02", "zip": "94103", "note": "c"}
+    assert list(table) == ["1", "2", "3"]
+    # Key columns stay text, typed columns are arrays
+    assert table.types["id"] == "str"
+    assert isinstance(table.columns["price"], array.array)
+    assert isinstance(table.columns["day"], array.array)
+
+
+def test_compare_typed():
+    previous, current = typed(PREVIOUS), typed(CURRENT)
+    assert compare(previous, current)[RMOD] == [
+        {"Key": "2", "Fields": {"price": [2.5, 2.5001], "qty": [4, 5]}},
+        {"Key": "3", "Fields": {"day": ["2024-02-02", "2024-02-03"]}},
+    ]
+    assert compare(previous, current, tolerance=0.001)[RMOD] == [
+        {"Key": "2", "Fields": {"qty": [4, 5]}},
+        {"Key": "3", "Fields": {"day": ["2024-02-02", "2024-02-03"]}},
+    ]
+    # As text, "1.0" and "1.00" differ
+    untyped = compare(load_csv(io.StringIO(PREVIOUS), key="id"), load_csv(io.StringIO(CURRENT), key="id"))
+    assert [row["Key"] for row in untyped[RMOD]] == ["1", "2", "3"]
+
+
+def test_keyless_and_duplicates():
+    text = "a,b\n1,x\n1.0,x\n2,y\n"
+    table = typed(text, {"a": "float"}, key=None)
+    assert len(table) == 2
+    table = typed("id,a\n1,5\n2,6\n1,7\n", {"a": "int"})
+    assert dict(table) == {"1": {"id": "1", "a": 7}, "2": {"id": "2", "a": 6}}
+
+
+def test_values_that_dont_fit():
+    text = "id,a,b\n1,1,2024-01-01\n2,1.5,soon\n"
+    with pytest.raises(SchemaError) as e:
+        typed(text, {"a": "int", "b": "date"})
+    assert str(e.value) == "Line 3: '1.5' in column 'a' is not int"
+    table = typed(text, {"a": "int", "b": "date"}, strict=False)
+    assert table.types == {"id": "str", "a": "float", "b": "str"}
+    assert table["1"] == {"id": "1", "a": 1.0, "b": "2024-01-01"}
+    other = typed("id,a,b\n1,1,2024-01-01\n", {"a": "int", "b": "date"})
+    align(table, other)
+    assert other.types["b"] == "str"
+    assert compare(other, table)[RMOD] == []
+
+
+def test_widening_keeps_text():
+    text = "id,a,b\n1,1,1.50\n2,+2,2.5\n3,3.0,x\n4,4,1.50\n5,abc,0.10\n"
+    table = typed(text, {"a": "int", "b": "float"}, strict=False)
+    assert table.types == {"id": "str", "a": "str", "b": "str"}
+    assert [row["a"] for row in table.values()] == ["1", "+2", "3.0", "4", "abc"]
+    assert [row["b"] for row in table.values()] == ["1.50", "2.5", "x", "1.50", "0.10"]
+    # A row replaced by a later one with the same key keeps the new text
+    table = typed("id,a\n1,1.50\n1,2.5\n2,x\n", {"a": "float"}, strict=False)
+    assert table["1"]["a"] == "2.5"
+
+
+def test_widened_after_the_sample(tmpdir):
+    # Only previous has text after the rows types are inferred from, so
+    # current's floats are turned into text by align()
+    rows = "".join("{0},{0}.5\n".format(i) for i in range(1001))
+    (tmpdir / "previous.csv").write("id,value\n" + rows + "1001,abc\n1002,1.50\n")
+    (tmpdir / "current.csv").write("id,value\n" + rows + "1002,1.50\n")
+    result = CliRunner().invoke(cli.cli, [
+        str(tmpdir / "previous.csv"), str(tmpdir / "current.csv"), "--key", "id", "--infer-types",
+    ])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("1 row removed\n")
+
+
+def test_load_schema():
+    assert load_schema(io.StringIO('{"a": "int"}')) == {"a": "int"}
+    for text in ("[]", "{", '{"a": "decimal"}'):
+        with pytest.raises(SchemaError):
+            load_schema(io.StringIO(text))
+
+
+@pytest.fixture
+def files(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write(PREVIOUS)
+    current = tmpdir / "current.csv"
+    current.write(CURRENT)
+    schema = tmpdir / "schema.json"
+    schema.write(json.dumps({"price": "float", "qty": "int"}))
+    return str(previous), str(current), str(schema)
+
+
+def test_cli(files):
+    previous, current, schema = files
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, [previous, current, "--key", "id", "--infer-types", "--oformat", "json"])
+    assert result.exit_code == 0, result.output
+    assert [row["Key"] for row in json.loads(result.output)[RMOD]] == ["2", "3"]
+
+    result = runner.invoke(cli.cli, [previous, current, "--key", "id", "--schema", schema, "--tolerance", "0.01"])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('2 rows changed\n\n  id: 2\n    qty: "4" => "5"\n\n  id: 3\n    day: ')
+
+    result = runner.invoke(cli.cli, [previous, current, "--key", "id", "--infer-types", "--jobs", "2"])
+    assert result.exit_code == 2
+    bad = schema.replace("schema", "bad")
+    with open(bad, "w") as fp:
+        json.dump({"note": "int"}, fp)
+    result = runner.invoke(cli.cli, [previous, current, "--key", "id", "--schema", bad])
+    assert result.exit_code == 1
+    assert "Line 2: 'a' in column 'note' is not int" in result.output
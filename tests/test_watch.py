@@ -0,0 +1,110 @@
+from click.testing import CliRunner
+from csv_diff import cli, RMOD, RADD, RREM
+from csv_diff.watch import Watcher
+import json
+import os
+import pytest
+
+
+def actions(changes):
+    return [(c.action, c.key) for c in changes]
+
+
+@pytest.fixture
+def files(tmpdir):
+    previous = tmpdir / "previous.csv"
+    previous.write("id,name,age\n1,Cleo,4\n2,Pancakes,2\n3,Bailey,1\n")
+    current = tmpdir / "current.csv"
+    current.write("id,name,age\n1,Cleo,5\n")
+    return str(previous), str(current)
+
+
+def append(filename, text):
+    with open(filename, "a") as fp:
+        fp.write(text)
+
+
+def test_incremental(files):
+    previous, current = files
+    watcher = Watcher(previous, current, key="id")
+    assert actions(watcher.poll()) == [(RMOD, "1"), (RREM, "2"), (RREM, "3")]
+    assert watcher.poll() == []
+    offset = watcher.offset
+    append(current, '2,Pancakes,2\n4,"Carl\nthe second",7\n5,Half')
+    assert actions(watcher.poll()) == [(RADD, "4")]
+    # The unfinished record is left for next time
+    assert watcher.offset == os.path.getsize(current) - len("5,Half")
+    assert watcher.offset > offset
+    append(current, ",1\n3,Bailey,2\n")
+    changes = watcher.poll()
+    assert actions(changes) == [(RMOD, "3"), (RADD, "5")]
+    assert changes[0].fields == {"age": ["1", "2"]}
+    assert sorted(watcher.current) == ["1", "2", "3", "4", "5"]
+    assert watcher.reloads == 0
+
+
+def test_truncate_and_rewrite(files):
+    previous, current = files
+    watcher = Watcher(previous, current, key="id")
+    watcher.poll()
+    with open(current, "w") as fp:
+        fp.write("id,name,age\n")
+    assert actions(watcher.poll()) == [(RREM, "1"), (RREM, "2"), (RREM, "3")]
+    assert watcher.reloads == 1
+    # Same size, different bytes
+    append(current, "1,Cleo,4\n")
+    watcher.poll()
+    with open(current, "w") as fp:
+        fp.write("id,name,age\n1,Cleo,9\n")
+    assert actions(watcher.poll()) == [(RMOD, "1"), (RREM, "2"), (RREM, "3")]
+    assert watcher.reloads == 2
+
+
+def test_cli_watch(files, monkeypatch):
+    previous, current = files
+    polls = []
+
+    def sleep(seconds):
+        polls.append(seconds)
+        if len(polls) == 1:
+            append(current, "3,Bailey,2\n")
+        if len(polls) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr("time.sleep", sleep)
+    result = CliRunner().invoke(cli.cli, [previous, current, "--key", "id", "--watch", "--oformat", "ndjson"])
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert [(line["Action"], line["Key"]) for line in lines] == [
+        (RMOD, "1"), (RREM, "2"), (RREM, "3"), (RMOD, "3"),
+    ]
+    result = CliRunner().invoke(cli.cli, [previous, current, "--watch", "--oformat", "xlsx"])
+    assert result.exit_code == 2
+    # Only ndjson can be added to a file check after check
+    result = CliRunner().invoke(cli.cli, [previous, current, "--watch", "--oformat", "json", "--o", "out.json"])
+    assert result.exit_code == 2
+
+
+def test_cli_watch_output_file(files, monkeypatch, tmpdir):
+    previous, current = files
+    output = tmpdir / "out.ndjson"
+    polls = []
+
+    def sleep(seconds):
+        polls.append(seconds)
+        if len(polls) == 1:
+            append(current, "3,Bailey,2\n")
+        if len(polls) == 2:
+            append(current, "4,Rex,9\n")
+        if len(polls) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr("time.sleep", sleep)
+    result = CliRunner().invoke(cli.cli, [
+        previous, current, "--key", "id", "--watch", "--oformat", "ndjson", "--o", str(output),
+    ])
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in output.read().splitlines()]
+    assert [(line["Action"], line["Key"]) for line in lines] == [
+        (RMOD, "1"), (RREM, "2"), (RREM, "3"), (RMOD, "3"), (RADD, "4"),
+    ]